@@ -1,64 +1,237 @@
+import time
+import threading
+import contextvars
 import requests
 import pandas as pd
 import numpy as np
+from datetime import datetime
+from urllib.parse import urlparse
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from .processor import procesar_csv_contenido
+from requests.adapters import HTTPAdapter
+from psycopg2.extras import execute_values
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from .processor import procesar_csv_contenido, generar_timestamps_rango
+from .perfilado import perfilar
 from database.connection import get_connection
+from database.esquema import obtener_esquema, invalidar_esquema
+from database.estadisticas import actualizar_estadisticas_ingesta
+from database.particionado import usa_particionado, asegurar_particiones, insertar_lecturas
+from database.rollups import actualizar_rollups
+from database.trazas import guardar_spans
+from database.ingestas import registrar_ingesta
+from database.metricas import (
+    LATENCIA_DESCARGA, BYTES_DESCARGADOS, FILAS_ESCRITAS, FILAS_NUEVAS,
+    ESPERA_POOL, COLA_DESCARGAS, ERRORES
+)
 
-def construir_url_egauge(hostname: str, timestamp: int, paso_segundos: int) -> str:
-    """Construye URL usando el formato exacto especificado"""
-    return f"https://{hostname}/cgi-bin/egauge-show?E&c&S&s={paso_segundos}&n=1&f={timestamp}&F=data.csv&C&Z=LST6"
+# Resoluciones de descarga (segundos entre lecturas). La demanda facturable de
+# CFE se mide en intervalos de 15 minutos: las resoluciones finas la capturan y
+# los rollups de 15 minutos y de hora se mantienen igual para todas.
+RESOLUCIONES = {
+    3600: "1 hora",
+    900: "15 minutos",
+    60: "1 minuto",
+}
 
-def descargar_csv_egauge(url: str) -> str:
-    """Descarga CSV desde eGauge y retorna el contenido como string"""
+# Lecturas por petición: a resolución fina una petición por lectura serían
+# 1,440 peticiones por día; se pide un día (minuto) o una semana (15 minutos)
+FILAS_POR_PETICION = {
+    900: 7 * 96,
+    60: 1440,
+}
+
+# Estado por hilo de descarga: su sesión HTTP y el tiempo de conexión de la petición en curso
+_hilo = threading.local()
+
+class _ConexionCronometrada:
+    """Suma al hilo actual el tiempo de abrir la conexión (DNS, TCP y TLS)"""
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _hilo.conexion = getattr(_hilo, 'conexion', 0.0) + time.perf_counter() - inicio
+
+class _ConexionHTTP(_ConexionCronometrada, HTTPConnection):
+    pass
+
+class _ConexionHTTPS(_ConexionCronometrada, HTTPSConnection):
+    pass
+
+class _PoolHTTP(HTTPConnectionPool):
+    ConnectionCls = _ConexionHTTP
+
+class _PoolHTTPS(HTTPSConnectionPool):
+    ConnectionCls = _ConexionHTTPS
+
+class _AdaptadorCronometrado(HTTPAdapter):
+    """Adaptador de requests cuyas conexiones reportan su tiempo de conexión"""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _PoolHTTP, 'https': _PoolHTTPS}
+
+def _sesion() -> requests.Session:
+    """Sesión HTTP del hilo actual; reutiliza la conexión (keep-alive) entre ventanas del mismo medidor"""
+    sesion = getattr(_hilo, 'sesion', None)
+    if sesion is None:
+        sesion = requests.Session()
+        adaptador = _AdaptadorCronometrado()
+        sesion.mount('http://', adaptador)
+        sesion.mount('https://', adaptador)
+        _hilo.sesion = sesion
+    return sesion
+
+def _registrar_error(tipo: str, span: dict = None):
+    """Cuenta el error en las métricas y lo anota como estado de la traza"""
+    ERRORES.labels(tipo).inc()
+    if span is not None:
+        span['estado'] = tipo
+
+def construir_url_egauge(hostname: str, timestamp: int, paso_segundos: int, filas: int = 1) -> str:
+    """Construye URL usando el formato exacto especificado; `filas` lecturas hacia atrás desde `timestamp`"""
+    return f"https://{hostname}/cgi-bin/egauge-show?E&c&S&s={paso_segundos}&n={filas}&f={timestamp}&F=data.csv&C&Z=LST6"
+
+def filas_por_peticion(paso_segundos: int) -> int:
+    """Lecturas por petición para una resolución (una por petición si no está en FILAS_POR_PETICION)"""
+    return FILAS_POR_PETICION.get(paso_segundos, 1)
+
+def planificar_ventanas(datetime_inicio: datetime, datetime_fin: datetime, paso_segundos: int) -> list:
+    """
+    Peticiones que cubren el rango a una resolución
+
+    Cada petición trae `filas` lecturas hacia atrás desde su timestamp, así
+    que las ventanas se separan filas_por_peticion(paso) × paso segundos. La
+    última se recorta a `datetime_fin` para no pedir lecturas fuera del rango.
+    Con una lectura por petición los timestamps son los de generar_timestamps_rango.
+
+    Returns:
+        Lista de (timestamp final, filas)
+    """
+    filas = filas_por_peticion(paso_segundos)
+    timestamp_fin = int(datetime_fin.timestamp())
+    ventanas = []
+    for inicio in generar_timestamps_rango(datetime_inicio, datetime_fin, paso_segundos * filas):
+        fin = min(inicio + (filas - 1) * paso_segundos, timestamp_fin)
+        ventanas.append((fin, (fin - inicio) // paso_segundos + 1))
+    return ventanas
+
+def descargar_csv_egauge(url: str, span: dict = None) -> str:
+    """
+    Descarga CSV desde eGauge y retorna el contenido como string
+
+    Si se pasa `span`, anota conexion_ms, ttfb_ms (desde la petición hasta las
+    cabeceras, sin la conexión), cuerpo_ms, http_status y bytes.
+    """
     headers = {
         'Accept': 'text/csv,application/csv',
         'User-Agent': 'eGauge-Streamlit-Client/1.0'
     }
     
+    host = urlparse(url).netloc
+    _hilo.conexion = 0.0
+    inicio = time.perf_counter()
     try:
-        response = requests.get(url, headers=headers, timeout=30)
-        if response.status_code == 200 and len(response.text.strip()) > 0:
-            return response.text
-        else:
+        # stream=True: get() regresa al llegar las cabeceras y el cuerpo se mide aparte
+        response = _sesion().get(url, headers=headers, timeout=30, stream=True)
+        cabeceras = time.perf_counter()
+        contenido = response.content
+        fin = time.perf_counter()
+        
+        LATENCIA_DESCARGA.labels(host).observe(fin - inicio)
+        BYTES_DESCARGADOS.labels(host).inc(len(contenido))
+        if span is not None:
+            span.update(
+                conexion_ms=_hilo.conexion * 1000,
+                ttfb_ms=(cabeceras - inicio - _hilo.conexion) * 1000,
+                cuerpo_ms=(fin - cabeceras) * 1000,
+                http_status=response.status_code,
+                bytes=len(contenido),
+            )
+        
+        if response.status_code != 200:
+            _registrar_error('http', span)
             return None
+        if len(response.text.strip()) == 0:
+            _registrar_error('respuesta_vacia', span)
+            return None
+        return response.text
+    except requests.Timeout:
+        LATENCIA_DESCARGA.labels(host).observe(time.perf_counter() - inicio)
+        _registrar_error('timeout', span)
+        return None
+    except requests.ConnectionError:
+        _registrar_error('conexion', span)
+        return None
     except Exception:
+        _registrar_error('descarga', span)
         return None
+    finally:
+        if span is not None and 'conexion_ms' not in span:
+            span['conexion_ms'] = _hilo.conexion * 1000
 
-def descargar_cliente_paralelo(hostname: str, tabla_nombre: str, timestamps: list) -> dict:
-    """Descarga todos los datos de un cliente en paralelo"""
+def descargar_cliente_paralelo(hostname: str, tabla_nombre: str, ventanas: list, paso_segundos: int = 3600) -> dict:
+    """
+    Descarga todas las ventanas (timestamp, filas) de un cliente en paralelo
+
+    Cada ventana deja una traza en resultados['spans']; la de las ventanas con
+    datos también va en df.attrs['span'] para completar la fase de escritura.
+    """
     resultados = {
         'hostname': hostname,
         'tabla_nombre': tabla_nombre,
         'dataframes': [],
+        'spans': [],
         'errores': 0,
         'total_filas': 0
     }
     
-    def descargar_timestamp(timestamp):
-        """Descarga un timestamp específico"""
+    def descargar_timestamp(timestamp, filas, encolado_en):
+        """Descarga una ventana específica; retorna (DataFrame o None, traza)"""
+        COLA_DESCARGAS.dec()
+        ESPERA_POOL.labels('descargas').observe(time.perf_counter() - encolado_en)
+        span = {'host': hostname, 'ventana': datetime.fromtimestamp(timestamp), 'estado': 'ok'}
         try:
-            url = construir_url_egauge(hostname, timestamp, 3600)
-            contenido_csv = descargar_csv_egauge(url)
+            url = construir_url_egauge(hostname, timestamp, paso_segundos, filas)
+            contenido_csv = descargar_csv_egauge(url, span)
             
             if contenido_csv is None:
-                return None
+                return None, span
+            
+            tiempos = {}
+            inicio = time.perf_counter()
+            df = procesar_csv_contenido(contenido_csv, tiempos=tiempos)
+            clasificacion = tiempos.get('clasificacion', 0.0)
+            span['clasificacion_ms'] = clasificacion * 1000
+            span['parseo_ms'] = (time.perf_counter() - inicio - clasificacion) * 1000
             
-            df = procesar_csv_contenido(contenido_csv)
-            return df if df is not None and not df.empty else None
+            if df is None or df.empty:
+                span['estado'] = 'sin_datos'
+                return None, span
+            span['filas'] = len(df)
+            df.attrs['span'] = span
+            return df, span
             
         except Exception:
-            return None
+            _registrar_error('procesamiento', span)
+            return None, span
     
     # Descargar en paralelo usando ThreadPoolExecutor
     with ThreadPoolExecutor(max_workers=10) as executor:
         # Enviar todas las tareas
-        future_to_timestamp = {executor.submit(descargar_timestamp, ts): ts for ts in timestamps}
+        COLA_DESCARGAS.inc(len(ventanas))
+        # Cada tarea corre en una copia del contexto para que sus consultas
+        # conserven la página que las originó (ver instrumentacion)
+        future_to_timestamp = {
+            executor.submit(contextvars.copy_context().run, descargar_timestamp, ts, filas, time.perf_counter()): ts
+            for ts, filas in ventanas
+        }
         
         # Recoger resultados
         for future in as_completed(future_to_timestamp):
             try:
-                df = future.result()
+                df, span = future.result()
+                resultados['spans'].append(span)
                 if df is not None:
                     resultados['dataframes'].append(df)
                 else:
@@ -77,28 +250,21 @@ def crear_tabla(tabla_nombre: str, df: pd.DataFrame) -> bool:
     try:
         cur = conn.cursor()
         
-        # Verificar si existe
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' AND table_name = %s
-            );
-        """, (tabla_nombre,))
-        tabla_existe = cur.fetchone()[0]
+        def tipo_sql(col):
+            if col == 'timestamp':
+                return "TIMESTAMP"
+            if col == 'tarifa':
+                return "VARCHAR(20)"
+            if pd.api.types.is_numeric_dtype(df[col]):
+                return "FLOAT"
+            return "TEXT"
         
-        if not tabla_existe:
+        # Verificar si existe (caché de esquema, sin consultar el catálogo en cada ventana)
+        esquema = obtener_esquema(tabla_nombre)
+        
+        if not esquema:
             # Crear tabla nueva
-            columnas_sql = []
-            for col in df.columns:
-                if col == 'timestamp':
-                    sql_type = "TIMESTAMP"
-                elif col == 'tarifa':
-                    sql_type = "VARCHAR(20)"
-                elif pd.api.types.is_numeric_dtype(df[col]):
-                    sql_type = "FLOAT"
-                else:
-                    sql_type = "TEXT"
-                columnas_sql.append(f'"{col}" {sql_type}')
+            columnas_sql = [f'"{col}" {tipo_sql(col)}' for col in df.columns]
             
             create_sql = f"""
             CREATE TABLE "{tabla_nombre}" (
@@ -109,13 +275,20 @@ def crear_tabla(tabla_nombre: str, df: pd.DataFrame) -> bool:
             """
             cur.execute(create_sql)
             
-            # Crear índices
+            # Crear índices (tarifa no se indexa: solo 3 valores, ver database/indices.py)
             if 'timestamp' in df.columns:
                 cur.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "idx_{tabla_nombre}_timestamp" ON "{tabla_nombre}"("timestamp");')
-            if 'tarifa' in df.columns:
-                cur.execute(f'CREATE INDEX IF NOT EXISTS "idx_{tabla_nombre}_tarifa" ON "{tabla_nombre}"("tarifa");')
             
             conn.commit()
+            invalidar_esquema(tabla_nombre)
+        else:
+            # Registros nuevos en el medidor: agregar las columnas que falten
+            nuevas = [col for col in df.columns if col not in esquema]
+            for col in nuevas:
+                cur.execute(f'ALTER TABLE "{tabla_nombre}" ADD COLUMN IF NOT EXISTS "{col}" {tipo_sql(col)};')
+            if nuevas:
+                conn.commit()
+                invalidar_esquema(tabla_nombre)
         
         cur.close()
         conn.close()
@@ -126,54 +299,104 @@ def crear_tabla(tabla_nombre: str, df: pd.DataFrame) -> bool:
             conn.close()
         return False
 
-def insertar_datos(tabla_nombre: str, df: pd.DataFrame) -> int:
-    """Inserta datos usando UPSERT"""
+def insertar_datos(tabla_nombre: str, df: pd.DataFrame) -> tuple:
+    """
+    Inserta datos usando UPSERT por lotes y retorna (filas escritas, filas nuevas)
+
+    Una ventana de datos por minuto trae cientos de filas: se escriben con
+    execute_values en lugar de un INSERT por fila.
+    """
+    if 'timestamp' in df.columns:
+        # Un mismo statement no puede actualizar dos veces la misma fila
+        df = df.drop_duplicates(subset='timestamp', keep='last')
+    
     conn = get_connection()
     if not conn:
-        return 0
+        return 0, 0
         
     try:
         cur = conn.cursor()
-        filas_insertadas = 0
+        columnas = ', '.join([f'"{col}"' for col in df.columns])
+        valores = list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
         
-        for _, row in df.iterrows():
-            valores = [None if pd.isna(val) else val for val in row]
-            columnas = ', '.join([f'"{col}"' for col in df.columns])
-            placeholders = ', '.join(['%s'] * len(valores))
-            
-            if 'timestamp' in df.columns:
-                # UPSERT con timestamp
-                sql = f'''
-                INSERT INTO "{tabla_nombre}" ({columnas}) VALUES ({placeholders})
-                ON CONFLICT ("timestamp") DO UPDATE SET
-                {", ".join([f'"{col}" = EXCLUDED."{col}"' for col in df.columns if col != 'timestamp'])}
-                '''
-            else:
-                # INSERT simple
-                sql = f'INSERT INTO "{tabla_nombre}" ({columnas}) VALUES ({placeholders})'
-            
-            try:
-                cur.execute(sql, tuple(valores))
-                filas_insertadas += 1
-            except Exception:
-                continue
+        if 'timestamp' in df.columns:
+            # UPSERT con timestamp
+            sql = f'''
+            INSERT INTO "{tabla_nombre}" ({columnas}) VALUES %s
+            ON CONFLICT ("timestamp") DO UPDATE SET
+            {", ".join([f'"{col}" = EXCLUDED."{col}"' for col in df.columns if col != 'timestamp'])}
+            RETURNING (xmax = 0)
+            '''
+        else:
+            # INSERT simple
+            sql = f'INSERT INTO "{tabla_nombre}" ({columnas}) VALUES %s RETURNING TRUE'
         
+        resultado = execute_values(cur, sql, valores, page_size=1000, fetch=True)
         conn.commit()
         cur.close()
         conn.close()
-        return filas_insertadas
+        
+        # xmax = 0 solo en filas recién insertadas (no actualizadas)
+        return len(resultado), sum(1 for (nueva,) in resultado if nueva)
         
     except Exception:
+        ERRORES.labels('escritura').inc()
         if conn:
             conn.close()
-        return 0
+        return 0, 0
+
+def procesar_cliente_completo(hostname: str, tabla_nombre: str, ventanas: list, paso_segundos: int = 3600) -> dict:
+    """
+    Procesa un cliente completo: descarga en paralelo + inserta en BD
 
-def procesar_cliente_completo(hostname: str, tabla_nombre: str, timestamps: list) -> dict:
-    """Procesa un cliente completo: descarga en paralelo + inserta en BD"""
+    Args:
+        ventanas: (timestamp, filas) de planificar_ventanas(..., paso_segundos)
+        paso_segundos: resolución de las lecturas (ver RESOLUCIONES)
+    """
+    with perfilar('ingesta', tabla_nombre):
+        return _procesar_cliente(hostname, tabla_nombre, ventanas, paso_segundos)
+
+def _procesar_cliente(hostname: str, tabla_nombre: str, ventanas: list, paso_segundos: int) -> dict:
+    """Descarga las ventanas de un cliente y las escribe en la base de datos"""
     
-    # Descargar datos en paralelo
-    resultado = descargar_cliente_paralelo(hostname, tabla_nombre, timestamps)
+    iniciado_en = datetime.now()
+    inicio = time.perf_counter()
     
+    # Descargar datos en paralelo
+    resultado = descargar_cliente_paralelo(hostname, tabla_nombre, ventanas, paso_segundos)
+    salida = None
+    try:
+        salida = _escribir_ventanas(tabla_nombre, resultado)
+        return salida
+    finally:
+        # Una inserción por ingesta con la traza de cada ventana, también si falló
+        guardar_spans(tabla_nombre, resultado['spans'])
+        _registrar_corrida(hostname, tabla_nombre, ventanas, paso_segundos, resultado, salida, iniciado_en, time.perf_counter() - inicio)
+
+def _registrar_corrida(hostname, tabla_nombre, ventanas, paso_segundos, resultado, salida, iniciado_en, duracion_s):
+    """Agrega la corrida a la bitácora egauge_ingest_runs"""
+    salida = salida or {}
+    filas = salida.get('filas', 0)
+    registrar_ingesta({
+        'tabla_nombre': tabla_nombre,
+        'host': hostname,
+        'iniciado_en': iniciado_en,
+        # Cada ventana cubre sus lecturas hacia atrás desde su timestamp
+        'rango_inicio': datetime.fromtimestamp(min(ts - (filas - 1) * paso_segundos for ts, filas in ventanas)) if ventanas else None,
+        'rango_fin': datetime.fromtimestamp(max(ts for ts, _ in ventanas)) if ventanas else None,
+        'ventanas_planeadas': len(ventanas),
+        'peticiones': len(resultado['spans']),
+        'filas': filas,
+        'filas_nuevas': salida.get('filas_nuevas', 0),
+        'errores': resultado['errores'],
+        'bytes': sum(span.get('bytes') or 0 for span in resultado['spans']),
+        'duracion_s': duracion_s,
+        'filas_por_s': filas / duracion_s if duracion_s > 0 else 0.0,
+        'exito': salida.get('exito', False),
+    })
+
+def _escribir_ventanas(tabla_nombre: str, resultado: dict) -> dict:
+    """Escribe las ventanas descargadas y actualiza catálogo y rollups"""
     if not resultado['dataframes']:
         return {
             'tabla': tabla_nombre,
@@ -182,11 +405,25 @@ def procesar_cliente_completo(hostname: str, tabla_nombre: str, timestamps: list
             'exito': False
         }
     
-    # Crear tabla con el primer DataFrame
     primer_df = resultado['dataframes'][0]
-    tabla_creada = crear_tabla(tabla_nombre, primer_df)
+    
+    # Rango temporal descargado
+    timestamp_min = timestamp_max = None
+    if 'timestamp' in primer_df.columns:
+        timestamp_min = min(df['timestamp'].min() for df in resultado['dataframes'])
+        timestamp_max = max(df['timestamp'].max() for df in resultado['dataframes'])
+    
+    if usa_particionado():
+        # Tabla única particionada: asegurar particiones del rango descargado
+        tabla_creada = timestamp_min is not None and asegurar_particiones(timestamp_min, timestamp_max)
+        escribir_datos = insertar_lecturas
+    else:
+        # Crear tabla con el primer DataFrame
+        tabla_creada = crear_tabla(tabla_nombre, primer_df)
+        escribir_datos = insertar_datos
     
     if not tabla_creada:
+        ERRORES.labels('crear_tabla').inc()
         return {
             'tabla': tabla_nombre,
             'filas': 0,
@@ -196,13 +433,29 @@ def procesar_cliente_completo(hostname: str, tabla_nombre: str, timestamps: list
     
     # Insertar todos los DataFrames
     total_filas = 0
+    total_nuevas = 0
     for df in resultado['dataframes']:
-        filas = insertar_datos(tabla_nombre, df)
+        inicio = time.perf_counter()
+        filas, nuevas = escribir_datos(tabla_nombre, df)
+        df.attrs['span']['escritura_ms'] = (time.perf_counter() - inicio) * 1000
+        FILAS_ESCRITAS.inc(filas)
+        FILAS_NUEVAS.inc(nuevas)
         total_filas += filas
+        total_nuevas += nuevas
+    
+    if total_filas > 0 and timestamp_min is not None:
+        # Recalcular solo los buckets 15min/hora/día/mes tocados por esta ingesta
+        actualizar_rollups(tabla_nombre, timestamp_min, timestamp_max)
+        # Actualizar catálogo de estadísticas sin escanear la tabla. Va después
+        # de los rollups: su updated_at es la marca de ingesta que usan las
+        # cachés de facturación, y no debe cambiar antes de que los agregados
+        # nuevos estén escritos
+        actualizar_estadisticas_ingesta(tabla_nombre, total_nuevas, timestamp_min, timestamp_max)
     
     return {
         'tabla': tabla_nombre,
         'filas': total_filas,
+        'filas_nuevas': total_nuevas,
         'errores': resultado['errores'],
         'exito': True
     }
\ No newline at end of file
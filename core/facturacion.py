@@ -0,0 +1,286 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from datetime import datetime
+from database.agregados import obtener_agregados_tarifa
+from database.rollups import obtener_consumos_rollup, tablas_con_rollups
+from database.estadisticas import obtener_marcas_ingesta
+from database.cache import cache_lectura, TTL_CONSUMOS
+
+# Precios por omisión de la calculadora (GDMTH)
+PRECIOS_DEFAULT = {
+    'precio_base': 1.20,
+    'precio_intermedio': 1.98,
+    'precio_punta': 2.32,
+    'precio_capacidad': 367.15,
+    'precio_distribucion': 100.00,
+    'cargo_fijo': 563.57,
+    'porcentaje_dap': 0.0,
+}
+
+FACTOR_CARGA = 0.57
+TASA_IVA = 0.16
+
+def obtener_consumos(columnas_config, fecha_inicio, fecha_fin, por_cliente=False):
+    """
+    Obtiene kWh y demanda máxima por tarifa de las tablas seleccionadas
+
+    Las tablas con rollups se leen del nivel mensual/diario, que conservan la
+    demanda máxima de 15 minutos y la energía sumada por hora, sin recorrer
+    las lecturas por minuto; el resto se agrega en PostgreSQL (y en el
+    archivo Parquet) en una sola consulta.
+
+    Args:
+        columnas_config: dict tabla_nombre -> registro a facturar
+        fecha_inicio, fecha_fin: fechas del periodo (inclusive)
+        por_cliente: Si separar los consumos por tabla
+
+    Returns:
+        DataFrame [tabla_nombre,] tarifa, kwh, demanda_max, muestras; None si hubo error
+    """
+    con_rollups = tablas_con_rollups(columnas_config.keys())
+    selecciones_rollup = {tabla: columna for tabla, columna in columnas_config.items() if tabla in con_rollups}
+    selecciones_crudas = {tabla: columna for tabla, columna in columnas_config.items() if tabla not in con_rollups}
+
+    partes = []
+    if selecciones_rollup:
+        datos_rollup = obtener_consumos_rollup(selecciones_rollup, fecha_inicio, fecha_fin, por_cliente)
+        if datos_rollup is None:
+            return None
+        partes.append(datos_rollup)
+
+    if selecciones_crudas:
+        # Sin rollups: agregar en PostgreSQL, una sola consulta para todas las tablas
+        datos_crudos = obtener_agregados_tarifa(
+            selecciones_crudas,
+            datetime.combine(fecha_inicio, datetime.min.time()),
+            datetime.combine(fecha_fin, datetime.max.time()),
+            por_cliente
+        )
+        if datos_crudos is None:
+            return None
+        partes.append(datos_crudos)
+
+    partes = [parte for parte in partes if not parte.empty]
+    if not partes:
+        return pd.DataFrame()
+
+    # Combinar fuentes: kWh se suman, la demanda máxima es el máximo
+    llaves = ['tabla_nombre', 'tarifa'] if por_cliente else ['tarifa']
+    return pd.concat(partes).groupby(llaves).agg(
+        kwh=('kwh', 'sum'),
+        demanda_max=('demanda_max', 'max'),
+        muestras=('muestras', 'sum')
+    ).reset_index()
+
+TARIFAS = ('Base', 'Intermedio', 'Punta')
+
+def agregados_por_cliente(consumos, tablas, dias_periodo):
+    """
+    Pasa los consumos largos (tabla_nombre, tarifa, kwh, demanda_max) a una fila por cliente
+
+    Args:
+        consumos: DataFrame de obtener_consumos(..., por_cliente=True)
+        tablas: tablas a facturar; las que no tienen lecturas quedan en cero
+        dias_periodo: días del periodo, escalar o un valor por tabla (Series indexada por tabla)
+
+    Returns:
+        DataFrame indexado por tabla_nombre con kwh_*, max_* y dias_periodo
+    """
+    indice = pd.Index(list(tablas), name='tabla_nombre')
+    columnas = list(TARIFAS)
+    if consumos.empty:
+        kwh = demanda = pd.DataFrame(0.0, index=indice, columns=columnas)
+    else:
+        kwh = consumos.pivot_table(index='tabla_nombre', columns='tarifa', values='kwh', aggfunc='sum')
+        demanda = consumos.pivot_table(index='tabla_nombre', columns='tarifa', values='demanda_max', aggfunc='max')
+        kwh = kwh.reindex(index=indice, columns=columnas).fillna(0.0)
+        demanda = demanda.reindex(index=indice, columns=columnas).fillna(0.0)
+
+    agregados = pd.concat([
+        kwh.rename(columns=lambda tarifa: f"kwh_{tarifa.lower()}"),
+        demanda.rename(columns=lambda tarifa: f"max_{tarifa.lower()}"),
+    ], axis=1).astype(float)
+    if isinstance(dias_periodo, pd.Series):
+        agregados['dias_periodo'] = dias_periodo.reindex(indice).astype(float)
+    else:
+        agregados['dias_periodo'] = float(dias_periodo)
+    return agregados
+
+def calcular_recibos(agregados, precios):
+    """
+    Calcula los recibos de todos los clientes en una sola pasada vectorizada
+
+    Cada columna es un arreglo con un valor por cliente, así que el costo no
+    depende de cuántos clientes se facturen; dias_periodo es el periodo real
+    de cada cliente.
+
+    Args:
+        agregados: DataFrame con kwh_base, kwh_intermedio, kwh_punta, max_base,
+            max_intermedio, max_punta y dias_periodo (una fila por cliente)
+        precios: dict con las llaves de PRECIOS_DEFAULT
+
+    Returns:
+        DataFrame con el mismo índice y las llaves de datos_calculados como columnas
+    """
+    kwh = agregados[['kwh_base', 'kwh_intermedio', 'kwh_punta']].to_numpy(dtype=float)
+    demandas = agregados[['max_base', 'max_intermedio', 'max_punta']].to_numpy(dtype=float)
+    dias_periodo = agregados['dias_periodo'].to_numpy(dtype=float)
+
+    # Distribución (fórmula CFE): la menor entre la demanda punta y el consumo entre horas × factor de carga
+    consumo_total = kwh.sum(axis=1)
+    formula_distribucion = consumo_total / (24 * dias_periodo * FACTOR_CARGA)
+    demanda_facturable = np.minimum(demandas[:, 2], formula_distribucion)
+
+    costos_energia = kwh * np.array([precios['precio_base'], precios['precio_intermedio'], precios['precio_punta']])
+    costo_capacidad = demandas.max(axis=1) * precios['precio_capacidad']
+    costo_distribucion = demanda_facturable * precios['precio_distribucion']
+
+    energia = costos_energia.sum(axis=1) + costo_capacidad + costo_distribucion
+    subtotal = energia + precios['cargo_fijo']
+
+    porcentaje_dap = precios.get('porcentaje_dap', 0.0)
+    dap = subtotal * (porcentaje_dap / 100)
+    subtotal_con_dap = subtotal + dap
+
+    iva = subtotal_con_dap * TASA_IVA
+    total = subtotal_con_dap + iva
+
+    return pd.DataFrame({
+        'kwh_base': kwh[:, 0],
+        'kwh_intermedio': kwh[:, 1],
+        'kwh_punta': kwh[:, 2],
+        'max_base': demandas[:, 0],
+        'max_intermedio': demandas[:, 1],
+        'max_punta': demandas[:, 2],
+        'costo_base': costos_energia[:, 0],
+        'costo_intermedio': costos_energia[:, 1],
+        'costo_punta': costos_energia[:, 2],
+        'costo_capacidad': costo_capacidad,
+        'costo_distribucion': costo_distribucion,
+        'cargo_fijo': precios['cargo_fijo'],
+        'energia': energia,
+        'subtotal': subtotal,
+        'subtotal_con_dap': subtotal_con_dap,
+        'dap': dap,
+        'iva': iva,
+        'total': total,
+        'demanda_facturable': demanda_facturable,
+        'dias_periodo': dias_periodo,
+        'incluir_dap': porcentaje_dap > 0,
+        'porcentaje_dap': porcentaje_dap,
+    }, index=agregados.index)
+
+def recibo_a_dict(fila):
+    """Convierte una fila de calcular_recibos a dict con tipos de Python (para session_state y los PDFs)"""
+    return {llave: valor.item() if isinstance(valor, np.generic) else valor for llave, valor in fila.items()}
+
+def calcular_recibo(kwh_base, kwh_intermedio, kwh_punta, max_base, max_intermedio, max_punta, dias_periodo, precios):
+    """
+    Calcula el recibo de un solo cliente con el motor vectorizado
+
+    Returns:
+        dict con consumos, costos y totales (mismas llaves que datos_calculados)
+    """
+    agregados = pd.DataFrame([{
+        'kwh_base': kwh_base, 'kwh_intermedio': kwh_intermedio, 'kwh_punta': kwh_punta,
+        'max_base': max_base, 'max_intermedio': max_intermedio, 'max_punta': max_punta,
+        'dias_periodo': dias_periodo,
+    }])
+    return recibo_a_dict(calcular_recibos(agregados, precios).iloc[0])
+
+def dias_del_periodo(fecha_inicio, fecha_fin):
+    """Días del periodo de facturación, contando ambos extremos"""
+    return (fecha_fin - fecha_inicio).days + 1
+
+def _calcular_agregados(columnas_config, fecha_inicio, fecha_fin):
+    """Consulta los consumos y los pasa a una fila por cliente; None si hubo error"""
+    consumos = obtener_consumos(columnas_config, fecha_inicio, fecha_fin, por_cliente=True)
+    if consumos is None:
+        return None
+    return agregados_por_cliente(consumos, columnas_config.keys(), dias_del_periodo(fecha_inicio, fecha_fin))
+
+@cache_lectura('consumos', TTL_CONSUMOS)
+def _agregados_memoizados(selecciones, fecha_inicio, fecha_fin, marcas):
+    """
+    Agregados por cliente de un periodo; lanza excepción ante errores para no cachearlos
+
+    `marcas` no se usa en el cuerpo: forma parte de la llave para que una
+    ingesta nueva en cualquiera de las tablas produzca una entrada distinta.
+    """
+    agregados = _calcular_agregados(dict(selecciones), fecha_inicio, fecha_fin)
+    if agregados is None:
+        raise RuntimeError("no se pudieron leer los consumos")
+    return agregados
+
+@cache_lectura('consumos', TTL_CONSUMOS)
+def _recibos_memoizados(selecciones, fecha_inicio, fecha_fin, precios, marcas):
+    """Recibos de un periodo con un juego de precios; reutiliza los agregados memoizados"""
+    agregados = _agregados_memoizados(selecciones, fecha_inicio, fecha_fin, marcas)
+    return calcular_recibos(agregados, dict(precios))
+
+def _llave_facturacion(columnas_config, marcas=None):
+    """Selecciones canónicas y marcas de ingesta (se leen si no se pasan); marcas None si no se pudieron leer"""
+    if marcas is None:
+        marcas = obtener_marcas_ingesta(columnas_config.keys())
+    return tuple(sorted(columnas_config.items())), marcas
+
+def obtener_agregados_clientes(columnas_config, fecha_inicio, fecha_fin, marcas=None):
+    """
+    Agregados por cliente (ver agregados_por_cliente) memoizados por periodo y marca de ingesta
+
+    La llave es (tabla, registro) de cada cliente, el periodo y la marca de
+    ingesta de cada tabla: una ingesta nueva invalida la entrada sola, aunque
+    la haya hecho otro proceso. Sin marcas se consulta sin caché.
+
+    Args:
+        marcas: resultado de obtener_marcas_ingesta ya leído en esta ejecución;
+            si es None se consulta
+
+    Returns:
+        DataFrame indexado por tabla_nombre; None si hubo error
+    """
+    selecciones, marcas = _llave_facturacion(columnas_config, marcas)
+    if marcas is None:
+        return _calcular_agregados(columnas_config, fecha_inicio, fecha_fin)
+
+    try:
+        return _agregados_memoizados(selecciones, fecha_inicio, fecha_fin, marcas)
+    except Exception as e:
+        st.error(f"Error obteniendo consumos: {e}")
+        return None
+
+def facturar_periodo(columnas_config, fecha_inicio, fecha_fin, precios, marcas=None):
+    """
+    Recibos de los clientes seleccionados, memoizados por periodo, precios y marca de ingesta
+
+    Ver una y otra vez el mismo recibo se sirve de la caché; cambiar solo los
+    precios reutiliza los agregados y recalcula en memoria. Las páginas que
+    recalculan con cada precio pasan las marcas leídas una vez por ejecución
+    para no consultar el catálogo en cada edición.
+
+    Returns:
+        DataFrame de calcular_recibos indexado por tabla_nombre; None si hubo error
+    """
+    selecciones, marcas = _llave_facturacion(columnas_config, marcas)
+    if marcas is None:
+        agregados = _calcular_agregados(columnas_config, fecha_inicio, fecha_fin)
+        return None if agregados is None else calcular_recibos(agregados, precios)
+
+    try:
+        return _recibos_memoizados(selecciones, fecha_inicio, fecha_fin, tuple(sorted(precios.items())), marcas)
+    except Exception as e:
+        st.error(f"Error calculando recibos: {e}")
+        return None
+
+def facturar_clientes(columnas_config, fecha_inicio, fecha_fin, precios):
+    """
+    Calcula el recibo de cada cliente seleccionado para un periodo
+
+    Returns:
+        dict tabla_nombre -> recibo (ver calcular_recibo); None si hubo error
+    """
+    recibos = facturar_periodo(columnas_config, fecha_inicio, fecha_fin, precios)
+    if recibos is None:
+        return None
+    return {tabla: recibo_a_dict(fila) for tabla, fila in recibos.iterrows()}
@@ -0,0 +1,110 @@
+import os
+import re
+import time
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+# Perfilado opcional con cProfile del render de cada página y de cada ingesta.
+# Desactivado (por omisión) el costo es revisar un booleano por llamada.
+PERFILAR = os.getenv("EGAUGE_PERFILAR", "0") != "0"
+PERFILES_DIR = os.getenv("EGAUGE_PERFILES_DIR", "perfiles")
+# Solo se guardan las ejecuciones que tardan al menos esto; los reruns rápidos no llenan el disco
+PERFIL_MIN_MS = float(os.getenv("EGAUGE_PERFIL_MIN_MS", "200"))
+MAX_PERFILES = int(os.getenv("EGAUGE_MAX_PERFILES", "200"))
+
+_RE_ARCHIVO = re.compile(r"^(?P<fecha>\d{8}_\d{6}_\d{6})__(?P<tipo>[a-z]+)__(?P<nombre>.+)__(?P<ms>\d+)ms\.prof$")
+_RE_NOMBRE_SEGURO = re.compile(r"[^A-Za-z0-9_.-]+")
+
+# cProfile perfila solo el hilo que lo activa y no admite dos perfiladores
+# activos a la vez en el mismo hilo: una ingesta lanzada desde una página
+# perfilada queda dentro del perfil de la página
+_hilo = threading.local()
+
+@contextmanager
+def perfilar(tipo, nombre):
+    """
+    Perfila el bloque con cProfile si EGAUGE_PERFILAR está activo y guarda el resultado
+
+    Args:
+        tipo: 'pagina' o 'ingesta'
+        nombre: página o tabla perfilada (forma parte del nombre del archivo)
+    """
+    if not PERFILAR or getattr(_hilo, 'activo', False):
+        yield
+        return
+
+    import cProfile
+    perfil = cProfile.Profile()
+    _hilo.activo = True
+    inicio = time.perf_counter()
+    perfil.enable()
+    try:
+        yield
+    finally:
+        perfil.disable()
+        _hilo.activo = False
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        if duracion_ms >= PERFIL_MIN_MS:
+            _guardar_perfil(perfil, tipo, nombre, duracion_ms)
+
+def _guardar_perfil(perfil, tipo, nombre, duracion_ms):
+    """Escribe el perfil en PERFILES_DIR y descarta los más viejos por encima de MAX_PERFILES"""
+    try:
+        os.makedirs(PERFILES_DIR, exist_ok=True)
+        nombre_seguro = _RE_NOMBRE_SEGURO.sub("_", str(nombre))[:80] or "_"
+        archivo = f"{datetime.now():%Y%m%d_%H%M%S_%f}__{tipo}__{nombre_seguro}__{duracion_ms:.0f}ms.prof"
+        perfil.dump_stats(os.path.join(PERFILES_DIR, archivo))
+
+        perfiles = sorted(a for a in os.listdir(PERFILES_DIR) if _RE_ARCHIVO.match(a))
+        for viejo in perfiles[:-MAX_PERFILES]:
+            os.remove(os.path.join(PERFILES_DIR, viejo))
+    except OSError as e:
+        print(f"Warning: no se pudo guardar el perfil de {tipo} {nombre}: {e}")
+
+def listar_perfiles(limite=100):
+    """
+    Perfiles guardados, del más reciente al más viejo
+
+    Returns:
+        DataFrame con fecha, tipo, nombre, duracion_ms y ruta
+    """
+    import pandas as pd
+
+    columnas = ['fecha', 'tipo', 'nombre', 'duracion_ms', 'ruta']
+    if not os.path.isdir(PERFILES_DIR):
+        return pd.DataFrame(columns=columnas)
+
+    filas = []
+    for archivo in sorted(os.listdir(PERFILES_DIR), reverse=True):
+        coincidencia = _RE_ARCHIVO.match(archivo)
+        if not coincidencia:
+            continue
+        filas.append((
+            datetime.strptime(coincidencia['fecha'], "%Y%m%d_%H%M%S_%f"),
+            coincidencia['tipo'],
+            coincidencia['nombre'],
+            int(coincidencia['ms']),
+            os.path.join(PERFILES_DIR, archivo),
+        ))
+        if len(filas) >= limite:
+            break
+    return pd.DataFrame(filas, columns=columnas)
+
+def top_funciones(ruta, limite=30):
+    """
+    Funciones de un perfil ordenadas por tiempo acumulado
+
+    Returns:
+        DataFrame con funcion, llamadas, tiempo_propio_s, tiempo_acumulado_s
+    """
+    import pstats
+    import pandas as pd
+
+    estadisticas = pstats.Stats(ruta).stats
+    filas = [
+        (f"{funcion} ({os.path.basename(archivo)}:{linea})", llamadas, tiempo_propio, tiempo_acumulado)
+        for (archivo, linea, funcion), (_, llamadas, tiempo_propio, tiempo_acumulado, _) in estadisticas.items()
+    ]
+    df = pd.DataFrame(filas, columns=['funcion', 'llamadas', 'tiempo_propio_s', 'tiempo_acumulado_s'])
+    return df.sort_values('tiempo_acumulado_s', ascending=False).head(limite).reset_index(drop=True)
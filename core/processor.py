@@ -2,8 +2,10 @@ import pandas as pd
 import numpy as np
 import io
 from datetime import datetime, time, date, timedelta
+from time import perf_counter
 from urllib.parse import urlparse
 import pytz
+from database.metricas import TIEMPO_CLASIFICACION, FILAS_PARSEADAS, ERRORES
 
 # ============================================================================
 # FUNCIONES ORIGINALES (Mantenidas para compatibilidad)
@@ -229,7 +231,7 @@ def clasificar_tarifa_mejorada(fecha, timezone_name="America/Mexico_City", holid
 # FUNCIONES ORIGINALES DE PROCESAMIENTO (Actualizadas)
 # ============================================================================
 
-def procesar_csv_contenido(contenido_csv: str, usar_clasificacion_mejorada: bool = True, timezone_name: str = "America/Mexico_City", holidays: set = None) -> pd.DataFrame:
+def procesar_csv_contenido(contenido_csv: str, usar_clasificacion_mejorada: bool = True, timezone_name: str = "America/Mexico_City", holidays: set = None, tiempos: dict = None) -> pd.DataFrame:
     """
     Procesa contenido CSV y retorna DataFrame con clasificación de tarifas
     
@@ -238,6 +240,7 @@ def procesar_csv_contenido(contenido_csv: str, usar_clasificacion_mejorada: bool
         usar_clasificacion_mejorada: Si usar la nueva lógica (True) o la original (False)
         timezone_name: Zona horaria para la clasificación
         holidays: Set de días festivos
+        tiempos: dict opcional donde se anota la duración de la clasificación ('clasificacion', segundos)
     
     Returns:
         DataFrame procesado con columna 'tarifa'
@@ -279,6 +282,7 @@ def procesar_csv_contenido(contenido_csv: str, usar_clasificacion_mejorada: bool
                 
                 # Clasificar tarifas
                 if df['timestamp'].notna().any():
+                    inicio_clasificacion = perf_counter()
                     if usar_clasificacion_mejorada:
                         # Usar nueva lógica mejorada
                         try:
@@ -286,10 +290,15 @@ def procesar_csv_contenido(contenido_csv: str, usar_clasificacion_mejorada: bool
                         except Exception as e:
                             # Fallback a método original si hay error
                             print(f"Warning: Error en clasificación mejorada, usando método original: {e}")
+                            ERRORES.labels('clasificacion').inc()
                             df['tarifa'] = df['timestamp'].apply(clasificar_tarifa)
                     else:
                         # Usar lógica original
                         df['tarifa'] = df['timestamp'].apply(clasificar_tarifa)
+                    duracion_clasificacion = perf_counter() - inicio_clasificacion
+                    TIEMPO_CLASIFICACION.observe(duracion_clasificacion)
+                    if tiempos is not None:
+                        tiempos['clasificacion'] = duracion_clasificacion
                 
             except Exception:
                 pass
@@ -302,9 +311,11 @@ def procesar_csv_contenido(contenido_csv: str, usar_clasificacion_mejorada: bool
                 except:
                     pass
         
+        FILAS_PARSEADAS.inc(len(df))
         return df
         
     except Exception:
+        ERRORES.labels('parseo').inc()
         return None
 
 # ============================================================================
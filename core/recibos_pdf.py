@@ -0,0 +1,179 @@
+import io
+import os
+import zipfile
+import multiprocessing
+from xml.sax.saxutils import escape
+from concurrent.futures import ProcessPoolExecutor
+
+# Este módulo se importa en los procesos trabajadores: no depende de Streamlit
+# ni de la base de datos, recibe recibos ya calculados y regresa bytes de PDF.
+
+# Fuente TTF opcional para el recibo (p. ej. DejaVuSans.ttf); sin ella se usa Helvetica
+FUENTE_RECIBO = os.getenv("EGAUGE_FUENTE_RECIBO", "")
+
+# Recibos por tarea enviada a cada proceso
+RECIBOS_POR_TAREA = 16
+
+COLOR_CFE = "#0b7a4b"
+
+# Plantilla (fuentes y estilos) construida una sola vez por proceso
+_PLANTILLA = None
+
+def _inicializar_plantilla():
+    """Registra la fuente y construye los estilos del recibo; se llama una vez por proceso"""
+    global _PLANTILLA
+    if _PLANTILLA is not None:
+        return _PLANTILLA
+
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import TableStyle
+
+    fuente, fuente_negrita = "Helvetica", "Helvetica-Bold"
+    if FUENTE_RECIBO and os.path.exists(FUENTE_RECIBO):
+        pdfmetrics.registerFont(TTFont("FuenteRecibo", FUENTE_RECIBO))
+        fuente = fuente_negrita = "FuenteRecibo"
+
+    verde = colors.HexColor(COLOR_CFE)
+    base = getSampleStyleSheet()
+    estilos = {
+        'titulo': ParagraphStyle('titulo', parent=base['Title'], fontName=fuente_negrita, fontSize=15, textColor=verde, alignment=TA_CENTER, spaceAfter=2),
+        'subtitulo': ParagraphStyle('subtitulo', parent=base['Normal'], fontName=fuente, fontSize=10, textColor=verde, alignment=TA_CENTER, spaceAfter=12),
+        'normal': ParagraphStyle('normal', parent=base['Normal'], fontName=fuente, fontSize=10),
+        'seccion': ParagraphStyle('seccion', parent=base['Heading4'], fontName=fuente_negrita, spaceBefore=10),
+        'total': ParagraphStyle('total', parent=base['Title'], fontName=fuente_negrita, fontSize=20, textColor=verde, alignment=TA_CENTER),
+        'pie': ParagraphStyle('pie', parent=base['Normal'], fontName=fuente, fontSize=8, textColor=colors.grey, alignment=TA_CENTER),
+    }
+    tabla = TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), fuente),
+        ('FONTNAME', (0, 0), (-1, 0), fuente_negrita),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#dddddd")),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#f5f5f5")),
+    ])
+    fila_total = [
+        ('BACKGROUND', (0, -1), (-1, -1), verde),
+        ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
+        ('FONTNAME', (0, -1), (-1, -1), fuente_negrita),
+    ]
+    _PLANTILLA = {'estilos': estilos, 'tabla': tabla, 'fila_total': fila_total}
+    return _PLANTILLA
+
+def generar_pdf_recibo(recibo):
+    """
+    Genera el PDF de un recibo
+
+    Args:
+        recibo: dict con nombre, tarifa, fecha_inicio, fecha_fin (date) y las
+            llaves de core.facturacion.calcular_recibo
+
+    Returns:
+        bytes del PDF
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer
+
+    plantilla = _inicializar_plantilla()
+    estilos = plantilla['estilos']
+
+    periodo = f"{recibo['fecha_inicio'].strftime('%d %b %y').upper()} - {recibo['fecha_fin'].strftime('%d %b %y').upper()}"
+
+    consumos = Table([
+        ['Concepto', 'Base', 'Intermedio', 'Punta'],
+        ['Consumo (kWh)', f"{recibo['kwh_base']:,.0f}", f"{recibo['kwh_intermedio']:,.0f}", f"{recibo['kwh_punta']:,.0f}"],
+        ['Demanda (kW)', f"{recibo['max_base']:.0f}", f"{recibo['max_intermedio']:.0f}", f"{recibo['max_punta']:.0f}"],
+    ], colWidths=[5 * cm, 3.5 * cm, 3.5 * cm, 3.5 * cm])
+    consumos.setStyle(plantilla['tabla'])
+
+    filas_costos = [
+        ['Concepto', 'Importe'],
+        ['Energía Base', f"${recibo['costo_base']:,.2f}"],
+        ['Energía Intermedia', f"${recibo['costo_intermedio']:,.2f}"],
+        ['Energía Punta', f"${recibo['costo_punta']:,.2f}"],
+        ['Capacidad', f"${recibo['costo_capacidad']:,.2f}"],
+        ['Distribución', f"${recibo['costo_distribucion']:,.2f}"],
+        ['Energía Total', f"${recibo['energia']:,.2f}"],
+        ['Cargo Fijo', f"${recibo['cargo_fijo']:,.2f}"],
+        ['Subtotal', f"${recibo['subtotal_con_dap']:,.2f}"],
+    ]
+    if recibo.get('dap', 0) > 0:
+        filas_costos.append([f"DAP ({recibo['porcentaje_dap']}%)", f"${recibo['dap']:,.2f}"])
+    filas_costos += [
+        ['IVA 16%', f"${recibo['iva']:,.2f}"],
+        ['TOTAL', f"${recibo['total']:,.2f}"],
+    ]
+    costos = Table(filas_costos, colWidths=[10 * cm, 5.5 * cm])
+    costos.setStyle(TableStyle(plantilla['tabla'].getCommands() + plantilla['fila_total']))
+
+    buffer = io.BytesIO()
+    documento = SimpleDocTemplate(
+        buffer, pagesize=letter, title=f"Recibo CFE - {recibo['nombre']}",
+        leftMargin=2 * cm, rightMargin=2 * cm, topMargin=1.5 * cm, bottomMargin=1.5 * cm
+    )
+    documento.build([
+        Paragraph("COMISIÓN FEDERAL DE ELECTRICIDAD", estilos['titulo']),
+        Paragraph("SUMINISTRADOR DE SERVICIOS BÁSICOS", estilos['subtitulo']),
+        Paragraph(f"<b>{escape(recibo['nombre'])}</b>", estilos['normal']),
+        Paragraph(f"Período: {periodo} | Tarifa: {escape(recibo['tarifa'])}", estilos['normal']),
+        Spacer(1, 0.5 * cm),
+        Paragraph("TOTAL A PAGAR:", estilos['normal']),
+        Paragraph(f"${recibo['total']:,.2f}", estilos['total']),
+        Paragraph("CONSUMOS Y DEMANDAS", estilos['seccion']),
+        consumos,
+        Paragraph("DESGLOSE DE COSTOS", estilos['seccion']),
+        costos,
+        Spacer(1, 1 * cm),
+        Paragraph("Recibo generado por eGauge Data Manager", estilos['pie']),
+    ])
+    return buffer.getvalue()
+
+def nombre_archivo_recibo(recibo):
+    """Nombre de archivo del PDF de un recibo"""
+    return f"recibo_{recibo['tabla_nombre']}_{recibo['fecha_inicio']:%Y%m}.pdf"
+
+def _generar_pdfs(recibos, procesos=None, progreso=None):
+    """Genera los PDFs en un pool de procesos; cada proceso construye la plantilla una vez"""
+    procesos = procesos or os.cpu_count() or 1
+    if procesos <= 1 or len(recibos) <= RECIBOS_POR_TAREA:
+        pdfs = []
+        for i, recibo in enumerate(recibos):
+            pdfs.append(generar_pdf_recibo(recibo))
+            if progreso:
+                progreso(i + 1, len(recibos))
+        return pdfs
+
+    # spawn: el servidor de Streamlit tiene hilos y fork no es seguro con ellos
+    contexto = multiprocessing.get_context("spawn")
+    pdfs = []
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=_inicializar_plantilla) as executor:
+        for pdf in executor.map(generar_pdf_recibo, recibos, chunksize=RECIBOS_POR_TAREA):
+            pdfs.append(pdf)
+            if progreso:
+                progreso(len(pdfs), len(recibos))
+    return pdfs
+
+def generar_recibos_zip(recibos, procesos=None, progreso=None):
+    """Genera un ZIP con un PDF por recibo; retorna bytes"""
+    pdfs = _generar_pdfs(recibos, procesos, progreso)
+    buffer = io.BytesIO()
+    # Los PDF ya vienen comprimidos: ZIP_STORED evita recomprimirlos
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archivo_zip:
+        for recibo, pdf in zip(recibos, pdfs):
+            archivo_zip.writestr(nombre_archivo_recibo(recibo), pdf)
+    return buffer.getvalue()
+
+def generar_recibos_pdf_unico(recibos, procesos=None, progreso=None):
+    """Genera un solo PDF con todos los recibos, uno tras otro; retorna bytes"""
+    from pypdf import PdfWriter, PdfReader
+
+    pdfs = _generar_pdfs(recibos, procesos, progreso)
+    writer = PdfWriter()
+    for pdf in pdfs:
+        writer.append(PdfReader(io.BytesIO(pdf)))
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,128 @@
+import streamlit as st
+import pandas as pd
+from .connection import get_connection
+from .lecturas import sql_lecturas, sql_cuarto_hora, sql_intervalo_lectura
+from .archivo import obtener_agregados_archivo
+from .particionado import usa_particionado
+
+# Granularidades soportadas para agrupar por periodo (unidad de date_trunc)
+UNIDADES_BUCKET = {
+    'hora': 'hour',
+    'dia': 'day',
+    'mes': 'month',
+}
+
+def obtener_agregados_tarifa(selecciones: dict, fecha_inicio, fecha_fin, por_cliente: bool = False, granularidad: str = None) -> pd.DataFrame:
+    """
+    Calcula kWh y demanda máxima por tarifa directamente en PostgreSQL
+
+    Todas las tablas seleccionadas se agregan en una sola consulta (UNION ALL,
+    o una sola lectura de egauge_lecturas con almacenamiento particionado),
+    así solo viajan las filas agregadas y no las lecturas crudas. Los meses
+    archivados en Parquet se agregan con DuckDB y se combinan en el resultado.
+
+    La demanda es la máxima de los cuartos de hora (intervalo de demanda de
+    CFE) en kW: la energía de cada cuarto entre los segundos que cubren sus
+    lecturas, igual que el primer nivel de rollups, para cualquier resolución.
+
+    Args:
+        selecciones: dict tabla_nombre -> registro (columna) a agregar
+        fecha_inicio, fecha_fin: datetimes del periodo (inclusive)
+        por_cliente: Si agrupar además por tabla
+        granularidad: None, 'hora', 'dia' o 'mes' para agrupar además por periodo
+
+    Returns:
+        DataFrame con columnas [tabla_nombre,] [bucket,] tarifa, kwh, demanda_max, muestras
+    """
+    if not selecciones:
+        return pd.DataFrame()
+
+    if granularidad is not None and granularidad not in UNIDADES_BUCKET:
+        st.error(f"Granularidad no soportada: {granularidad}")
+        return None
+
+    conn = get_connection()
+    if not conn:
+        return None
+
+    try:
+        cur = conn.cursor()
+
+        subconsultas = []
+        params = []
+        if usa_particionado():
+            # Toda la flota seleccionada en una sola lectura de egauge_lecturas,
+            # con poda de particiones por fecha
+            valores_sql = ", ".join(["(%s, %s)"] * len(selecciones))
+            subconsultas.append(f"""
+                SELECT c.tabla_nombre::TEXT AS tabla_nombre, l."timestamp", l.tarifa, l.valor
+                FROM egauge_lecturas l
+                JOIN egauge_clientes c ON c.id = l.cliente_id
+                JOIN (VALUES {valores_sql}) AS s(tabla_nombre, registro)
+                  ON s.tabla_nombre = c.tabla_nombre AND s.registro = l.registro
+                WHERE l."timestamp" >= %s AND l."timestamp" <= %s AND l.valor IS NOT NULL
+            """)
+            params += [valor for par in selecciones.items() for valor in par] + [fecha_inicio, fecha_fin]
+        else:
+            for tabla_nombre, registro in selecciones.items():
+                fuente_sql, fuente_params = sql_lecturas(tabla_nombre, [registro])
+                # El filtro de fechas va dentro de cada rama para aprovechar índices
+                subconsultas.append(f"""
+                    SELECT %s::TEXT AS tabla_nombre, l."timestamp", l.tarifa, l.valor
+                    FROM ({fuente_sql}) l
+                    WHERE l."timestamp" >= %s AND l."timestamp" <= %s AND l.valor IS NOT NULL
+                """)
+                params += [tabla_nombre] + fuente_params + [fecha_inicio, fecha_fin]
+
+        columnas = []
+        agrupar = []
+        if por_cliente:
+            columnas.append('tabla_nombre')
+            agrupar.append('c.tabla_nombre')
+        if granularidad:
+            columnas.append('bucket')
+            agrupar.append(f"date_trunc('{UNIDADES_BUCKET[granularidad]}', c.cuarto)")
+        columnas += ['tarifa', 'kwh', 'demanda_max', 'muestras']
+        agrupar.append('c.tarifa')
+
+        # Primero por cliente y cuarto de hora (energía y demanda del cuarto),
+        # después por las llaves pedidas
+        cur.execute(f"""
+            SELECT {", ".join(agrupar)}, SUM(c.kwh), MAX(c.demanda), SUM(c.muestras)
+            FROM (
+                SELECT u.tabla_nombre, u.tarifa, {sql_cuarto_hora('u."timestamp"')} AS cuarto,
+                       SUM(u.valor) AS kwh, SUM(u.valor) * 3600 / NULLIF(SUM(u.intervalo), 0) AS demanda,
+                       COUNT(*) AS muestras
+                FROM (
+                    SELECT u.*, {sql_intervalo_lectura('w')} AS intervalo
+                    FROM ({" UNION ALL ".join(subconsultas)}) u
+                    WINDOW w AS (PARTITION BY u.tabla_nombre ORDER BY u."timestamp")
+                ) u
+                GROUP BY u.tabla_nombre, u.tarifa, {sql_cuarto_hora('u."timestamp"')}
+            ) c
+            GROUP BY {", ".join(agrupar)}
+            ORDER BY {", ".join(agrupar)}
+        """, params)
+        filas = cur.fetchall()
+        cur.close()
+        conn.close()
+
+        df = pd.DataFrame(filas, columns=columnas)
+    except Exception as e:
+        st.error(f"Error calculando agregados: {e}")
+        if conn:
+            conn.close()
+        return None
+
+    unidad_bucket = UNIDADES_BUCKET[granularidad] if granularidad else None
+    df_archivo = obtener_agregados_archivo(selecciones, fecha_inicio, fecha_fin, por_cliente, unidad_bucket)
+    if df_archivo is None or df_archivo.empty:
+        return df
+
+    # Combinar PostgreSQL + archivo: kWh y muestras se suman, la demanda es el máximo
+    llaves = [col for col in columnas if col not in ('kwh', 'demanda_max', 'muestras')]
+    return pd.concat([df, df_archivo]).groupby(llaves, as_index=False).agg(
+        kwh=('kwh', 'sum'),
+        demanda_max=('demanda_max', 'max'),
+        muestras=('muestras', 'sum')
+    )
@@ -0,0 +1,368 @@
+import os
+import shutil
+import time
+from datetime import datetime, date
+import streamlit as st
+import pandas as pd
+from .connection import get_connection
+from .lecturas import obtener_registros, sql_lecturas, INTERVALO_MAXIMO_S
+from .estadisticas import descontar_estadisticas_archivo
+
+# Carpeta raíz del archivo frío en Parquet:
+# {ARCHIVO_DIR}/{tabla}/anio=YYYY/mes=MM/lecturas_<epoch>.parquet
+ARCHIVO_DIR = os.getenv("EGAUGE_ARCHIVO_DIR", "archivo")
+
+# Meses recientes que siempre permanecen en PostgreSQL (además del mes en curso)
+MESES_CALIENTES = int(os.getenv("EGAUGE_MESES_CALIENTES", "12"))
+
+# Filas leídas por lote del cursor de servidor al exportar a Parquet
+TAMANO_LOTE = 50_000
+
+def crear_tabla_archivo():
+    """Crea el catálogo de meses archivados en Parquet"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS egauge_archivo (
+                tabla_nombre VARCHAR(255) NOT NULL,
+                mes DATE NOT NULL,
+                lecturas BIGINT NOT NULL,
+                filas BIGINT NOT NULL,
+                ruta TEXT NOT NULL,
+                archivado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (tabla_nombre, mes)
+            );
+        """)
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        st.error(f"Error creando catálogo de archivo: {e}")
+        if conn:
+            conn.close()
+        return False
+
+def _carpeta_mes(tabla_nombre, año, mes):
+    """Carpeta con los archivos Parquet de un mes"""
+    return os.path.join(ARCHIVO_DIR, tabla_nombre, f"anio={año}", f"mes={mes:02d}")
+
+def _limites_mes(año, mes):
+    """Retorna (inicio, fin exclusivo) de un mes"""
+    inicio = datetime(año, mes, 1)
+    fin = datetime(año + 1, 1, 1) if mes == 12 else datetime(año, mes + 1, 1)
+    return inicio, fin
+
+def archivar_mes(tabla_nombre, año, mes):
+    """
+    Exporta un mes de lecturas a Parquet comprimido y lo borra de PostgreSQL
+
+    La lectura y el borrado ocurren en la misma transacción REPEATABLE READ,
+    así solo se borran exactamente las filas que quedaron en el archivo.
+
+    Returns:
+        int: Filas (timestamps) archivadas, o -1 si hubo error
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    registros = obtener_registros(tabla_nombre)
+    if not registros:
+        return 0
+
+    inicio, fin = _limites_mes(año, mes)
+    carpeta = _carpeta_mes(tabla_nombre, año, mes)
+    # Un archivo nuevo por ejecución: datos tardíos de un mes ya archivado no sobrescriben el anterior
+    ruta = os.path.join(carpeta, f"lecturas_{int(time.time())}.parquet")
+    ruta_temporal = ruta + ".tmp"
+    confirmado = False
+
+    conn = get_connection()
+    if not conn:
+        return -1
+
+    try:
+        conn.set_session(isolation_level='REPEATABLE READ')
+        fuente_sql, fuente_params = sql_lecturas(tabla_nombre, registros)
+
+        # Cursor de servidor: el mes nunca se materializa completo en memoria
+        cur = conn.cursor(name=f"archivo_{tabla_nombre}_{año}_{mes:02d}")
+        cur.itersize = TAMANO_LOTE
+        cur.execute(f"""
+            SELECT l."timestamp", l.tarifa, l.registro, l.valor
+            FROM ({fuente_sql}) l
+            WHERE l."timestamp" >= %s AND l."timestamp" < %s AND l.valor IS NOT NULL
+            ORDER BY l."timestamp"
+        """, fuente_params + [inicio, fin])
+
+        esquema = pa.schema([
+            ('timestamp', pa.timestamp('us')),
+            ('tarifa', pa.string()),
+            ('registro', pa.string()),
+            ('valor', pa.float64()),
+        ])
+
+        os.makedirs(carpeta, exist_ok=True)
+        lecturas = 0
+        filas = 0
+        ultimo_timestamp = None
+        writer = pq.ParquetWriter(ruta_temporal, esquema, compression='zstd')
+        try:
+            while True:
+                lote = cur.fetchmany(TAMANO_LOTE)
+                if not lote:
+                    break
+                timestamps, tarifas, regs, valores = zip(*lote)
+                writer.write_table(pa.table([
+                    pa.array(timestamps, type=pa.timestamp('us')),
+                    pa.array(tarifas, type=pa.string()),
+                    pa.array(regs, type=pa.string()),
+                    pa.array(valores, type=pa.float64()),
+                ], schema=esquema))
+                lecturas += len(lote)
+                # Las lecturas vienen ordenadas: contar timestamps distintos entre lotes
+                for ts in timestamps:
+                    if ts != ultimo_timestamp:
+                        filas += 1
+                        ultimo_timestamp = ts
+        finally:
+            writer.close()
+        cur.close()
+
+        if lecturas == 0:
+            os.remove(ruta_temporal)
+            conn.rollback()
+            conn.close()
+            return 0
+
+        os.replace(ruta_temporal, ruta)
+
+        cur = conn.cursor()
+        if _tiene_tabla_propia(cur, tabla_nombre):
+            cur.execute(f'DELETE FROM "{tabla_nombre}" WHERE "timestamp" >= %s AND "timestamp" < %s', (inicio, fin))
+        else:
+            cur.execute("""
+                DELETE FROM egauge_lecturas
+                WHERE cliente_id = (SELECT id FROM egauge_clientes WHERE tabla_nombre = %s)
+                AND "timestamp" >= %s AND "timestamp" < %s
+            """, (tabla_nombre, inicio, fin))
+
+        cur.execute("""
+            INSERT INTO egauge_archivo (tabla_nombre, mes, lecturas, filas, ruta)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (tabla_nombre, mes) DO UPDATE SET
+                lecturas = egauge_archivo.lecturas + EXCLUDED.lecturas,
+                filas = egauge_archivo.filas + EXCLUDED.filas,
+                archivado_en = CURRENT_TIMESTAMP
+        """, (tabla_nombre, date(año, mes, 1), lecturas, filas, os.path.join(carpeta, "*.parquet")))
+
+        conn.commit()
+        confirmado = True
+        cur.close()
+        conn.close()
+
+        descontar_estadisticas_archivo(tabla_nombre, filas)
+        return filas
+
+    except Exception as e:
+        st.error(f"Error archivando {tabla_nombre} {año}-{mes:02d}: {e}")
+        # Si el borrado en PostgreSQL no se confirmó, el archivo no debe quedar duplicando datos
+        for ruta_pendiente in (ruta_temporal, ruta):
+            if not confirmado and os.path.exists(ruta_pendiente):
+                os.remove(ruta_pendiente)
+        if conn:
+            conn.rollback()
+            conn.close()
+        return -1
+
+def _tiene_tabla_propia(cur, tabla_nombre):
+    """Indica si el cliente se almacena en su propia tabla (no en egauge_lecturas)"""
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'"{tabla_nombre}"',))
+    return cur.fetchone()[0]
+
+def meses_cerrados_por_archivar(tabla_nombre, meses_calientes=MESES_CALIENTES):
+    """Lista (año, mes) de meses cerrados con datos en PostgreSQL fuera de la ventana caliente"""
+    hoy = date.today()
+    total_meses = hoy.year * 12 + (hoy.month - 1) - meses_calientes
+    limite = datetime(total_meses // 12, total_meses % 12 + 1, 1)
+
+    registros = obtener_registros(tabla_nombre)
+    if not registros:
+        return []
+
+    conn = get_connection()
+    if not conn:
+        return []
+
+    try:
+        cur = conn.cursor()
+        fuente_sql, fuente_params = sql_lecturas(tabla_nombre, registros[:1])
+        cur.execute(f"""
+            SELECT DISTINCT date_trunc('month', l."timestamp")
+            FROM ({fuente_sql}) l
+            WHERE l."timestamp" < %s
+            ORDER BY 1
+        """, fuente_params + [limite])
+        meses = [(row[0].year, row[0].month) for row in cur.fetchall()]
+        cur.close()
+        conn.close()
+        return meses
+    except Exception as e:
+        st.error(f"Error buscando meses por archivar en {tabla_nombre}: {e}")
+        if conn:
+            conn.close()
+        return []
+
+def archivar_meses_cerrados(tabla_nombre, meses_calientes=MESES_CALIENTES):
+    """Archiva todos los meses cerrados de una tabla; retorna {(año, mes): filas}"""
+    return {
+        (año, mes): archivar_mes(tabla_nombre, año, mes)
+        for año, mes in meses_cerrados_por_archivar(tabla_nombre, meses_calientes)
+    }
+
+def obtener_meses_archivados(tablas, fecha_inicio, fecha_fin):
+    """Retorna {tabla: [rutas]} de los meses archivados que se traslapan con un periodo"""
+    conn = get_connection()
+    if not conn:
+        return {}
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT tabla_nombre, ruta
+            FROM egauge_archivo
+            WHERE tabla_nombre = ANY(%s)
+            AND mes >= date_trunc('month', %s::TIMESTAMP)::DATE
+            AND mes <= %s::DATE
+            ORDER BY tabla_nombre, mes
+        """, (list(tablas), fecha_inicio, fecha_fin))
+        resultado = {}
+        for tabla_nombre, ruta in cur.fetchall():
+            resultado.setdefault(tabla_nombre, []).append(ruta)
+        cur.close()
+        conn.close()
+        return resultado
+    except Exception:
+        if conn:
+            conn.close()
+        return {}
+
+def eliminar_archivo_tabla(tabla_nombre):
+    """Elimina los archivos Parquet y el catálogo de archivo de una tabla"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM egauge_archivo WHERE tabla_nombre = %s", (tabla_nombre,))
+        conn.commit()
+        cur.close()
+        conn.close()
+        shutil.rmtree(os.path.join(ARCHIVO_DIR, tabla_nombre), ignore_errors=True)
+        return True
+    except Exception:
+        if conn:
+            conn.close()
+        return False
+
+def conexion_duckdb():
+    """Conexión DuckDB en memoria para consultar el archivo Parquet"""
+    import duckdb
+    return duckdb.connect(database=':memory:')
+
+def obtener_agregados_archivo(selecciones: dict, fecha_inicio, fecha_fin, por_cliente: bool = False, unidad_bucket: str = None) -> pd.DataFrame:
+    """
+    Agrega lecturas archivadas con DuckDB, con la misma forma que obtener_agregados_tarifa
+
+    Solo se abren los archivos de los meses del periodo.
+    """
+    rutas_por_tabla = obtener_meses_archivados(selecciones.keys(), fecha_inicio, fecha_fin)
+    if not rutas_por_tabla:
+        return pd.DataFrame()
+
+    subconsultas = []
+    params = []
+    for tabla_nombre, rutas in rutas_por_tabla.items():
+        subconsultas.append("""
+            SELECT ?::VARCHAR AS tabla_nombre, "timestamp", tarifa, valor
+            FROM read_parquet(?)
+            WHERE registro = ? AND "timestamp" >= ? AND "timestamp" <= ? AND valor IS NOT NULL
+        """)
+        params += [tabla_nombre, rutas, selecciones[tabla_nombre], fecha_inicio, fecha_fin]
+
+    columnas = []
+    agrupar = []
+    if por_cliente:
+        columnas.append('tabla_nombre')
+        agrupar.append('tabla_nombre')
+    if unidad_bucket:
+        columnas.append('bucket')
+        agrupar.append(f"date_trunc('{unidad_bucket}', cuarto)")
+    columnas += ['tarifa', 'kwh', 'demanda_max', 'muestras']
+    agrupar.append('tarifa')
+
+    # Demanda por cuarto de hora como en PostgreSQL (ver sql_intervalo_lectura)
+    try:
+        con = conexion_duckdb()
+        df = con.execute(f"""
+            SELECT {", ".join(agrupar)}, SUM(kwh), MAX(demanda), SUM(muestras)
+            FROM (
+                SELECT tabla_nombre, tarifa, time_bucket(INTERVAL '15 minutes', "timestamp") AS cuarto,
+                       SUM(valor) AS kwh, SUM(valor) * 3600 / NULLIF(SUM(intervalo), 0) AS demanda,
+                       COUNT(*) AS muestras
+                FROM (
+                    SELECT *, LEAST(COALESCE(
+                        date_diff('second', LAG("timestamp") OVER w, "timestamp"),
+                        date_diff('second', "timestamp", LEAD("timestamp") OVER w),
+                        {INTERVALO_MAXIMO_S}
+                    ), {INTERVALO_MAXIMO_S}) AS intervalo
+                    FROM ({" UNION ALL ".join(subconsultas)})
+                    WINDOW w AS (PARTITION BY tabla_nombre ORDER BY "timestamp")
+                )
+                GROUP BY tabla_nombre, tarifa, cuarto
+            )
+            GROUP BY {", ".join(agrupar)}
+        """, params).df()
+        con.close()
+        df.columns = columnas
+        return df
+    except Exception as e:
+        st.error(f"Error consultando archivo Parquet: {e}")
+        return None
+
+def leer_lecturas_archivo(tabla_nombre, registros, fecha_inicio, fecha_fin, tamano_lote=TAMANO_LOTE):
+    """
+    Itera lecturas archivadas en formato ancho (una columna por registro), por lotes
+
+    Yields:
+        DataFrames con columnas timestamp, tarifa y un registro por columna
+    """
+    rutas = obtener_meses_archivados([tabla_nombre], fecha_inicio, fecha_fin).get(tabla_nombre, [])
+    if not rutas:
+        return
+
+    columnas_pivot = ", ".join(
+        'MAX(valor) FILTER (WHERE registro = ?) AS "{}"'.format(registro) for registro in registros
+    )
+    con = conexion_duckdb()
+    try:
+        resultado = con.execute(f"""
+            SELECT "timestamp", ANY_VALUE(tarifa) AS tarifa, {columnas_pivot}
+            FROM read_parquet(?)
+            WHERE "timestamp" >= ? AND "timestamp" <= ?
+            GROUP BY "timestamp"
+            ORDER BY "timestamp"
+        """, list(registros) + [rutas, fecha_inicio, fecha_fin])
+        while True:
+            # DuckDB entrega bloques de 2048 filas (un "vector")
+            lote = resultado.fetch_df_chunk(max(1, tamano_lote // 2048))
+            if lote is None or lote.empty:
+                break
+            yield lote
+    finally:
+        con.close()
@@ -0,0 +1,80 @@
+import streamlit as st
+from .connection import get_connection
+from .particionado import usa_particionado, MODO_ALMACENAMIENTO
+
+# Versión del esquema de tablas internas. Incrementar al cambiar cualquier
+# crear_tabla_* para que el DDL se vuelva a aplicar en el siguiente arranque.
+VERSION_ESQUEMA = 3
+
+def _version_aplicada(cur):
+    """Indica si esta versión del esquema ya se aplicó con el modo de almacenamiento actual"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS egauge_esquema_version (
+            version INTEGER NOT NULL,
+            modo VARCHAR(20) NOT NULL,
+            aplicado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (version, modo)
+        );
+    """)
+    cur.execute(
+        "SELECT EXISTS (SELECT 1 FROM egauge_esquema_version WHERE version = %s AND modo = %s)",
+        (VERSION_ESQUEMA, MODO_ALMACENAMIENTO)
+    )
+    return cur.fetchone()[0]
+
+def _aplicar_esquema():
+    """Ejecuta todos los crear_tabla_* de la aplicación; retorna True si todos tuvieron éxito"""
+    from .models import crear_tabla_clientes
+    from .estadisticas import crear_tabla_estadisticas
+    from .particionado import crear_tabla_lecturas
+    from .rollups import crear_tabla_rollups
+    from .archivo import crear_tabla_archivo
+    from .trazas import crear_tabla_trazas
+    from .ingestas import crear_tabla_ingestas
+
+    pasos = [
+        crear_tabla_clientes, crear_tabla_estadisticas, crear_tabla_rollups,
+        crear_tabla_archivo, crear_tabla_trazas, crear_tabla_ingestas
+    ]
+    if usa_particionado():
+        pasos.append(crear_tabla_lecturas)
+    return all([paso() for paso in pasos])
+
+@st.cache_resource(show_spinner="Preparando base de datos...")
+def _bootstrap(version, modo):
+    """Aplica el esquema una vez por proceso; lanza excepción si falla para reintentar en el siguiente rerun"""
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("sin conexión a PostgreSQL")
+
+    try:
+        cur = conn.cursor()
+        aplicada = _version_aplicada(cur)
+        conn.commit()
+
+        if not aplicada:
+            if not _aplicar_esquema():
+                raise RuntimeError("no se pudieron crear las tablas internas")
+            cur.execute(
+                "INSERT INTO egauge_esquema_version (version, modo) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                (version, modo)
+            )
+            conn.commit()
+
+        cur.close()
+        return True
+    finally:
+        conn.close()
+
+def asegurar_esquema():
+    """
+    Garantiza que las tablas internas existan, sin DDL en cada rerun
+
+    La comprobación se hace una sola vez por proceso y el DDL solo corre
+    cuando la versión del esquema (o el modo de almacenamiento) cambió.
+    """
+    try:
+        return _bootstrap(VERSION_ESQUEMA, MODO_ALMACENAMIENTO)
+    except Exception as e:
+        st.error(f"Error preparando el esquema de la base de datos: {e}")
+        return False
@@ -0,0 +1,32 @@
+import os
+from collections import defaultdict
+import streamlit as st
+
+# Caché compartida (por proceso, entre sesiones) de las lecturas frecuentes de
+# las páginas. Cada función cacheada pertenece a un grupo y las funciones que
+# escriben invalidan los grupos afectados; el TTL cubre escrituras hechas por
+# otros procesos (scripts/).
+TTL_CLIENTES = int(os.getenv("EGAUGE_TTL_CLIENTES", "300"))
+TTL_TABLAS = int(os.getenv("EGAUGE_TTL_TABLAS", "120"))
+TTL_CONSUMOS = int(os.getenv("EGAUGE_TTL_CONSUMOS", "600"))
+
+_grupos = defaultdict(list)
+
+def cache_lectura(grupo, ttl):
+    """
+    Decorador: cachea la función con st.cache_data y la registra en un grupo
+
+    La función decorada debe lanzar una excepción ante errores en lugar de
+    retornar un valor vacío, para que los fallos no queden en caché.
+    """
+    def decorador(func):
+        cacheada = st.cache_data(ttl=ttl, show_spinner=False)(func)
+        _grupos[grupo].append(cacheada)
+        return cacheada
+    return decorador
+
+def invalidar(*grupos):
+    """Descarta las entradas cacheadas de los grupos indicados"""
+    for grupo in grupos:
+        for cacheada in _grupos.get(grupo, []):
+            cacheada.clear()
@@ -1,7 +1,10 @@
 import os
+import time
 import psycopg2
 from dotenv import load_dotenv
 import streamlit as st
+from .instrumentacion import CursorInstrumentado, INSTRUMENTAR_CONSULTAS
+from .metricas import ESPERA_POOL, ERRORES
 
 # Cargar variables del archivo .env
 load_dotenv()
@@ -22,16 +25,21 @@ class DatabaseConnection:
     
     def get_connection(self):
         """Crea y retorna una nueva conexión a PostgreSQL"""
+        # Sin pool de conexiones: la espera es el tiempo de abrir la conexión
+        inicio = time.perf_counter()
         try:
             conn = psycopg2.connect(
                 dbname=self.dbname,
                 user=self.user, 
                 password=self.password,
                 host=self.host,
-                port=int(self.port)
+                port=int(self.port),
+                cursor_factory=CursorInstrumentado if INSTRUMENTAR_CONSULTAS else None
             )
+            ESPERA_POOL.labels('postgres').observe(time.perf_counter() - inicio)
             return conn
         except Exception as e:
+            ERRORES.labels('conexion_bd').inc()
             st.error(f"❌ Error conectando a PostgreSQL: {e}")
             return None
     
@@ -0,0 +1,114 @@
+import threading
+import time
+import streamlit as st
+from .connection import get_connection
+
+# Segundos antes de recargar el esquema aunque no haya invalidaciones
+# (cubre tablas creadas o alteradas por otros procesos, p. ej. scripts/)
+TTL_ESQUEMA = 600
+
+TIPOS_NUMERICOS = {'numeric', 'double precision', 'real', 'float', 'integer', 'bigint', 'smallint'}
+
+_esquemas = None
+_cargado_en = 0.0
+_registros_particionado = {}
+_lock = threading.Lock()
+
+def _consultar_esquemas(tabla_nombre=None):
+    """Lee columnas y tipos de las tablas de datos en una sola consulta al catálogo"""
+    conn = get_connection()
+    if not conn:
+        return None
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT c.table_name, c.column_name, c.data_type
+            FROM information_schema.columns c
+            WHERE c.table_schema = 'public'
+            AND (
+                c.table_name LIKE 'egauge%%'
+                OR c.table_name::TEXT IN (SELECT tabla_nombre::TEXT FROM egauge_clientes)
+            )
+            AND (%s::TEXT IS NULL OR c.table_name::TEXT = %s)
+            ORDER BY c.table_name, c.ordinal_position
+        """, (tabla_nombre, tabla_nombre))
+
+        esquemas = {}
+        for tabla, columna, tipo in cur.fetchall():
+            esquemas.setdefault(tabla, {})[columna] = tipo
+        cur.close()
+        conn.close()
+        return esquemas
+
+    except Exception as e:
+        st.error(f"Error leyendo esquema de tablas: {e}")
+        if conn:
+            conn.close()
+        return None
+
+def _asegurar_cargado():
+    """Carga el esquema de todas las tablas si no está en memoria o expiró"""
+    global _esquemas, _cargado_en
+    with _lock:
+        if _esquemas is not None and time.monotonic() - _cargado_en < TTL_ESQUEMA:
+            return
+    esquemas = _consultar_esquemas()
+    if esquemas is None:
+        return
+    with _lock:
+        _esquemas = esquemas
+        _cargado_en = time.monotonic()
+
+def obtener_esquema(tabla_nombre):
+    """
+    Retorna {columna: tipo} de una tabla desde la caché
+
+    Si la tabla no está en caché se consulta solo esa tabla, por si fue
+    creada por otro proceso después de la última carga.
+    """
+    _asegurar_cargado()
+    with _lock:
+        if _esquemas is not None and tabla_nombre in _esquemas:
+            return _esquemas[tabla_nombre]
+
+    esquema = (_consultar_esquemas(tabla_nombre) or {}).get(tabla_nombre, {})
+    if esquema:
+        with _lock:
+            if _esquemas is not None:
+                _esquemas[tabla_nombre] = esquema
+    return esquema
+
+def tabla_existe(tabla_nombre):
+    """Indica si una tabla de datos existe, usando la caché de esquema"""
+    return bool(obtener_esquema(tabla_nombre))
+
+def obtener_columnas_numericas(tabla_nombre, excluir=()):
+    """Columnas numéricas de una tabla en orden, sin las columnas excluidas"""
+    return [
+        columna for columna, tipo in obtener_esquema(tabla_nombre).items()
+        if tipo in TIPOS_NUMERICOS and columna not in excluir
+    ]
+
+def obtener_registros_particionado_cache(tabla_nombre, cargar):
+    """Caché de registros de un cliente en el modo particionado; cargar() se llama solo en fallo"""
+    with _lock:
+        if tabla_nombre in _registros_particionado:
+            return _registros_particionado[tabla_nombre]
+    registros = cargar()
+    if registros:
+        with _lock:
+            _registros_particionado[tabla_nombre] = registros
+    return registros
+
+def invalidar_esquema(tabla_nombre=None):
+    """Invalida la caché de una tabla (o de todas) tras crearla, alterarla o eliminarla"""
+    global _esquemas
+    with _lock:
+        if tabla_nombre is None:
+            _esquemas = None
+            _registros_particionado.clear()
+        else:
+            if _esquemas is not None:
+                _esquemas.pop(tabla_nombre, None)
+            _registros_particionado.pop(tabla_nombre, None)
@@ -0,0 +1,295 @@
+import streamlit as st
+from .connection import get_connection
+from .cache import cache_lectura, invalidar, TTL_TABLAS
+
+# Tablas internas de la aplicación que no contienen lecturas de medidores
+TABLAS_SISTEMA = {
+    'egauge_clientes',
+    'egauge_tabla_stats',
+    'egauge_lecturas',
+    'egauge_registros',
+    'egauge_rollups',
+    'egauge_archivo',
+    'egauge_esquema_version',
+    'egauge_descarga_spans',
+    'egauge_ingest_runs',
+}
+
+def crear_tabla_estadisticas():
+    """Crea el catálogo de estadísticas por tabla de datos"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS egauge_tabla_stats (
+                tabla_nombre VARCHAR(255) PRIMARY KEY,
+                filas BIGINT NOT NULL DEFAULT 0,
+                primer_timestamp TIMESTAMP,
+                ultimo_timestamp TIMESTAMP,
+                ultima_sincronizacion TIMESTAMP,
+                tamano_bytes BIGINT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        st.error(f"Error creando catálogo de estadísticas: {e}")
+        if conn:
+            conn.close()
+        return False
+
+def actualizar_estadisticas_ingesta(tabla_nombre, filas_nuevas, timestamp_min, timestamp_max):
+    """Actualiza incrementalmente el catálogo después de una ingesta"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM egauge_tabla_stats WHERE tabla_nombre = %s", (tabla_nombre,))
+        if cur.fetchone() is None:
+            # Primera vez en el catálogo: la tabla puede tener datos previos,
+            # se cuenta una sola vez y después se mantiene incrementalmente
+            cur.close()
+            conn.close()
+            if not refrescar_estadisticas_tabla(tabla_nombre):
+                return False
+            conn = get_connection()
+            if not conn:
+                return False
+            cur = conn.cursor()
+            filas_nuevas = 0
+
+        cur.execute("""
+            INSERT INTO egauge_tabla_stats (
+                tabla_nombre, filas, primer_timestamp, ultimo_timestamp,
+                ultima_sincronizacion, tamano_bytes
+            )
+            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP, pg_total_relation_size(to_regclass(%s)))
+            ON CONFLICT (tabla_nombre)
+            DO UPDATE SET
+                filas = egauge_tabla_stats.filas + EXCLUDED.filas,
+                primer_timestamp = LEAST(egauge_tabla_stats.primer_timestamp, EXCLUDED.primer_timestamp),
+                ultimo_timestamp = GREATEST(egauge_tabla_stats.ultimo_timestamp, EXCLUDED.ultimo_timestamp),
+                ultima_sincronizacion = EXCLUDED.ultima_sincronizacion,
+                tamano_bytes = EXCLUDED.tamano_bytes,
+                updated_at = CURRENT_TIMESTAMP
+        """, (tabla_nombre, filas_nuevas, timestamp_min, timestamp_max, f'"{tabla_nombre}"'))
+        conn.commit()
+        cur.close()
+        conn.close()
+        invalidar('tablas')
+        return True
+    except Exception as e:
+        st.warning(f"No se pudieron actualizar estadísticas de {tabla_nombre}: {e}")
+        if conn:
+            conn.close()
+        return False
+
+def refrescar_estadisticas_tabla(tabla_nombre):
+    """Recalcula las estadísticas exactas de una tabla (escaneo completo)"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'"{tabla_nombre}"',))
+        if cur.fetchone()[0]:
+            cur.execute(f'SELECT COUNT(*), MIN("timestamp"), MAX("timestamp") FROM "{tabla_nombre}";')
+        else:
+            # Cliente almacenado en la tabla particionada egauge_lecturas
+            cur.execute("""
+                SELECT COUNT(DISTINCT "timestamp"), MIN("timestamp"), MAX("timestamp")
+                FROM egauge_lecturas
+                WHERE cliente_id = (SELECT id FROM egauge_clientes WHERE tabla_nombre = %s)
+            """, (tabla_nombre,))
+        filas, min_fecha, max_fecha = cur.fetchone()
+
+        cur.execute("""
+            INSERT INTO egauge_tabla_stats (
+                tabla_nombre, filas, primer_timestamp, ultimo_timestamp, tamano_bytes
+            )
+            VALUES (%s, %s, %s, %s, pg_total_relation_size(to_regclass(%s)))
+            ON CONFLICT (tabla_nombre)
+            DO UPDATE SET
+                filas = EXCLUDED.filas,
+                primer_timestamp = EXCLUDED.primer_timestamp,
+                ultimo_timestamp = EXCLUDED.ultimo_timestamp,
+                tamano_bytes = EXCLUDED.tamano_bytes,
+                updated_at = CURRENT_TIMESTAMP
+        """, (tabla_nombre, filas, min_fecha, max_fecha, f'"{tabla_nombre}"'))
+        conn.commit()
+        cur.close()
+        conn.close()
+        invalidar('tablas')
+        return True
+    except Exception as e:
+        st.error(f"Error refrescando estadísticas de {tabla_nombre}: {e}")
+        if conn:
+            conn.close()
+        return False
+
+def descontar_estadisticas_archivo(tabla_nombre, filas_archivadas):
+    """Descuenta filas movidas al archivo Parquet y recalcula el primer timestamp con el índice"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'"{tabla_nombre}"',))
+        if cur.fetchone()[0]:
+            cur.execute(f'SELECT MIN("timestamp") FROM "{tabla_nombre}";')
+        else:
+            cur.execute("""
+                SELECT MIN("timestamp") FROM egauge_lecturas
+                WHERE cliente_id = (SELECT id FROM egauge_clientes WHERE tabla_nombre = %s)
+            """, (tabla_nombre,))
+        primer_timestamp = cur.fetchone()[0]
+
+        cur.execute("""
+            UPDATE egauge_tabla_stats
+            SET filas = GREATEST(filas - %s, 0),
+                primer_timestamp = %s,
+                tamano_bytes = pg_total_relation_size(to_regclass(%s)),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE tabla_nombre = %s
+        """, (filas_archivadas, primer_timestamp, f'"{tabla_nombre}"', tabla_nombre))
+        conn.commit()
+        cur.close()
+        conn.close()
+        invalidar('tablas')
+        return True
+    except Exception as e:
+        st.warning(f"No se pudieron actualizar estadísticas de {tabla_nombre}: {e}")
+        if conn:
+            conn.close()
+        return False
+
+def eliminar_estadisticas_tabla(tabla_nombre):
+    """Elimina la entrada del catálogo de una tabla"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM egauge_tabla_stats WHERE tabla_nombre = %s", (tabla_nombre,))
+        conn.commit()
+        cur.close()
+        conn.close()
+        invalidar('tablas')
+        return True
+    except Exception:
+        if conn:
+            conn.close()
+        return False
+
+@cache_lectura('tablas', TTL_TABLAS)
+def _consultar_estadisticas_tablas():
+    """Consulta el catálogo de estadísticas; lanza excepción ante errores para no cachearlos"""
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("sin conexión a PostgreSQL")
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            WITH relaciones AS (
+                SELECT c.relname::TEXT AS tabla_nombre, c.oid, c.reltuples
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = 'public'
+                AND c.relkind IN ('r', 'p')
+                AND NOT c.relispartition
+            ),
+            candidatas AS (
+                SELECT tabla_nombre FROM relaciones
+                WHERE tabla_nombre LIKE 'egauge%%'
+                OR tabla_nombre IN (SELECT tabla_nombre::TEXT FROM egauge_clientes)
+                UNION
+                -- Clientes almacenados en la tabla particionada no tienen relación propia
+                SELECT tabla_nombre::TEXT FROM egauge_tabla_stats
+            )
+            SELECT c.tabla_nombre,
+                   COALESCE(s.filas, GREATEST(r.reltuples, 0)::BIGINT, 0) AS filas,
+                   s.tabla_nombre IS NULL AS estimado,
+                   s.primer_timestamp,
+                   s.ultimo_timestamp,
+                   s.ultima_sincronizacion,
+                   pg_size_pretty(COALESCE(s.tamano_bytes, pg_total_relation_size(r.oid), 0)) AS tamano
+            FROM candidatas c
+            LEFT JOIN relaciones r ON r.tabla_nombre = c.tabla_nombre
+            LEFT JOIN egauge_tabla_stats s ON s.tabla_nombre = c.tabla_nombre
+            WHERE c.tabla_nombre <> ALL(%s)
+            ORDER BY c.tabla_nombre;
+        """, (list(TABLAS_SISTEMA),))
+
+        estadisticas = cur.fetchall()
+        cur.close()
+        return estadisticas
+    finally:
+        conn.close()
+
+def obtener_estadisticas_tablas():
+    """
+    Lee el catálogo de estadísticas de todas las tablas de datos
+
+    Las tablas sin entrada en el catálogo usan la estimación de
+    pg_class.reltuples en lugar de un COUNT(*). El resultado se sirve
+    desde la caché mientras ninguna escritura lo invalide.
+
+    Returns:
+        Lista de tuplas (tabla, filas, estimado, primer_ts, ultimo_ts, ultima_sync, tamaño)
+    """
+    try:
+        return _consultar_estadisticas_tablas()
+    except Exception as e:
+        st.error(f"Error leyendo catálogo de estadísticas: {e}")
+        return []
+
+def obtener_resumen_estadisticas():
+    """Retorna (número de tablas, total de filas) leyendo solo el catálogo"""
+    estadisticas = obtener_estadisticas_tablas()
+    total_filas = sum(filas for _, filas, *_ in estadisticas)
+    return len(estadisticas), total_filas
+
+def obtener_marcas_ingesta(tablas):
+    """
+    Marca de agua de ingesta de cada tabla: el updated_at de su entrada en el catálogo
+
+    Cambia con cada ingesta, archivado o recálculo de la tabla, también si la
+    escritura la hizo otro proceso; sirve de llave para las cachés que dependen
+    de las lecturas. Es una búsqueda por llave primaria, sin tocar las lecturas.
+
+    Returns:
+        Tupla ordenada de (tabla, marca); marca es None para tablas sin catálogo.
+        None si hubo error.
+    """
+    tablas = sorted(set(tablas))
+    conn = get_connection()
+    if not conn:
+        return None
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT tabla_nombre, updated_at FROM egauge_tabla_stats
+            WHERE tabla_nombre = ANY(%s)
+        """, (tablas,))
+        marcas = dict(cur.fetchall())
+        cur.close()
+        conn.close()
+        return tuple((tabla, marcas.get(tabla)) for tabla in tablas)
+    except Exception as e:
+        st.warning(f"No se pudieron leer las marcas de ingesta: {e}")
+        if conn:
+            conn.close()
+        return None
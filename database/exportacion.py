@@ -0,0 +1,174 @@
+import os
+import time
+import tempfile
+import streamlit as st
+from .connection import get_connection
+from .esquema import tabla_existe
+from .lecturas import sql_lecturas
+from .archivo import leer_lecturas_archivo
+
+# Carpeta donde se escriben las exportaciones antes de descargarlas
+EXPORTACION_DIR = os.getenv("EGAUGE_EXPORTACION_DIR", "exportaciones")
+
+# Filas por lote leídas del cursor de servidor y escritas al archivo
+TAMANO_LOTE_EXPORTACION = 20_000
+
+# Límite de filas de una hoja de Excel (incluye el encabezado)
+FILAS_POR_HOJA_EXCEL = 1_048_576
+
+FORMATOS_EXPORTACION = {
+    'CSV': '.csv',
+    'Excel': '.xlsx',
+    'Parquet': '.parquet',
+}
+
+def _sql_ancho(tabla_nombre, columnas):
+    """Consulta en formato ancho (timestamp, tarifa, columnas...) con filtro de fechas"""
+    if tabla_existe(tabla_nombre):
+        columnas_sql = ", ".join(f'"{columna}"' for columna in columnas)
+        sql = f"""
+            SELECT "timestamp", tarifa, {columnas_sql}
+            FROM "{tabla_nombre}"
+            WHERE "timestamp" >= %s AND "timestamp" <= %s
+            ORDER BY "timestamp"
+        """
+        return sql, []
+
+    # Tabla particionada: pivotear las lecturas largas de vuelta a una columna por registro
+    fuente_sql, fuente_params = sql_lecturas(tabla_nombre, columnas)
+    columnas_sql = ", ".join(
+        'MAX(l.valor) FILTER (WHERE l.registro = %s) AS "{}"'.format(columna) for columna in columnas
+    )
+    sql = f"""
+        SELECT l."timestamp", MAX(l.tarifa) AS tarifa, {columnas_sql}
+        FROM ({fuente_sql}) l
+        WHERE l."timestamp" >= %s AND l."timestamp" <= %s
+        GROUP BY l."timestamp"
+        ORDER BY l."timestamp"
+    """
+    return sql, list(columnas) + fuente_params
+
+def iterar_lotes_exportacion(tabla_nombre, columnas, fecha_inicio, fecha_fin, tamano_lote=TAMANO_LOTE_EXPORTACION):
+    """
+    Itera las filas a exportar por lotes: primero los meses archivados y luego PostgreSQL
+
+    Las filas de PostgreSQL se leen con un cursor de servidor, así nunca hay
+    más de un lote en memoria sin importar el tamaño de la tabla.
+
+    Yields:
+        Listas de tuplas (timestamp, tarifa, *columnas)
+    """
+    for lote in leer_lecturas_archivo(tabla_nombre, columnas, fecha_inicio, fecha_fin, tamano_lote):
+        lote = lote.astype(object).where(lote.notna(), None)
+        yield list(lote[['timestamp', 'tarifa'] + list(columnas)].itertuples(index=False, name=None))
+
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("sin conexión a PostgreSQL")
+
+    try:
+        sql, params = _sql_ancho(tabla_nombre, columnas)
+        cur = conn.cursor(name=f"exportacion_{tabla_nombre}_{int(time.time())}")
+        cur.itersize = tamano_lote
+        cur.execute(sql, params + [fecha_inicio, fecha_fin])
+        while True:
+            lote = cur.fetchmany(tamano_lote)
+            if not lote:
+                break
+            yield lote
+        cur.close()
+    finally:
+        conn.close()
+
+def _escribir_csv(ruta, encabezados, lotes):
+    import csv
+    filas = 0
+    with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+        writer = csv.writer(archivo)
+        writer.writerow(encabezados)
+        for lote in lotes:
+            writer.writerows(lote)
+            filas += len(lote)
+    return filas
+
+def _escribir_excel(ruta, encabezados, lotes):
+    from openpyxl import Workbook
+
+    # Modo write_only: las filas se escriben a disco sin mantener la hoja en memoria
+    libro = Workbook(write_only=True)
+    hoja = None
+    filas_hoja = FILAS_POR_HOJA_EXCEL
+    filas = 0
+    for lote in lotes:
+        for fila in lote:
+            if filas_hoja >= FILAS_POR_HOJA_EXCEL:
+                hoja = libro.create_sheet(f"Datos {len(libro.worksheets) + 1}")
+                hoja.append(encabezados)
+                filas_hoja = 1
+            hoja.append(fila)
+            filas_hoja += 1
+        filas += len(lote)
+    if hoja is None:
+        libro.create_sheet("Datos 1").append(encabezados)
+    libro.save(ruta)
+    return filas
+
+def _escribir_parquet(ruta, encabezados, lotes):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema(
+        [('timestamp', pa.timestamp('us')), ('tarifa', pa.string())]
+        + [(columna, pa.float64()) for columna in encabezados[2:]]
+    )
+    filas = 0
+    with pq.ParquetWriter(ruta, esquema, compression='zstd') as writer:
+        for lote in lotes:
+            columnas = list(zip(*lote))
+            writer.write_table(pa.table(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(columnas, esquema)],
+                schema=esquema
+            ))
+            filas += len(lote)
+    return filas
+
+ESCRITORES = {
+    'CSV': _escribir_csv,
+    'Excel': _escribir_excel,
+    'Parquet': _escribir_parquet,
+}
+
+def exportar_tabla(tabla_nombre, columnas, fecha_inicio, fecha_fin, formato):
+    """
+    Exporta lecturas de una tabla a un archivo CSV, Excel o Parquet en memoria constante
+
+    Args:
+        columnas: registros a incluir además de timestamp y tarifa
+        fecha_inicio, fecha_fin: datetimes del periodo (inclusive)
+        formato: 'CSV', 'Excel' o 'Parquet'
+
+    Returns:
+        (ruta del archivo, filas exportadas), o (None, 0) si hubo error
+    """
+    if formato not in ESCRITORES:
+        st.error(f"Formato no soportado: {formato}")
+        return None, 0
+
+    os.makedirs(EXPORTACION_DIR, exist_ok=True)
+    nombre = f"{tabla_nombre}_{fecha_inicio:%Y%m%d}_{fecha_fin:%Y%m%d}{FORMATOS_EXPORTACION[formato]}"
+    ruta = os.path.join(EXPORTACION_DIR, nombre)
+    # Temporal único por exportación: dos sesiones con el mismo rango no escriben el mismo archivo
+    with tempfile.NamedTemporaryFile(dir=EXPORTACION_DIR, prefix=nombre + ".", suffix=".tmp", delete=False) as temporal:
+        ruta_temporal = temporal.name
+    encabezados = ['timestamp', 'tarifa'] + list(columnas)
+
+    try:
+        lotes = iterar_lotes_exportacion(tabla_nombre, columnas, fecha_inicio, fecha_fin)
+        filas = ESCRITORES[formato](ruta_temporal, encabezados, lotes)
+        os.replace(ruta_temporal, ruta)
+        return ruta, filas
+    except Exception as e:
+        st.error(f"Error exportando {tabla_nombre}: {e}")
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        return None, 0
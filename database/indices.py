@@ -0,0 +1,153 @@
+import streamlit as st
+import pandas as pd
+from .connection import get_connection
+from .estadisticas import obtener_estadisticas_tablas
+from .esquema import obtener_columnas_numericas
+from .particionado import COLUMNAS_NO_REGISTRO
+
+# A partir de este número de filas el índice único sobre timestamp pasa a ser cubriente
+UMBRAL_CUBRIENTE = 100_000
+
+# El índice cubriente copia tarifa y todos los registros: con más registros
+# que esto duplicaría la tabla y cada inserción escribiría el doble
+MAX_REGISTROS_CUBRIENTE = 8
+
+def _nombre_indice(tabla_nombre, sufijo):
+    """Nombre de índice consistente con el usado por crear_tabla"""
+    return f"idx_{tabla_nombre}_{sufijo}"
+
+def recomendar_indices(tabla_nombre, filas, registros=()):
+    """
+    Determina los índices que debe tener una tabla de cliente según su tamaño
+
+    Cada tabla lleva un solo índice sobre timestamp, el único B-tree que la
+    ingesta necesita como árbitro del UPSERT ON CONFLICT ("timestamp"). En las
+    tablas grandes con pocos registros ese mismo índice es cubriente,
+    ("timestamp") INCLUDE (tarifa, registros): la agregación por periodo de la
+    calculadora se resuelve con un index-only scan y cada inserción sigue
+    escribiendo una sola entrada de B-tree. Los índices de versiones
+    anteriores de la estrategia (BRIN y cubriente aparte sobre timestamp,
+    tarifa) se eliminan: duplicaban escrituras sin que el planificador los
+    necesitara junto al B-tree.
+
+    Returns:
+        (crear, eliminar): listas de (nombre_indice, sql) y nombres de índices a borrar
+    """
+    if filas >= UMBRAL_CUBRIENTE and 0 < len(registros) <= MAX_REGISTROS_CUBRIENTE:
+        arbitro = _nombre_indice(tabla_nombre, 'timestamp_cubriente')
+        incluidas = ", ".join(f'"{col}"' for col in ['tarifa'] + list(registros))
+        sql = (
+            f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "{arbitro}" '
+            f'ON "{tabla_nombre}" ("timestamp") INCLUDE ({incluidas})'
+        )
+    else:
+        arbitro = _nombre_indice(tabla_nombre, 'timestamp')
+        sql = f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "{arbitro}" ON "{tabla_nombre}" ("timestamp")'
+
+    # El árbitro nuevo se crea antes de borrar el anterior: el UPSERT nunca se queda sin índice único
+    crear = [(arbitro, sql)]
+    eliminar = [
+        _nombre_indice(tabla_nombre, sufijo)
+        for sufijo in ('timestamp', 'timestamp_cubriente', 'cubriente', 'timestamp_brin', 'tarifa')
+        if _nombre_indice(tabla_nombre, sufijo) != arbitro
+    ]
+
+    return crear, eliminar
+
+def aplicar_estrategia_indices(tabla_nombre, filas):
+    """Crea y elimina índices de una tabla según la estrategia recomendada"""
+    registros = obtener_columnas_numericas(tabla_nombre, excluir=COLUMNAS_NO_REGISTRO)
+    crear, eliminar = recomendar_indices(tabla_nombre, filas, registros)
+
+    conn = get_connection()
+    if not conn:
+        return []
+
+    acciones = []
+    try:
+        # CREATE/DROP INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+        conn.autocommit = True
+        cur = conn.cursor()
+
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'"{tabla_nombre}"',))
+        if not cur.fetchone()[0]:
+            # Cliente en la tabla particionada: sus índices son los de egauge_lecturas
+            cur.close()
+            conn.close()
+            return []
+
+        cur.execute("SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = %s", (tabla_nombre,))
+        existentes = {row[0] for row in cur.fetchall()}
+
+        for nombre, sql in crear:
+            if nombre not in existentes:
+                cur.execute(sql)
+                acciones.append(f"➕ {nombre}")
+
+        for nombre in eliminar:
+            if nombre in existentes:
+                cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{nombre}"')
+                acciones.append(f"➖ {nombre}")
+
+        cur.close()
+        conn.close()
+        return acciones
+
+    except Exception as e:
+        st.error(f"Error aplicando índices en {tabla_nombre}: {e}")
+        if conn:
+            conn.close()
+        return acciones
+
+def aplicar_estrategia_todas():
+    """Aplica la estrategia de índices a todas las tablas de datos con relación propia"""
+    resultados = {}
+    for tabla_nombre, filas, *_ in obtener_estadisticas_tablas():
+        acciones = aplicar_estrategia_indices(tabla_nombre, filas)
+        if acciones:
+            resultados[tabla_nombre] = acciones
+    return resultados
+
+def obtener_reporte_indices():
+    """Tamaño y uso de cada índice de las tablas de datos según pg_stat_user_indexes"""
+    conn = get_connection()
+    if not conn:
+        return pd.DataFrame()
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT s.relname,
+                   s.indexrelname,
+                   am.amname,
+                   i.indisunique,
+                   pg_relation_size(s.indexrelid) AS bytes,
+                   pg_size_pretty(pg_relation_size(s.indexrelid)),
+                   s.idx_scan,
+                   s.idx_tup_read,
+                   s.idx_tup_fetch
+            FROM pg_stat_user_indexes s
+            JOIN pg_index i ON i.indexrelid = s.indexrelid
+            JOIN pg_class c ON c.oid = s.indexrelid
+            JOIN pg_am am ON am.oid = c.relam
+            WHERE s.schemaname = 'public'
+            AND (
+                s.relname LIKE 'egauge%'
+                OR s.relname::TEXT IN (SELECT tabla_nombre::TEXT FROM egauge_clientes)
+            )
+            ORDER BY bytes DESC
+        """)
+        filas = cur.fetchall()
+        cur.close()
+        conn.close()
+
+        df = pd.DataFrame(filas, columns=[
+            'Tabla', 'Índice', 'Tipo', 'Único', 'bytes', 'Tamaño', 'Escaneos', 'Tuplas leídas', 'Tuplas obtenidas'
+        ])
+        return df.drop(columns=['bytes'])
+
+    except Exception as e:
+        st.error(f"Error obteniendo reporte de índices: {e}")
+        if conn:
+            conn.close()
+        return pd.DataFrame()
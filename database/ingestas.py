@@ -0,0 +1,149 @@
+import streamlit as st
+import pandas as pd
+from .connection import get_connection
+
+def crear_tabla_ingestas():
+    """Crea la bitácora de corridas de ingesta"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS egauge_ingest_runs (
+                id BIGSERIAL PRIMARY KEY,
+                tabla_nombre VARCHAR(255) NOT NULL,
+                host VARCHAR(255) NOT NULL,
+                iniciado_en TIMESTAMP NOT NULL,
+                rango_inicio TIMESTAMP,
+                rango_fin TIMESTAMP,
+                ventanas_planeadas INTEGER NOT NULL,
+                peticiones INTEGER NOT NULL,
+                filas INTEGER NOT NULL,
+                filas_nuevas INTEGER NOT NULL,
+                errores INTEGER NOT NULL,
+                bytes BIGINT NOT NULL,
+                duracion_s REAL NOT NULL,
+                filas_por_s REAL NOT NULL,
+                exito BOOLEAN NOT NULL
+            );
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_egauge_ingest_runs_fecha ON egauge_ingest_runs (iniciado_en);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_egauge_ingest_runs_tabla ON egauge_ingest_runs (tabla_nombre, iniciado_en);")
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        st.error(f"Error creando bitácora de ingestas: {e}")
+        if conn:
+            conn.close()
+        return False
+
+def registrar_ingesta(corrida):
+    """
+    Agrega una corrida a la bitácora
+
+    Args:
+        corrida: dict con las columnas de egauge_ingest_runs (sin id)
+    """
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO egauge_ingest_runs (
+                tabla_nombre, host, iniciado_en, rango_inicio, rango_fin, ventanas_planeadas,
+                peticiones, filas, filas_nuevas, errores, bytes, duracion_s, filas_por_s, exito
+            ) VALUES (
+                %(tabla_nombre)s, %(host)s, %(iniciado_en)s, %(rango_inicio)s, %(rango_fin)s, %(ventanas_planeadas)s,
+                %(peticiones)s, %(filas)s, %(filas_nuevas)s, %(errores)s, %(bytes)s, %(duracion_s)s, %(filas_por_s)s, %(exito)s
+            )
+        """, corrida)
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        st.warning(f"No se pudo registrar la ingesta de {corrida.get('tabla_nombre')}: {e}")
+        if conn:
+            conn.close()
+        return False
+
+def obtener_corridas(desde, tabla_nombre=None):
+    """
+    Corridas de ingesta desde una fecha, de la más vieja a la más reciente
+
+    Returns:
+        DataFrame con las columnas de egauge_ingest_runs
+    """
+    conn = get_connection()
+    if not conn:
+        return pd.DataFrame()
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT tabla_nombre, host, iniciado_en, rango_inicio, rango_fin, ventanas_planeadas,
+                   peticiones, filas, filas_nuevas, errores, bytes, duracion_s, filas_por_s, exito
+            FROM egauge_ingest_runs
+            WHERE iniciado_en >= %s
+            AND (%s::TEXT IS NULL OR tabla_nombre = %s)
+            ORDER BY iniciado_en
+        """, (desde, tabla_nombre, tabla_nombre))
+        columnas = [descripcion[0] for descripcion in cur.description]
+        corridas = pd.DataFrame(cur.fetchall(), columns=columnas)
+        cur.close()
+        conn.close()
+        return corridas
+    except Exception as e:
+        st.error(f"Error leyendo bitácora de ingestas: {e}")
+        if conn:
+            conn.close()
+        return pd.DataFrame()
+
+def obtener_tendencias_clientes(dias_recientes=7, dias_referencia=30):
+    """
+    Compara el rendimiento mediano reciente de cada cliente contra su referencia
+
+    Returns:
+        DataFrame tabla_nombre, corridas_recientes, filas_por_s_reciente,
+        filas_por_s_referencia, cambio_pct (negativo = más lento)
+    """
+    conn = get_connection()
+    if not conn:
+        return pd.DataFrame()
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT tabla_nombre,
+                   COUNT(*) FILTER (WHERE reciente),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY filas_por_s) FILTER (WHERE reciente),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY filas_por_s) FILTER (WHERE NOT reciente)
+            FROM (
+                SELECT tabla_nombre, filas_por_s,
+                       iniciado_en >= CURRENT_TIMESTAMP - make_interval(days => %s) AS reciente
+                FROM egauge_ingest_runs
+                WHERE iniciado_en >= CURRENT_TIMESTAMP - make_interval(days => %s)
+                AND exito AND filas > 0
+            ) corridas
+            GROUP BY tabla_nombre
+            ORDER BY tabla_nombre
+        """, (dias_recientes, dias_recientes + dias_referencia))
+        filas = cur.fetchall()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        st.error(f"Error calculando tendencias de ingesta: {e}")
+        if conn:
+            conn.close()
+        return pd.DataFrame()
+
+    df = pd.DataFrame(filas, columns=['tabla_nombre', 'corridas_recientes', 'filas_por_s_reciente', 'filas_por_s_referencia'])
+    df[['filas_por_s_reciente', 'filas_por_s_referencia']] = df[['filas_por_s_reciente', 'filas_por_s_referencia']].astype(float)
+    df['cambio_pct'] = (df['filas_por_s_reciente'] / df['filas_por_s_referencia'] - 1) * 100
+    return df
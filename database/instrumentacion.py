@@ -0,0 +1,211 @@
+import os
+import re
+import sys
+import time
+import threading
+import contextvars
+from datetime import datetime
+from collections import deque, Counter
+from psycopg2.extensions import cursor as _cursor_base
+
+# Instrumentación de consultas: cada cursor creado por get_connection() registra
+# duración, filas y punto de llamada de cada sentencia. Las métricas viven en
+# memoria del proceso de Streamlit, por lo que agregan todas las sesiones.
+# pandas se importa solo en los resúmenes: este módulo carga con cada conexión.
+INSTRUMENTAR_CONSULTAS = os.getenv("EGAUGE_INSTRUMENTAR_CONSULTAS", "1") != "0"
+UMBRAL_LENTA_MS = float(os.getenv("EGAUGE_UMBRAL_CONSULTA_LENTA_MS", "500"))
+VENTANA_HISTOGRAMA_S = int(os.getenv("EGAUGE_VENTANA_HISTOGRAMA_S", "900"))
+
+LIMITES_HISTOGRAMA_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+MAX_MUESTRAS = 20_000
+MAX_LENTAS = 200
+MAX_LARGO_SQL = 300
+
+_ARCHIVOS_IGNORADOS = (os.path.abspath(__file__), os.sep + "psycopg2" + os.sep)
+
+_pagina_actual = contextvars.ContextVar("pagina_actual", default="(sin página)")
+
+_lock = threading.Lock()
+_muestras = deque(maxlen=MAX_MUESTRAS)
+_lentas = deque(maxlen=MAX_LENTAS)
+_por_sentencia = {}
+_por_pagina = {}
+_iniciado_en = time.time()
+
+_RE_CADENA = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTA_VALORES = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+def normalizar_sentencia(sql):
+    """Reduce una sentencia a su forma sin literales para agrupar ejecuciones equivalentes"""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", errors="replace")
+    else:
+        sql = str(sql)
+    sql = _RE_CADENA.sub("?", sql)
+    sql = _RE_NUMERO.sub("?", sql)
+    sql = _RE_LISTA_VALORES.sub("(?, ...)", sql)
+    sql = _RE_ESPACIOS.sub(" ", sql).strip()
+    return sql[:MAX_LARGO_SQL]
+
+def _punto_de_llamada():
+    """Primer marco de la pila fuera de psycopg2 y de este módulo"""
+    marco = sys._getframe(1)
+    while marco is not None:
+        archivo = marco.f_code.co_filename
+        if not any(ignorado in archivo for ignorado in _ARCHIVOS_IGNORADOS):
+            return f"{os.path.relpath(archivo)}:{marco.f_lineno} {marco.f_code.co_name}"
+        marco = marco.f_back
+    return "(desconocido)"
+
+def establecer_pagina(pagina):
+    """Etiqueta las consultas siguientes del hilo actual con la página que las originó"""
+    _pagina_actual.set(pagina)
+
+def registrar_consulta(sql, duracion_ms, filas, sitio, error=None):
+    """Registra una ejecución en el histograma, el agregado por sentencia y el log de lentas"""
+    clave = normalizar_sentencia(sql)
+    pagina = _pagina_actual.get()
+    ahora = time.time()
+
+    with _lock:
+        _muestras.append((ahora, duracion_ms))
+
+        agregado = _por_sentencia.get(clave)
+        if agregado is None:
+            agregado = _por_sentencia[clave] = {
+                'llamadas': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'filas': 0,
+                'errores': 0, 'sitios': Counter(), 'paginas': Counter()
+            }
+        agregado['llamadas'] += 1
+        agregado['total_ms'] += duracion_ms
+        agregado['max_ms'] = max(agregado['max_ms'], duracion_ms)
+        agregado['filas'] += max(filas, 0)
+        agregado['sitios'][sitio] += 1
+        agregado['paginas'][pagina] += 1
+        if error:
+            agregado['errores'] += 1
+
+        acumulado = _por_pagina.setdefault(pagina, [0, 0.0])
+        acumulado[0] += 1
+        acumulado[1] += duracion_ms
+
+        if duracion_ms >= UMBRAL_LENTA_MS:
+            _lentas.append({
+                'Momento': datetime.fromtimestamp(ahora),
+                'Duración (ms)': round(duracion_ms, 1),
+                'Filas': filas,
+                'Página': pagina,
+                'Llamado desde': sitio,
+                'Sentencia': clave,
+                'Error': error or ''
+            })
+
+class CursorInstrumentado(_cursor_base):
+    """Cursor de psycopg2 que mide cada execute/executemany"""
+
+    def _medir(self, metodo, query, vars):
+        sitio = _punto_de_llamada()
+        inicio = time.perf_counter()
+        error = None
+        try:
+            return metodo(query, vars)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duracion_ms = (time.perf_counter() - inicio) * 1000
+            registrar_consulta(query, duracion_ms, self.rowcount, sitio, error)
+
+    def execute(self, query, vars=None):
+        return self._medir(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._medir(super().executemany, query, vars_list)
+
+def obtener_histograma(ventana_s=None):
+    """Histograma de duraciones de las consultas de la ventana móvil"""
+    import pandas as pd
+    ventana_s = ventana_s or VENTANA_HISTOGRAMA_S
+    desde = time.time() - ventana_s
+    with _lock:
+        duraciones = [d for t, d in _muestras if t >= desde]
+
+    etiquetas = [f"≤{limite} ms" for limite in LIMITES_HISTOGRAMA_MS] + [f">{LIMITES_HISTOGRAMA_MS[-1]} ms"]
+    conteos = [0] * len(etiquetas)
+    for duracion in duraciones:
+        for i, limite in enumerate(LIMITES_HISTOGRAMA_MS):
+            if duracion <= limite:
+                conteos[i] += 1
+                break
+        else:
+            conteos[-1] += 1
+
+    return pd.DataFrame({'Rango': etiquetas, 'Consultas': conteos})
+
+def obtener_percentiles(ventana_s=None):
+    """Percentiles p50/p95/p99 y total de consultas de la ventana móvil"""
+    import pandas as pd
+    ventana_s = ventana_s or VENTANA_HISTOGRAMA_S
+    desde = time.time() - ventana_s
+    with _lock:
+        duraciones = pd.Series([d for t, d in _muestras if t >= desde], dtype=float)
+
+    if duraciones.empty:
+        return {'consultas': 0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'por_segundo': 0.0}
+    return {
+        'consultas': len(duraciones),
+        'p50': duraciones.quantile(0.50),
+        'p95': duraciones.quantile(0.95),
+        'p99': duraciones.quantile(0.99),
+        'por_segundo': len(duraciones) / max(min(ventana_s, time.time() - _iniciado_en), 1)
+    }
+
+def obtener_top_sentencias(limite=20):
+    """Sentencias ordenadas por tiempo total acumulado"""
+    import pandas as pd
+    with _lock:
+        filas = [
+            {
+                'Sentencia': clave,
+                'Llamadas': a['llamadas'],
+                'Total (ms)': round(a['total_ms'], 1),
+                'Promedio (ms)': round(a['total_ms'] / a['llamadas'], 2),
+                'Máx (ms)': round(a['max_ms'], 1),
+                'Filas': a['filas'],
+                'Errores': a['errores'],
+                'Páginas': ", ".join(f"{p} ({n})" for p, n in a['paginas'].most_common(3)),
+                'Llamado desde': a['sitios'].most_common(1)[0][0]
+            }
+            for clave, a in _por_sentencia.items()
+        ]
+    filas.sort(key=lambda fila: fila['Total (ms)'], reverse=True)
+    return pd.DataFrame(filas[:limite])
+
+def obtener_tiempo_por_pagina():
+    """Tiempo total de base de datos por página desde el último reinicio"""
+    import pandas as pd
+    with _lock:
+        filas = [
+            {'Página': pagina, 'Consultas': llamadas, 'Total (ms)': round(total_ms, 1)}
+            for pagina, (llamadas, total_ms) in _por_pagina.items()
+        ]
+    filas.sort(key=lambda fila: fila['Total (ms)'], reverse=True)
+    return pd.DataFrame(filas)
+
+def obtener_consultas_lentas():
+    """Últimas consultas que superaron el umbral, de la más reciente a la más antigua"""
+    import pandas as pd
+    with _lock:
+        return pd.DataFrame(list(reversed(_lentas)))
+
+def reiniciar_metricas():
+    """Descarta todas las métricas acumuladas"""
+    global _iniciado_en
+    with _lock:
+        _muestras.clear()
+        _lentas.clear()
+        _por_sentencia.clear()
+        _por_pagina.clear()
+        _iniciado_en = time.time()
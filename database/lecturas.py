@@ -0,0 +1,64 @@
+from .esquema import obtener_columnas_numericas, obtener_registros_particionado_cache
+from .particionado import usa_particionado, obtener_registros_cliente, COLUMNAS_NO_REGISTRO
+
+# Tope del intervalo de una lectura al convertir kWh en kW: una lectura después
+# de un hueco largo no diluye la demanda del bucket
+INTERVALO_MAXIMO_S = 3600
+
+def sql_cuarto_hora(expresion):
+    """Inicio del cuarto de hora (intervalo de demanda de CFE) que contiene `expresion`; date_trunc no lo tiene"""
+    return f"(date_trunc('hour', {expresion}) + floor(date_part('minute', {expresion}) / 15) * INTERVAL '15 minutes')"
+
+def sql_intervalo_lectura(ventana):
+    """
+    Segundos que cubre cada lectura, para convertir su energía en demanda
+
+    Cada lectura es la energía de su intervalo (1 min, 15 min o 1 h según la
+    ingesta): se toma la distancia a la lectura anterior, o a la siguiente
+    para la primera, con tope INTERVALO_MAXIMO_S.
+
+    Args:
+        ventana: nombre de una cláusula WINDOW ordenada por "timestamp"
+    """
+    return f"""LEAST(COALESCE(
+        EXTRACT(EPOCH FROM "timestamp" - LAG("timestamp") OVER {ventana}),
+        EXTRACT(EPOCH FROM LEAD("timestamp") OVER {ventana} - "timestamp"),
+        {INTERVALO_MAXIMO_S}
+    ), {INTERVALO_MAXIMO_S})"""
+
+def obtener_registros(tabla_nombre):
+    """Retorna las columnas de medición (registros) de un cliente según el modo de almacenamiento"""
+    if usa_particionado():
+        return obtener_registros_particionado_cache(tabla_nombre, lambda: obtener_registros_cliente(tabla_nombre))
+    return obtener_columnas_numericas(tabla_nombre, excluir=COLUMNAS_NO_REGISTRO)
+
+def sql_lecturas(tabla_nombre, registros):
+    """
+    Subconsulta de lecturas en formato largo, independiente del modo de almacenamiento
+
+    La subconsulta expone las columnas "timestamp", tarifa, registro y valor.
+    Los filtros de fecha aplicados por fuera se propagan a la tabla de origen,
+    por lo que siguen usando índices y poda de particiones.
+
+    Returns:
+        (sql, params) para usar como FROM ({sql}) alias
+    """
+    if usa_particionado():
+        sql = """
+            SELECT "timestamp", tarifa, registro, valor
+            FROM egauge_lecturas
+            WHERE cliente_id = (SELECT id FROM egauge_clientes WHERE tabla_nombre = %s)
+            AND registro = ANY(%s)
+        """
+        return sql, [tabla_nombre, list(registros)]
+
+    # El nombre va como parámetro y como identificador citado (las comillas dobles se duplican)
+    valores_sql = ", ".join(
+        '(%s, t."{}"::DOUBLE PRECISION)'.format(registro.replace('"', '""')) for registro in registros
+    )
+    sql = f"""
+        SELECT t."timestamp", t."tarifa" AS tarifa, v.registro, v.valor
+        FROM "{tabla_nombre}" t
+        CROSS JOIN LATERAL (VALUES {valores_sql}) AS v(registro, valor)
+    """
+    return sql, list(registros)
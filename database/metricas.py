@@ -0,0 +1,111 @@
+import os
+import threading
+import streamlit as st
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, start_http_server
+from prometheus_client import ProcessCollector, PlatformCollector
+
+# Métricas operativas de la ingesta y de PostgreSQL en formato Prometheus. Viven
+# en memoria del proceso (agregan todas las sesiones de Streamlit) y se exponen
+# en un endpoint HTTP local; no requieren un servidor de Prometheus corriendo:
+#   curl http://127.0.0.1:9108/metrics
+# EGAUGE_METRICAS_PUERTO=0 desactiva el endpoint (las métricas se siguen contando).
+PUERTO_METRICAS = int(os.getenv("EGAUGE_METRICAS_PUERTO", "9108"))
+DIRECCION_METRICAS = os.getenv("EGAUGE_METRICAS_DIRECCION", "127.0.0.1")
+
+# Registro propio: recargar el módulo (modo desarrollo de Streamlit) no choca
+# con métricas ya registradas en el registro global de prometheus_client
+REGISTRO = CollectorRegistry()
+ProcessCollector(registry=REGISTRO)
+PlatformCollector(registry=REGISTRO)
+
+LIMITES_DESCARGA_S = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+LIMITES_PROCESO_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+LATENCIA_DESCARGA = Histogram(
+    'egauge_descarga_segundos', 'Latencia de cada petición CSV a un medidor eGauge',
+    ['host'], buckets=LIMITES_DESCARGA_S, registry=REGISTRO
+)
+BYTES_DESCARGADOS = Counter(
+    'egauge_descarga_bytes', 'Bytes de CSV recibidos de los medidores',
+    ['host'], registry=REGISTRO
+)
+FILAS_PARSEADAS = Counter(
+    'egauge_filas_parseadas', 'Filas de CSV convertidas a DataFrame',
+    registry=REGISTRO
+)
+FILAS_ESCRITAS = Counter(
+    'egauge_filas_escritas', 'Filas escritas en PostgreSQL (insertadas o actualizadas)',
+    registry=REGISTRO
+)
+FILAS_NUEVAS = Counter(
+    'egauge_filas_nuevas', 'Filas escritas en PostgreSQL que no existían',
+    registry=REGISTRO
+)
+TIEMPO_CLASIFICACION = Histogram(
+    'egauge_clasificacion_segundos', 'Tiempo de clasificación de tarifas de un CSV',
+    buckets=LIMITES_PROCESO_S, registry=REGISTRO
+)
+ESPERA_POOL = Histogram(
+    'egauge_espera_pool_segundos', 'Espera antes de obtener un recurso: cola del pool de descargas o conexión a PostgreSQL',
+    ['pool'], buckets=LIMITES_PROCESO_S + (10, 30), registry=REGISTRO
+)
+COLA_DESCARGAS = Gauge(
+    'egauge_cola_descargas', 'Ventanas enviadas al pool de descargas que aún no empiezan',
+    registry=REGISTRO
+)
+ERRORES = Counter(
+    'egauge_errores', 'Errores de la ingesta y de PostgreSQL por tipo',
+    ['tipo'], registry=REGISTRO
+)
+
+_servidor_lock = threading.Lock()
+_servidor_iniciado = False
+# Error del primer intento fallido de abrir el puerto; no se reintenta en cada rerun
+_fallo_servidor = None
+
+def iniciar_servidor_metricas(puerto=PUERTO_METRICAS, direccion=DIRECCION_METRICAS, reintentar=False):
+    """
+    Inicia (una vez por proceso) el endpoint /metrics en un hilo de fondo
+
+    Si el puerto está ocupado el fallo se registra una sola vez por proceso
+    (advertencia y ERRORES{tipo="metricas"}) y los reruns siguientes no
+    vuelven a intentarlo; `reintentar=True` lo intenta de nuevo (ver
+    views/rendimiento.py).
+
+    Returns:
+        True si el endpoint está escuchando; False si está desactivado o el puerto está ocupado
+    """
+    global _servidor_iniciado, _fallo_servidor
+    if not puerto:
+        return False
+
+    with _servidor_lock:
+        if _servidor_iniciado:
+            return True
+        if _fallo_servidor is not None and not reintentar:
+            return False
+        try:
+            start_http_server(puerto, addr=direccion, registry=REGISTRO)
+        except OSError as e:
+            if _fallo_servidor is None:
+                ERRORES.labels('metricas').inc()
+                st.warning(f"No se pudo abrir el endpoint de métricas en {direccion}:{puerto}: {e}")
+            _fallo_servidor = str(e)
+            return False
+        _servidor_iniciado = True
+        _fallo_servidor = None
+        return True
+
+def error_servidor_metricas():
+    """Error con el que falló el endpoint de métricas; None si no ha fallado"""
+    return _fallo_servidor
+
+def url_metricas():
+    """URL del endpoint de métricas; None si no está escuchando"""
+    if not _servidor_iniciado:
+        return None
+    return f"http://{DIRECCION_METRICAS}:{PUERTO_METRICAS}/metrics"
+
+def exportar_metricas():
+    """Texto en formato de exposición de Prometheus, el mismo que sirve el endpoint"""
+    return generate_latest(REGISTRO).decode('utf-8')
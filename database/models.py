@@ -1,6 +1,22 @@
 import streamlit as st
 import pandas as pd
+from psycopg2.extras import execute_values
 from .connection import get_connection
+from .estadisticas import obtener_estadisticas_tablas, eliminar_estadisticas_tabla
+from .particionado import usa_particionado, eliminar_lecturas_cliente
+from .rollups import eliminar_rollups_tabla
+from .archivo import eliminar_archivo_tabla
+from .esquema import invalidar_esquema
+from .cache import cache_lectura, invalidar, TTL_CLIENTES
+
+# Clientes por statement en el UPSERT por lotes
+TAMANO_LOTE_CLIENTES = 1000
+
+# Tarjetas por página en el dashboard (múltiplo de 3 columnas)
+TAMANO_PAGINA_CLIENTES = 24
+
+# None hasta comprobar si la extensión pg_trgm está instalada
+_PG_TRGM = None
 
 def crear_tabla_clientes():
     """Crea tabla para guardar la lista de clientes"""
@@ -28,6 +44,23 @@ def crear_tabla_clientes():
         cur.execute("""
             CREATE INDEX IF NOT EXISTS idx_egauge_clientes_activo ON egauge_clientes(activo);
             CREATE INDEX IF NOT EXISTS idx_egauge_clientes_hostname ON egauge_clientes(hostname);
+            CREATE INDEX IF NOT EXISTS idx_egauge_clientes_nombre ON egauge_clientes(nombre_cliente, id);
+        """)
+        
+        # Índices de búsqueda: trigramas si pg_trgm está disponible, prefijos si no
+        cur.execute("SAVEPOINT pg_trgm")
+        try:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_egauge_clientes_nombre_trgm ON egauge_clientes USING GIN (nombre_cliente gin_trgm_ops);
+                CREATE INDEX IF NOT EXISTS idx_egauge_clientes_hostname_trgm ON egauge_clientes USING GIN (hostname gin_trgm_ops);
+            """)
+        except Exception:
+            # Sin permisos para instalar la extensión
+            cur.execute("ROLLBACK TO SAVEPOINT pg_trgm")
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_egauge_clientes_nombre_prefijo ON egauge_clientes (lower(nombre_cliente) text_pattern_ops);
+            CREATE INDEX IF NOT EXISTS idx_egauge_clientes_hostname_prefijo ON egauge_clientes (lower(hostname) text_pattern_ops);
         """)
         
         conn.commit()
@@ -41,7 +74,16 @@ def crear_tabla_clientes():
         return False
 
 def guardar_clientes(clientes_lista_completa):
-    """Guarda la lista de clientes en la base de datos"""
+    """Guarda la lista de clientes en la base de datos con un UPSERT por lotes"""
+    if not clientes_lista_completa:
+        return 0, 0
+    
+    # Un mismo statement no puede actualizar dos veces la misma fila:
+    # si hay tablas duplicadas gana la última aparición
+    clientes_unicos = {}
+    for nombre_cliente, hostname, url_completa, tabla_nombre in clientes_lista_completa:
+        clientes_unicos[tabla_nombre] = (nombre_cliente, hostname, url_completa, tabla_nombre)
+    
     conn = get_connection()
     if not conn:
         return 0, 0
@@ -49,35 +91,27 @@ def guardar_clientes(clientes_lista_completa):
     try:
         cur = conn.cursor()
         
-        clientes_guardados = 0
-        clientes_actualizados = 0
+        resultado = execute_values(cur, """
+            INSERT INTO egauge_clientes (nombre_cliente, hostname, url_completa, tabla_nombre)
+            VALUES %s
+            ON CONFLICT (tabla_nombre) 
+            DO UPDATE SET 
+                nombre_cliente = EXCLUDED.nombre_cliente,
+                hostname = EXCLUDED.hostname,
+                url_completa = EXCLUDED.url_completa,
+                updated_at = CURRENT_TIMESTAMP,
+                activo = TRUE
+            RETURNING (xmax = 0)
+        """, list(clientes_unicos.values()), page_size=TAMANO_LOTE_CLIENTES, fetch=True)
         
-        for nombre_cliente, hostname, url_completa, tabla_nombre in clientes_lista_completa:
-            try:
-                cur.execute("""
-                    INSERT INTO egauge_clientes (nombre_cliente, hostname, url_completa, tabla_nombre)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (tabla_nombre) 
-                    DO UPDATE SET 
-                        nombre_cliente = EXCLUDED.nombre_cliente,
-                        hostname = EXCLUDED.hostname,
-                        url_completa = EXCLUDED.url_completa,
-                        updated_at = CURRENT_TIMESTAMP,
-                        activo = TRUE
-                """, (nombre_cliente, hostname, url_completa, tabla_nombre))
-                
-                if cur.rowcount == 1:
-                    clientes_guardados += 1
-                else:
-                    clientes_actualizados += 1
-                    
-            except Exception as e:
-                st.warning(f"Error guardando cliente {nombre_cliente}: {e}")
-                continue
+        # xmax = 0 solo en filas recién insertadas; las actualizadas tienen xmax del UPSERT
+        clientes_guardados = sum(1 for (insertado,) in resultado if insertado)
+        clientes_actualizados = len(resultado) - clientes_guardados
         
         conn.commit()
         cur.close()
         conn.close()
+        invalidar('clientes', 'tablas')
         
         return clientes_guardados, clientes_actualizados
         
@@ -87,11 +121,12 @@ def guardar_clientes(clientes_lista_completa):
             conn.close()
         return 0, 0
 
-def cargar_clientes(solo_activos=True):
-    """Carga la lista de clientes desde la base de datos"""
+@cache_lectura('clientes', TTL_CLIENTES)
+def _consultar_clientes(solo_activos):
+    """Consulta la lista de clientes; lanza excepción ante errores para no cachearlos"""
     conn = get_connection()
     if not conn:
-        return []
+        raise ConnectionError("sin conexión a PostgreSQL")
         
     try:
         cur = conn.cursor()
@@ -112,15 +147,138 @@ def cargar_clientes(solo_activos=True):
         
         clientes = cur.fetchall()
         cur.close()
-        conn.close()
         return clientes
-        
+    finally:
+        conn.close()
+
+def cargar_clientes(solo_activos=True):
+    """Carga la lista de clientes (desde la caché mientras ninguna escritura la invalide)"""
+    try:
+        return _consultar_clientes(solo_activos)
     except Exception as e:
         st.error(f"Error cargando clientes: {e}")
-        if conn:
-            conn.close()
         return []
 
+def _escapar_like(texto):
+    """Escapa los comodines de LIKE en un texto de búsqueda"""
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _trigramas_disponibles(cur):
+    """Indica (una vez por proceso) si pg_trgm está instalada en la base de datos"""
+    global _PG_TRGM
+    if _PG_TRGM is None:
+        cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+        _PG_TRGM = cur.fetchone()[0]
+    return _PG_TRGM
+
+@cache_lectura('clientes', TTL_CLIENTES)
+def _consultar_busqueda_clientes(texto, estado, pagina, tamano_pagina):
+    """Consulta una página de la búsqueda de clientes y el total; lanza excepción ante errores"""
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("sin conexión a PostgreSQL")
+        
+    try:
+        cur = conn.cursor()
+        params = {
+            'estado': estado,
+            'texto': texto,
+            'contiene': f"%{_escapar_like(texto)}%" if texto else None,
+            'prefijo': f"{_escapar_like(texto)}%" if texto else None,
+            'limite': tamano_pagina,
+            'desde': pagina * tamano_pagina,
+        }
+        
+        if not texto:
+            filtro_texto = "TRUE"
+            orden = "nombre_cliente, id"
+        elif _trigramas_disponibles(cur):
+            # Coincidencias por subcadena o similitud de palabras (índices GIN de trigramas);
+            # primero los prefijos y luego por similitud
+            filtro_texto = """(
+                nombre_cliente ILIKE %(contiene)s OR hostname ILIKE %(contiene)s
+                OR %(texto)s <%% nombre_cliente OR %(texto)s <%% hostname
+            )"""
+            orden = """(nombre_cliente ILIKE %(prefijo)s OR hostname ILIKE %(prefijo)s) DESC,
+                GREATEST(word_similarity(%(texto)s, nombre_cliente), word_similarity(%(texto)s, hostname)) DESC,
+                nombre_cliente, id"""
+        else:
+            # Sin pg_trgm: solo prefijos, resueltos con los índices text_pattern_ops
+            filtro_texto = "(lower(nombre_cliente) LIKE lower(%(prefijo)s) OR lower(hostname) LIKE lower(%(prefijo)s))"
+            orden = "nombre_cliente, id"
+        
+        # COUNT(*) OVER () trae el total filtrado en la misma consulta que la página
+        cur.execute(f"""
+            SELECT nombre_cliente, hostname, url_completa, tabla_nombre, id, activo, COUNT(*) OVER ()
+            FROM egauge_clientes
+            WHERE (%(estado)s = 'todos' OR activo = (%(estado)s = 'activos'))
+            AND {filtro_texto}
+            ORDER BY {orden}
+            LIMIT %(limite)s OFFSET %(desde)s
+        """, params)
+        
+        filas = cur.fetchall()
+        cur.close()
+        total = filas[0][-1] if filas else 0
+        return [fila[:-1] for fila in filas], total
+    finally:
+        conn.close()
+
+def buscar_clientes(texto=None, estado='activos', pagina=0, tamano_pagina=TAMANO_PAGINA_CLIENTES):
+    """
+    Busca clientes por nombre o hostname en PostgreSQL, ordenados por relevancia
+    
+    Con pg_trgm se aceptan subcadenas y errores de escritura; sin la extensión
+    la búsqueda es por prefijo. Sin texto se listan en orden alfabético.
+    
+    Args:
+        estado: 'activos', 'inactivos' o 'todos'
+    
+    Returns:
+        (clientes de la página como (nombre, hostname, url, tabla, id, activo), total de coincidencias)
+    """
+    try:
+        return _consultar_busqueda_clientes((texto or '').strip() or None, estado, pagina, tamano_pagina)
+    except Exception as e:
+        st.error(f"Error buscando clientes: {e}")
+        return [], 0
+
+def cargar_clientes_pagina(pagina=0, tamano_pagina=TAMANO_PAGINA_CLIENTES, solo_activos=True, buscar=None):
+    """
+    Carga una página de clientes con el mismo formato que cargar_clientes()
+    
+    Returns:
+        (clientes de la página, total de clientes que cumplen el filtro)
+    """
+    clientes, total = buscar_clientes(buscar, 'activos' if solo_activos else 'todos', pagina, tamano_pagina)
+    if solo_activos:
+        clientes = [cliente[:5] for cliente in clientes]
+    return clientes, total
+
+@cache_lectura('clientes', TTL_CLIENTES)
+def _consultar_conteo_clientes():
+    """Cuenta clientes totales y activos; lanza excepción ante errores"""
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("sin conexión a PostgreSQL")
+        
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*), COUNT(*) FILTER (WHERE activo) FROM egauge_clientes")
+        conteo = cur.fetchone()
+        cur.close()
+        return conteo
+    finally:
+        conn.close()
+
+def contar_clientes():
+    """Retorna (total de clientes, clientes activos) sin cargar la lista"""
+    try:
+        return _consultar_conteo_clientes()
+    except Exception as e:
+        st.error(f"Error contando clientes: {e}")
+        return 0, 0
+
 def toggle_cliente_activo(cliente_id, activo):
     """Activa o desactiva un cliente"""
     conn = get_connection()
@@ -137,6 +295,7 @@ def toggle_cliente_activo(cliente_id, activo):
         conn.commit()
         cur.close()
         conn.close()
+        invalidar('clientes')
         return True
     except Exception as e:
         st.error(f"Error actualizando cliente: {e}")
@@ -156,6 +315,7 @@ def eliminar_cliente(cliente_id):
         conn.commit()
         cur.close()
         conn.close()
+        invalidar('clientes', 'tablas')
         return True
     except Exception as e:
         st.error(f"Error eliminando cliente: {e}")
@@ -164,73 +324,23 @@ def eliminar_cliente(cliente_id):
         return False
 
 def obtener_tablas_egauge():
-    """Obtiene información de todas las tablas eGauge"""
-    conn = get_connection()
-    if not conn:
-        return []
-        
-    try:
-        cur = conn.cursor()
-        
-        # Obtener tablas básicas
-        cur.execute("""
-            SELECT table_name, 
-                   pg_size_pretty(pg_total_relation_size(quote_ident(table_name))) as size
-            FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            AND table_name LIKE 'egauge%'
-            ORDER BY table_name;
-        """)
-        
-        tablas = cur.fetchall()
-        
-        if not tablas:
-            cur.close()
-            conn.close()
-            return []
-        
-        # Agregar información adicional
-        tabla_info = []
-        for tabla_nombre, size in tablas:
-            try:
-                # Contar filas
-                cur.execute(f'SELECT COUNT(*) FROM "{tabla_nombre}";')
-                filas = cur.fetchone()[0]
-                
-                # Obtener rango de fechas
-                try:
-                    cur.execute(f'SELECT MIN("timestamp"), MAX("timestamp") FROM "{tabla_nombre}" WHERE "timestamp" IS NOT NULL;')
-                    min_fecha, max_fecha = cur.fetchone()
-                    if min_fecha and max_fecha:
-                        rango = f"{min_fecha.strftime('%Y-%m-%d')} → {max_fecha.strftime('%Y-%m-%d')}"
-                    else:
-                        rango = "Sin fechas"
-                except:
-                    rango = "Sin timestamp"
-                
-                tabla_info.append({
-                    'Tabla': tabla_nombre,
-                    'Filas': f"{filas:,}",
-                    'Tamaño': size,
-                    'Período': rango
-                })
-            except:
-                tabla_info.append({
-                    'Tabla': tabla_nombre,
-                    'Filas': 'Error',
-                    'Tamaño': size,
-                    'Período': 'Error'
-                })
-        
-        cur.close()
-        conn.close()
-        return tabla_info
+    """Obtiene información de todas las tablas eGauge desde el catálogo de estadísticas"""
+    tabla_info = []
+    for tabla_nombre, filas, estimado, min_fecha, max_fecha, _, size in obtener_estadisticas_tablas():
+        if min_fecha and max_fecha:
+            rango = f"{min_fecha.strftime('%Y-%m-%d')} → {max_fecha.strftime('%Y-%m-%d')}"
+        else:
+            rango = "Sin fechas"
         
-    except Exception as e:
-        st.error(f"Error obteniendo tablas: {e}")
-        if conn:
-            conn.close()
-        return []
+        tabla_info.append({
+            'Tabla': tabla_nombre,
+            'Filas': f"{filas:,}",
+            'Tamaño': size,
+            'Período': rango,
+            'Fuente': "Estimado" if estimado else "Catálogo"
+        })
+    
+    return tabla_info
 
 def eliminar_tabla_egauge(tabla_nombre):
     """Elimina una tabla eGauge específica"""
@@ -244,6 +354,13 @@ def eliminar_tabla_egauge(tabla_nombre):
         conn.commit()
         cur.close()
         conn.close()
+        invalidar_esquema(tabla_nombre)
+        if usa_particionado():
+            eliminar_lecturas_cliente(tabla_nombre)
+        eliminar_estadisticas_tabla(tabla_nombre)
+        eliminar_rollups_tabla(tabla_nombre)
+        eliminar_archivo_tabla(tabla_nombre)
+        invalidar('tablas', 'consumos')
         return True
     except Exception as e:
         st.error(f"Error eliminando tabla {tabla_nombre}: {e}")
@@ -271,6 +388,7 @@ def ejecutar_acciones_masivas_clientes(accion):
         conn.commit()
         cur.close()
         conn.close()
+        invalidar('clientes', 'tablas')
         return True, afectados
         
     except Exception as e:
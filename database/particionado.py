@@ -0,0 +1,364 @@
+import os
+from datetime import datetime
+from typing import TYPE_CHECKING
+import streamlit as st
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+from .connection import get_connection
+from .esquema import invalidar_esquema
+from .metricas import ERRORES
+
+# bootstrap importa este módulo al arrancar: pandas solo se necesita para anotar
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Modo de almacenamiento: "tablas" (una tabla por cliente) o "particionado"
+# (una sola tabla egauge_lecturas particionada por mes)
+MODO_ALMACENAMIENTO = os.getenv("EGAUGE_ALMACENAMIENTO", "tablas")
+
+# Número de subparticiones hash por cliente dentro de cada mes (0 = sin subparticiones)
+PARTICIONES_CLIENTE = int(os.getenv("EGAUGE_PARTICIONES_CLIENTE", "0"))
+
+COLUMNAS_NO_REGISTRO = ('id', 'created_at', 'timestamp', 'tarifa')
+
+def usa_particionado():
+    """Indica si la aplicación usa la tabla única particionada"""
+    return MODO_ALMACENAMIENTO == "particionado"
+
+def crear_tabla_lecturas():
+    """Crea la tabla particionada de lecturas y el catálogo de registros"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS egauge_lecturas (
+                cliente_id INTEGER NOT NULL,
+                "timestamp" TIMESTAMP NOT NULL,
+                registro VARCHAR(255) NOT NULL,
+                valor DOUBLE PRECISION,
+                tarifa VARCHAR(20),
+                PRIMARY KEY (cliente_id, "timestamp", registro)
+            ) PARTITION BY RANGE ("timestamp");
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS egauge_registros (
+                cliente_id INTEGER NOT NULL,
+                registro VARCHAR(255) NOT NULL,
+                PRIMARY KEY (cliente_id, registro)
+            );
+        """)
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        st.error(f"Error creando tabla de lecturas: {e}")
+        if conn:
+            conn.close()
+        return False
+
+def _meses_en_rango(inicio, fin):
+    """Genera (año, mes) para cada mes entre dos fechas, inclusive"""
+    año, mes = inicio.year, inicio.month
+    while (año, mes) <= (fin.year, fin.month):
+        yield año, mes
+        año, mes = (año + 1, 1) if mes == 12 else (año, mes + 1)
+
+def _crear_particion_mes(cur, año, mes):
+    """Crea la partición mensual (y sus subparticiones por cliente) si no existe"""
+    particion = f"egauge_lecturas_{año}_{mes:02d}"
+    desde = datetime(año, mes, 1)
+    hasta = datetime(año + 1, 1, 1) if mes == 12 else datetime(año, mes + 1, 1)
+
+    if PARTICIONES_CLIENTE > 0:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS "{particion}"
+            PARTITION OF egauge_lecturas
+            FOR VALUES FROM (%s) TO (%s)
+            PARTITION BY HASH (cliente_id);
+        """, (desde, hasta))
+        for resto in range(PARTICIONES_CLIENTE):
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS "{particion}_p{resto}"
+                PARTITION OF "{particion}"
+                FOR VALUES WITH (MODULUS {PARTICIONES_CLIENTE}, REMAINDER {resto});
+            """)
+    else:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS "{particion}"
+            PARTITION OF egauge_lecturas
+            FOR VALUES FROM (%s) TO (%s);
+        """, (desde, hasta))
+
+def asegurar_particiones(inicio, fin):
+    """Crea las particiones mensuales necesarias para un rango de fechas"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        for año, mes in _meses_en_rango(inicio, fin):
+            _crear_particion_mes(cur, año, mes)
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        st.error(f"Error creando particiones: {e}")
+        if conn:
+            conn.close()
+        return False
+
+def obtener_cliente_id(tabla_nombre):
+    """Obtiene el id de cliente asociado a una tabla"""
+    conn = get_connection()
+    if not conn:
+        return None
+
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM egauge_clientes WHERE tabla_nombre = %s", (tabla_nombre,))
+        fila = cur.fetchone()
+        cur.close()
+        conn.close()
+        return fila[0] if fila else None
+    except Exception:
+        if conn:
+            conn.close()
+        return None
+
+def obtener_registros_cliente(tabla_nombre):
+    """Retorna los registros (columnas de medición) almacenados para un cliente"""
+    conn = get_connection()
+    if not conn:
+        return []
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT r.registro
+            FROM egauge_registros r
+            JOIN egauge_clientes c ON c.id = r.cliente_id
+            WHERE c.tabla_nombre = %s
+            ORDER BY r.registro
+        """, (tabla_nombre,))
+        registros = [row[0] for row in cur.fetchall()]
+        cur.close()
+        conn.close()
+        return registros
+    except Exception:
+        if conn:
+            conn.close()
+        return []
+
+def insertar_lecturas(tabla_nombre: str, df: "pd.DataFrame") -> tuple:
+    """
+    Inserta un DataFrame ancho (una columna por registro) en la tabla particionada
+
+    Returns:
+        (filas escritas, filas nuevas) contadas por timestamp, igual que insertar_datos
+    """
+    cliente_id = obtener_cliente_id(tabla_nombre)
+    if cliente_id is None or 'timestamp' not in df.columns:
+        return 0, 0
+
+    registros = [col for col in df.columns if col not in COLUMNAS_NO_REGISTRO]
+    df_base = df[df['timestamp'].notna()]
+    if 'tarifa' not in df_base.columns:
+        df_base = df_base.assign(tarifa=None)
+
+    df_largo = df_base.melt(
+        id_vars=['timestamp', 'tarifa'],
+        value_vars=registros,
+        var_name='registro',
+        value_name='valor'
+    ).dropna(subset=['valor'])
+
+    if df_largo.empty:
+        return 0, 0
+
+    valores = [
+        (cliente_id, ts.to_pydatetime(), registro, float(valor), tarifa)
+        for ts, tarifa, registro, valor in df_largo[['timestamp', 'tarifa', 'registro', 'valor']].itertuples(index=False)
+    ]
+
+    conn = get_connection()
+    if not conn:
+        return 0, 0
+
+    try:
+        cur = conn.cursor()
+        resultado = execute_values(cur, """
+            INSERT INTO egauge_lecturas (cliente_id, "timestamp", registro, valor, tarifa)
+            VALUES %s
+            ON CONFLICT (cliente_id, "timestamp", registro) DO UPDATE SET
+                valor = EXCLUDED.valor,
+                tarifa = EXCLUDED.tarifa
+            RETURNING "timestamp", (xmax = 0)
+        """, valores, page_size=1000, fetch=True)
+
+        execute_values(cur, """
+            INSERT INTO egauge_registros (cliente_id, registro) VALUES %s
+            ON CONFLICT DO NOTHING
+        """, [(cliente_id, registro) for registro in registros])
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        invalidar_esquema(tabla_nombre)
+
+        filas_escritas = len({ts for ts, _ in resultado})
+        filas_nuevas = len({ts for ts, nueva in resultado if nueva})
+        return filas_escritas, filas_nuevas
+
+    except Exception as e:
+        ERRORES.labels('escritura').inc()
+        st.warning(f"Error insertando lecturas de {tabla_nombre}: {e}")
+        if conn:
+            conn.close()
+        return 0, 0
+
+def eliminar_lecturas_cliente(tabla_nombre):
+    """Elimina todas las lecturas de un cliente en la tabla particionada"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            DELETE FROM egauge_lecturas
+            WHERE cliente_id = (SELECT id FROM egauge_clientes WHERE tabla_nombre = %s)
+        """, (tabla_nombre,))
+        cur.execute("""
+            DELETE FROM egauge_registros
+            WHERE cliente_id = (SELECT id FROM egauge_clientes WHERE tabla_nombre = %s)
+        """, (tabla_nombre,))
+        conn.commit()
+        cur.close()
+        conn.close()
+        invalidar_esquema(tabla_nombre)
+        return True
+    except Exception as e:
+        st.error(f"Error eliminando lecturas de {tabla_nombre}: {e}")
+        if conn:
+            conn.close()
+        return False
+
+def migrar_tabla_a_particionado(tabla_nombre, eliminar_original=False):
+    """
+    Copia una tabla egauge por cliente a la tabla particionada, mes por mes
+
+    Args:
+        tabla_nombre: Tabla de origen (registrada en egauge_clientes)
+        eliminar_original: Si borrar la tabla de origen al terminar
+
+    Returns:
+        int: Número de lecturas (cliente, timestamp, registro) copiadas, o -1 si hubo error
+    """
+    cliente_id = obtener_cliente_id(tabla_nombre)
+    if cliente_id is None:
+        st.error(f"La tabla {tabla_nombre} no pertenece a ningún cliente registrado")
+        return -1
+
+    conn = get_connection()
+    if not conn:
+        return -1
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s
+            AND column_name <> ALL(%s)
+            AND data_type IN ('numeric', 'double precision', 'real', 'integer', 'bigint')
+            ORDER BY ordinal_position
+        """, (tabla_nombre, list(COLUMNAS_NO_REGISTRO)))
+        registros = [row[0] for row in cur.fetchall()]
+
+        cur.execute(f'SELECT MIN("timestamp"), MAX("timestamp") FROM "{tabla_nombre}";')
+        min_fecha, max_fecha = cur.fetchone()
+
+        if not registros or min_fecha is None:
+            cur.close()
+            conn.close()
+            return 0
+
+        for año, mes in _meses_en_rango(min_fecha, max_fecha):
+            _crear_particion_mes(cur, año, mes)
+        conn.commit()
+
+        # Los nombres de registro vienen de la configuración del medidor: se citan como literal e identificador
+        valores_sql = sql.SQL(", ").join(
+            sql.SQL("({}, t.{}::DOUBLE PRECISION)").format(sql.Literal(registro), sql.Identifier(registro))
+            for registro in registros
+        )
+        copiar_sql = sql.SQL("""
+            INSERT INTO egauge_lecturas (cliente_id, "timestamp", registro, valor, tarifa)
+            SELECT %s, t."timestamp", v.registro, v.valor, t."tarifa"
+            FROM {tabla} t
+            CROSS JOIN LATERAL (VALUES {valores}) AS v(registro, valor)
+            WHERE t."timestamp" >= %s AND t."timestamp" < %s AND v.valor IS NOT NULL
+            ON CONFLICT (cliente_id, "timestamp", registro) DO UPDATE SET
+                valor = EXCLUDED.valor,
+                tarifa = EXCLUDED.tarifa
+        """).format(tabla=sql.Identifier(tabla_nombre), valores=valores_sql)
+        copiadas = 0
+
+        # Un mes por transacción para no mantener bloqueos largos
+        for año, mes in _meses_en_rango(min_fecha, max_fecha):
+            desde = datetime(año, mes, 1)
+            hasta = datetime(año + 1, 1, 1) if mes == 12 else datetime(año, mes + 1, 1)
+            cur.execute(copiar_sql, (cliente_id, desde, hasta))
+            copiadas += cur.rowcount
+            conn.commit()
+
+        execute_values(cur, """
+            INSERT INTO egauge_registros (cliente_id, registro) VALUES %s
+            ON CONFLICT DO NOTHING
+        """, [(cliente_id, registro) for registro in registros])
+
+        if eliminar_original:
+            cur.execute(f'DROP TABLE IF EXISTS "{tabla_nombre}" CASCADE;')
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        invalidar_esquema(tabla_nombre)
+        return copiadas
+
+    except Exception as e:
+        st.error(f"Error migrando {tabla_nombre}: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return -1
+
+def migrar_todas_las_tablas(eliminar_originales=False):
+    """Migra todas las tablas de clientes registrados a la tabla particionada"""
+    conn = get_connection()
+    if not conn:
+        return {}
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT c.tabla_nombre
+            FROM egauge_clientes c
+            WHERE to_regclass(quote_ident(c.tabla_nombre)) IS NOT NULL
+            ORDER BY c.tabla_nombre
+        """)
+        tablas = [row[0] for row in cur.fetchall()]
+        cur.close()
+        conn.close()
+    except Exception as e:
+        st.error(f"Error listando tablas a migrar: {e}")
+        if conn:
+            conn.close()
+        return {}
+
+    return {tabla: migrar_tabla_a_particionado(tabla, eliminar_originales) for tabla in tablas}
@@ -0,0 +1,370 @@
+from datetime import datetime, date, timedelta
+import streamlit as st
+import pandas as pd
+from .connection import get_connection
+from .lecturas import obtener_registros, sql_lecturas, sql_cuarto_hora, sql_intervalo_lectura
+from .cache import cache_lectura, invalidar, TTL_CONSUMOS
+
+# Cadena de agregación: cada nivel se calcula a partir del anterior
+# (granularidad, unidad del bucket, granularidad de origen). La demanda máxima
+# se calcula una sola vez en el nivel de 15 minutos (intervalo de demanda de
+# CFE) y los niveles superiores conservan su máximo; la energía se suma.
+NIVELES_ROLLUP = [
+    ('15min', '15 minutes', None),
+    ('hora', 'hour', '15min'),
+    ('dia', 'day', 'hora'),
+    ('mes', 'month', 'dia'),
+]
+
+def _sql_bucket(unidad, expresion):
+    """Inicio del bucket de `unidad` que contiene `expresion`"""
+    if unidad == '15 minutes':
+        return sql_cuarto_hora(expresion)
+    return f"date_trunc('{unidad}', {expresion})"
+
+def _sql_intervalo(unidad):
+    """Duración de un bucket de `unidad`"""
+    return "INTERVAL '15 minutes'" if unidad == '15 minutes' else f"INTERVAL '1 {unidad}'"
+
+def crear_tabla_rollups():
+    """Crea la tabla de agregados por cliente, registro, tarifa y periodo"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS egauge_rollups (
+                tabla_nombre VARCHAR(255) NOT NULL,
+                registro VARCHAR(255) NOT NULL,
+                granularidad VARCHAR(10) NOT NULL,
+                bucket TIMESTAMP NOT NULL,
+                tarifa VARCHAR(20) NOT NULL,
+                kwh DOUBLE PRECISION,
+                demanda_max DOUBLE PRECISION,
+                muestras INTEGER,
+                PRIMARY KEY (tabla_nombre, registro, granularidad, bucket, tarifa)
+            );
+        """)
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        st.error(f"Error creando tabla de rollups: {e}")
+        if conn:
+            conn.close()
+        return False
+
+def _recalcular_nivel(cur, tabla_nombre, registros, granularidad, unidad, origen, timestamp_min, timestamp_max):
+    """Borra y recalcula los buckets de un nivel que tocan el rango [min, max]"""
+    desde_sql = _sql_bucket(unidad, "%s::TIMESTAMP")
+    hasta_sql = f"{_sql_bucket(unidad, '%s::TIMESTAMP')} + {_sql_intervalo(unidad)}"
+    cur.execute(f"""
+        DELETE FROM egauge_rollups
+        WHERE tabla_nombre = %s AND granularidad = %s
+        AND bucket >= {desde_sql}
+        AND bucket < {hasta_sql}
+    """, (tabla_nombre, granularidad, timestamp_min, timestamp_max))
+
+    if origen is None:
+        # Primer nivel, desde las lecturas crudas: la demanda del bucket es su
+        # energía entre los segundos que cubren sus lecturas, sin depender de
+        # la resolución. Se lee una hora antes del rango para que LAG conozca
+        # el intervalo de la primera lectura.
+        fuente_sql, fuente_params = sql_lecturas(tabla_nombre, registros)
+        bucket_sql = _sql_bucket(unidad, 'l."timestamp"')
+        cur.execute(f"""
+            INSERT INTO egauge_rollups (tabla_nombre, registro, granularidad, bucket, tarifa, kwh, demanda_max, muestras)
+            SELECT %s, l.registro, %s, {bucket_sql}, COALESCE(l.tarifa, 'Sin tarifa'),
+                   SUM(l.valor), SUM(l.valor) * 3600 / NULLIF(SUM(l.intervalo), 0), COUNT(*)
+            FROM (
+                SELECT l.registro, l."timestamp", l.tarifa, l.valor,
+                       {sql_intervalo_lectura('w')} AS intervalo
+                FROM ({fuente_sql}) l
+                WHERE l."timestamp" >= {desde_sql} - INTERVAL '1 hour'
+                AND l."timestamp" < {hasta_sql}
+                AND l.valor IS NOT NULL
+                WINDOW w AS (PARTITION BY l.registro ORDER BY l."timestamp")
+            ) l
+            WHERE l."timestamp" >= {desde_sql}
+            GROUP BY l.registro, {bucket_sql}, COALESCE(l.tarifa, 'Sin tarifa')
+        """, [tabla_nombre, granularidad] + fuente_params
+             + [timestamp_min, timestamp_max, timestamp_min])
+    else:
+        # Niveles superiores: desde el nivel anterior ya agregado
+        bucket_sql = _sql_bucket(unidad, 'bucket')
+        cur.execute(f"""
+            INSERT INTO egauge_rollups (tabla_nombre, registro, granularidad, bucket, tarifa, kwh, demanda_max, muestras)
+            SELECT tabla_nombre, registro, %s, {bucket_sql}, tarifa,
+                   SUM(kwh), MAX(demanda_max), SUM(muestras)
+            FROM egauge_rollups
+            WHERE tabla_nombre = %s AND granularidad = %s
+            AND bucket >= {desde_sql}
+            AND bucket < {hasta_sql}
+            GROUP BY tabla_nombre, registro, {bucket_sql}, tarifa
+        """, (granularidad, tabla_nombre, origen, timestamp_min, timestamp_max))
+
+def actualizar_rollups(tabla_nombre, timestamp_min, timestamp_max):
+    """
+    Actualiza incrementalmente los rollups de los periodos tocados por una ingesta
+
+    Si la tabla aún no tiene rollups se reconstruyen completos una sola vez,
+    así la existencia de rollups garantiza que cubren toda la tabla.
+    """
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM egauge_rollups WHERE tabla_nombre = %s LIMIT 1", (tabla_nombre,))
+        tiene_rollups = cur.fetchone() is not None
+        cur.close()
+        conn.close()
+    except Exception as e:
+        st.warning(f"No se pudieron leer rollups de {tabla_nombre}: {e}")
+        if conn:
+            conn.close()
+        return False
+
+    if not tiene_rollups:
+        return reconstruir_rollups(tabla_nombre)
+
+    return _recalcular_rollups(tabla_nombre, timestamp_min, timestamp_max)
+
+def _recalcular_rollups(tabla_nombre, timestamp_min, timestamp_max):
+    """Recalcula todos los niveles de rollup para un rango en una sola transacción"""
+    registros = obtener_registros(tabla_nombre)
+    if not registros:
+        return False
+
+    # Los cuartos de hora se recalculan por horas completas: cada bucket 'hora'
+    # se rehace desde sus cuatro cuartos (tablas con rollups anteriores al
+    # nivel de 15 minutos no los tienen fuera del rango ingerido)
+    timestamp_min = pd.Timestamp(timestamp_min).floor('h').to_pydatetime()
+    timestamp_max = (pd.Timestamp(timestamp_max).floor('h') + pd.Timedelta(minutes=59)).to_pydatetime()
+
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        for granularidad, unidad, origen in NIVELES_ROLLUP:
+            _recalcular_nivel(cur, tabla_nombre, registros, granularidad, unidad, origen, timestamp_min, timestamp_max)
+        conn.commit()
+        cur.close()
+        conn.close()
+        invalidar('consumos')
+        return True
+    except Exception as e:
+        st.warning(f"No se pudieron actualizar rollups de {tabla_nombre}: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return False
+
+def reconstruir_rollups(tabla_nombre):
+    """
+    Reconstruye los rollups de una tabla a partir de sus lecturas
+
+    Solo se reemplazan los buckets desde el mes de la lectura más antigua en
+    PostgreSQL: los meses ya archivados en Parquet conservan sus rollups.
+    """
+    registros = obtener_registros(tabla_nombre)
+    if not registros:
+        return False
+
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        fuente_sql, fuente_params = sql_lecturas(tabla_nombre, registros[:1])
+        cur.execute(f'SELECT MIN(l."timestamp"), MAX(l."timestamp") FROM ({fuente_sql}) l', fuente_params)
+        timestamp_min, timestamp_max = cur.fetchone()
+        if timestamp_min is not None:
+            cur.execute("""
+                DELETE FROM egauge_rollups
+                WHERE tabla_nombre = %s AND bucket >= date_trunc('month', %s::TIMESTAMP)
+            """, (tabla_nombre, timestamp_min))
+        conn.commit()
+        cur.close()
+        conn.close()
+        invalidar('consumos')
+    except Exception as e:
+        st.error(f"Error reconstruyendo rollups de {tabla_nombre}: {e}")
+        if conn:
+            conn.close()
+        return False
+
+    if timestamp_min is None:
+        return True
+
+    return _recalcular_rollups(tabla_nombre, timestamp_min, timestamp_max)
+
+def eliminar_rollups_tabla(tabla_nombre):
+    """Elimina los rollups de una tabla"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM egauge_rollups WHERE tabla_nombre = %s", (tabla_nombre,))
+        conn.commit()
+        cur.close()
+        conn.close()
+        invalidar('consumos')
+        return True
+    except Exception:
+        if conn:
+            conn.close()
+        return False
+
+def tablas_con_rollups(tablas):
+    """Retorna el subconjunto de tablas que ya tienen rollups"""
+    conn = get_connection()
+    if not conn:
+        return set()
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT t.tabla_nombre
+            FROM unnest(%s::TEXT[]) AS t(tabla_nombre)
+            WHERE EXISTS (SELECT 1 FROM egauge_rollups r WHERE r.tabla_nombre = t.tabla_nombre)
+        """, (list(tablas),))
+        resultado = {row[0] for row in cur.fetchall()}
+        cur.close()
+        conn.close()
+        return resultado
+    except Exception:
+        if conn:
+            conn.close()
+        return set()
+
+def _planificar_buckets(fecha_inicio: date, fecha_fin: date) -> list:
+    """
+    Divide un periodo de días completos en buckets mensuales y diarios
+
+    Los meses completamente contenidos se leen del nivel 'mes' y los días
+    sobrantes de los extremos del nivel 'dia'.
+
+    Returns:
+        Lista de (granularidad, desde, hasta) con intervalos semiabiertos
+    """
+    plan = []
+    actual = fecha_inicio
+    fin_exclusivo = fecha_fin + timedelta(days=1)
+
+    while actual < fin_exclusivo:
+        siguiente_mes = date(actual.year + 1, 1, 1) if actual.month == 12 else date(actual.year, actual.month + 1, 1)
+        if actual.day == 1 and siguiente_mes <= fin_exclusivo:
+            plan.append(('mes', actual, siguiente_mes))
+            actual = siguiente_mes
+        else:
+            hasta = min(siguiente_mes, fin_exclusivo)
+            plan.append(('dia', actual, hasta))
+            actual = hasta
+
+    return [
+        (granularidad, datetime.combine(desde, datetime.min.time()), datetime.combine(hasta, datetime.min.time()))
+        for granularidad, desde, hasta in plan
+    ]
+
+def obtener_consumos_rollup(selecciones: dict, fecha_inicio: date, fecha_fin: date, por_cliente: bool = False) -> pd.DataFrame:
+    """
+    Lee kWh, demanda máxima y muestras por tarifa desde los rollups
+
+    La demanda es el máximo de los buckets de 15 minutos y los kWh la suma de
+    las horas, ambos ya propagados a los niveles 'dia' y 'mes'.
+
+    Args:
+        selecciones: dict tabla_nombre -> registro (columna) a facturar
+        fecha_inicio, fecha_fin: días completos del periodo (inclusive)
+        por_cliente: Si agrupar además por tabla
+
+    Returns:
+        DataFrame con columnas [tabla_nombre,] tarifa, kwh, demanda_max, muestras
+    """
+    if not selecciones:
+        return pd.DataFrame()
+
+    conn = get_connection()
+    if not conn:
+        return None
+
+    try:
+        cur = conn.cursor()
+        plan = _planificar_buckets(fecha_inicio, fecha_fin)
+
+        valores_sql = ", ".join(["(%s, %s)"] * len(selecciones))
+        condiciones_sql = " OR ".join(["(r.granularidad = %s AND r.bucket >= %s AND r.bucket < %s)"] * len(plan))
+        params = [valor for par in selecciones.items() for valor in par]
+        params += [valor for bucket in plan for valor in bucket]
+
+        agrupar = "r.tabla_nombre, r.tarifa" if por_cliente else "r.tarifa"
+        cur.execute(f"""
+            SELECT {agrupar}, SUM(r.kwh), MAX(r.demanda_max), SUM(r.muestras)
+            FROM egauge_rollups r
+            JOIN (VALUES {valores_sql}) AS s(tabla_nombre, registro)
+                ON r.tabla_nombre = s.tabla_nombre AND r.registro = s.registro
+            WHERE {condiciones_sql}
+            GROUP BY {agrupar}
+        """, params)
+        filas = cur.fetchall()
+        cur.close()
+        conn.close()
+
+        columnas = ['tarifa', 'kwh', 'demanda_max', 'muestras']
+        if por_cliente:
+            columnas = ['tabla_nombre'] + columnas
+        return pd.DataFrame(filas, columns=columnas)
+
+    except Exception as e:
+        st.error(f"Error leyendo rollups: {e}")
+        if conn:
+            conn.close()
+        return None
+
+@cache_lectura('consumos', TTL_CONSUMOS)
+def _consultar_resumen_mensual(mes: date) -> pd.DataFrame:
+    """Consulta el resumen mensual; lanza excepción ante errores para no cachearlos"""
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("sin conexión a PostgreSQL")
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT COALESCE(c.nombre_cliente, r.tabla_nombre), r.registro,
+                   SUM(r.kwh) FILTER (WHERE r.tarifa = 'Base'),
+                   SUM(r.kwh) FILTER (WHERE r.tarifa = 'Intermedio'),
+                   SUM(r.kwh) FILTER (WHERE r.tarifa = 'Punta'),
+                   SUM(r.kwh),
+                   MAX(r.demanda_max)
+            FROM egauge_rollups r
+            LEFT JOIN egauge_clientes c ON c.tabla_nombre = r.tabla_nombre
+            WHERE r.granularidad = 'mes' AND r.bucket = %s
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """, (datetime(mes.year, mes.month, 1),))
+        filas = cur.fetchall()
+        cur.close()
+        return pd.DataFrame(filas, columns=[
+            'Cliente', 'Registro', 'kWh Base', 'kWh Intermedio', 'kWh Punta', 'kWh Total', 'Demanda Máx (kW)'
+        ])
+    finally:
+        conn.close()
+
+def obtener_resumen_mensual(mes: date) -> pd.DataFrame:
+    """Consumo del mes por cliente y registro desde el nivel mensual de rollups"""
+    try:
+        return _consultar_resumen_mensual(mes)
+    except Exception as e:
+        st.error(f"Error leyendo resumen mensual: {e}")
+        return pd.DataFrame()
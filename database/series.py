@@ -0,0 +1,93 @@
+import math
+import streamlit as st
+import pandas as pd
+from .connection import get_connection
+from .lecturas import sql_lecturas
+from .archivo import obtener_meses_archivados, conexion_duckdb
+from .cache import cache_lectura, TTL_CONSUMOS
+
+# Buckets por gráfica: del orden del ancho en píxeles de una gráfica a pantalla completa
+PUNTOS_OBJETIVO = 2000
+
+def ancho_bucket_segundos(fecha_inicio, fecha_fin, puntos=PUNTOS_OBJETIVO):
+    """Ancho de bucket (segundos enteros) para que el rango quepa en `puntos` buckets"""
+    return max(math.ceil((fecha_fin - fecha_inicio).total_seconds() / puntos), 1)
+
+def _serie_postgres(cur, tabla_nombre, registro, fecha_inicio, fecha_fin, ancho):
+    """Min/max/suma/conteo por bucket de ancho fijo, agregados en PostgreSQL"""
+    fuente_sql, fuente_params = sql_lecturas(tabla_nombre, [registro])
+    # Buckets anclados en la época Unix: los mismos límites que en el archivo Parquet
+    cur.execute(f"""
+        SELECT to_timestamp(floor(extract(epoch FROM l."timestamp") / %s) * %s) AT TIME ZONE 'UTC' AS bucket,
+               MIN(l.valor), MAX(l.valor), SUM(l.valor), COUNT(*)
+        FROM ({fuente_sql}) l
+        WHERE l."timestamp" >= %s AND l."timestamp" <= %s AND l.valor IS NOT NULL
+        GROUP BY 1
+        ORDER BY 1
+    """, [ancho, ancho] + fuente_params + [fecha_inicio, fecha_fin])
+    return pd.DataFrame(cur.fetchall(), columns=['timestamp', 'minimo', 'maximo', 'suma', 'muestras'])
+
+def _serie_archivo(tabla_nombre, registro, fecha_inicio, fecha_fin, ancho):
+    """Los mismos buckets que _serie_postgres, sobre los meses archivados en Parquet"""
+    rutas = obtener_meses_archivados([tabla_nombre], fecha_inicio, fecha_fin).get(tabla_nombre, [])
+    if not rutas:
+        return pd.DataFrame()
+
+    con = conexion_duckdb()
+    try:
+        df = con.execute("""
+            SELECT time_bucket(to_seconds(?::BIGINT), "timestamp", TIMESTAMP '1970-01-01') AS bucket,
+                   MIN(valor), MAX(valor), SUM(valor), COUNT(*)
+            FROM read_parquet(?)
+            WHERE registro = ? AND "timestamp" >= ? AND "timestamp" <= ? AND valor IS NOT NULL
+            GROUP BY 1
+        """, [ancho, rutas, registro, fecha_inicio, fecha_fin]).df()
+    finally:
+        con.close()
+    df.columns = ['timestamp', 'minimo', 'maximo', 'suma', 'muestras']
+    return df
+
+@cache_lectura('consumos', TTL_CONSUMOS)
+def _consultar_serie(tabla_nombre, registro, fecha_inicio, fecha_fin, puntos):
+    """Consulta la serie reducida; lanza excepción ante errores para no cachearlos"""
+    ancho = ancho_bucket_segundos(fecha_inicio, fecha_fin, puntos)
+
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("sin conexión a PostgreSQL")
+    try:
+        cur = conn.cursor()
+        df = _serie_postgres(cur, tabla_nombre, registro, fecha_inicio, fecha_fin, ancho)
+        cur.close()
+    finally:
+        conn.close()
+
+    df_archivo = _serie_archivo(tabla_nombre, registro, fecha_inicio, fecha_fin, ancho)
+    if not df_archivo.empty:
+        # Un mes puede estar repartido entre archivo y PostgreSQL: combinar por bucket
+        df = pd.concat([df, df_archivo]).groupby('timestamp', as_index=False).agg(
+            minimo=('minimo', 'min'),
+            maximo=('maximo', 'max'),
+            suma=('suma', 'sum'),
+            muestras=('muestras', 'sum')
+        )
+
+    df['promedio'] = df['suma'] / df['muestras']
+    return df.drop(columns='suma').sort_values('timestamp').reset_index(drop=True), ancho
+
+def obtener_serie_reducida(tabla_nombre, registro, fecha_inicio, fecha_fin, puntos=PUNTOS_OBJETIVO):
+    """
+    Serie de un registro reducida a ~`puntos` buckets con mínimo, máximo y promedio
+
+    Reducción min/max por bucket: el trazo conserva picos y valles aunque el
+    rango tenga millones de lecturas, y al navegador solo llegan `puntos` filas.
+    Si el rango tiene menos lecturas que buckets, cada bucket es una lectura.
+
+    Returns:
+        (DataFrame timestamp, minimo, maximo, muestras, promedio; ancho del bucket en segundos)
+    """
+    try:
+        return _consultar_serie(tabla_nombre, registro, fecha_inicio, fecha_fin, puntos)
+    except Exception as e:
+        st.error(f"Error leyendo serie de {tabla_nombre}: {e}")
+        return pd.DataFrame(), None
@@ -0,0 +1,139 @@
+import os
+import streamlit as st
+import pandas as pd
+from psycopg2.extras import execute_values
+from .connection import get_connection
+
+# Trazas por ventana descargada: una fila por petición con la duración de cada
+# fase (conexión, primer byte, cuerpo, parseo, clasificación, escritura). Los
+# tiempos se guardan como REAL en milisegundos para que la tabla sea compacta.
+TRAZAR_DESCARGAS = os.getenv("EGAUGE_TRAZAR_DESCARGAS", "1") != "0"
+RETENCION_TRAZAS_DIAS = int(os.getenv("EGAUGE_RETENCION_TRAZAS_DIAS", "30"))
+
+FASES = ['conexion_ms', 'ttfb_ms', 'cuerpo_ms', 'parseo_ms', 'clasificacion_ms', 'escritura_ms']
+
+# Fases agrupadas por el recurso que las limita
+CUELLOS = {
+    'Red': ['conexion_ms', 'cuerpo_ms'],
+    'Medidor': ['ttfb_ms'],
+    'Procesamiento': ['parseo_ms', 'clasificacion_ms'],
+    'Base de datos': ['escritura_ms'],
+}
+
+def crear_tabla_trazas():
+    """Crea la tabla de trazas de descarga"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS egauge_descarga_spans (
+                registrado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                tabla_nombre VARCHAR(255) NOT NULL,
+                host VARCHAR(255) NOT NULL,
+                ventana TIMESTAMP,
+                estado VARCHAR(20) NOT NULL,
+                http_status SMALLINT,
+                bytes INTEGER,
+                filas INTEGER,
+                conexion_ms REAL,
+                ttfb_ms REAL,
+                cuerpo_ms REAL,
+                parseo_ms REAL,
+                clasificacion_ms REAL,
+                escritura_ms REAL
+            );
+        """)
+        # Solo se inserta al final: BRIN por fecha ocupa unas páginas y basta para la retención
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_egauge_descarga_spans_fecha ON egauge_descarga_spans USING BRIN (registrado_en);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_egauge_descarga_spans_host ON egauge_descarga_spans (host, registrado_en);")
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        st.error(f"Error creando tabla de trazas: {e}")
+        if conn:
+            conn.close()
+        return False
+
+def guardar_spans(tabla_nombre, spans):
+    """Inserta las trazas de una ingesta en un solo lote y descarta las más viejas que la retención"""
+    if not TRAZAR_DESCARGAS or not spans:
+        return False
+
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        cur = conn.cursor()
+        execute_values(cur, f"""
+            INSERT INTO egauge_descarga_spans (
+                tabla_nombre, host, ventana, estado, http_status, bytes, filas, {", ".join(FASES)}
+            ) VALUES %s
+        """, [
+            (tabla_nombre, span['host'], span.get('ventana'), span['estado'], span.get('http_status'),
+             span.get('bytes'), span.get('filas'), *(span.get(fase) for fase in FASES))
+            for span in spans
+        ], page_size=1000)
+        cur.execute(
+            "DELETE FROM egauge_descarga_spans WHERE registrado_en < CURRENT_TIMESTAMP - make_interval(days => %s)",
+            (RETENCION_TRAZAS_DIAS,)
+        )
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        st.warning(f"No se pudieron guardar las trazas de {tabla_nombre}: {e}")
+        if conn:
+            conn.close()
+        return False
+
+def obtener_latencia_hosts(desde):
+    """
+    Resumen de latencia por host desde una fecha
+
+    Returns:
+        DataFrame host, ventanas, errores, p50_ms, p95_ms, promedio de cada fase
+        y cuello (grupo de fases con mayor tiempo promedio)
+    """
+    conn = get_connection()
+    if not conn:
+        return pd.DataFrame()
+
+    try:
+        cur = conn.cursor()
+        promedios_sql = ", ".join(f"AVG({fase})" for fase in FASES)
+        total_sql = " + ".join(f"COALESCE({fase}, 0)" for fase in FASES)
+        cur.execute(f"""
+            SELECT host,
+                   COUNT(*),
+                   COUNT(*) FILTER (WHERE estado <> 'ok'),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY {total_sql}),
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY {total_sql}),
+                   {promedios_sql}
+            FROM egauge_descarga_spans
+            WHERE registrado_en >= %s
+            GROUP BY host
+            ORDER BY 5 DESC
+        """, (desde,))
+        filas = cur.fetchall()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        st.error(f"Error leyendo trazas de descarga: {e}")
+        if conn:
+            conn.close()
+        return pd.DataFrame()
+
+    df = pd.DataFrame(filas, columns=['host', 'ventanas', 'errores', 'p50_ms', 'p95_ms'] + FASES)
+    if df.empty:
+        return df
+    df[['p50_ms', 'p95_ms'] + FASES] = df[['p50_ms', 'p95_ms'] + FASES].astype(float).fillna(0.0)
+    grupos = pd.DataFrame({cuello: df[fases].sum(axis=1) for cuello, fases in CUELLOS.items()})
+    df['cuello'] = grupos.idxmax(axis=1)
+    return df
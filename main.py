@@ -1,18 +1,34 @@
+import importlib
 import streamlit as st
 from datetime import datetime
 
 # Imports de módulos locales
 from database.connection import validate_db_credentials, db
-from database.models import crear_tabla_clientes
+from database.instrumentacion import establecer_pagina
+from database.bootstrap import asegurar_esquema
+from database.metricas import iniciar_servidor_metricas
+from core.perfilado import perfilar
 
-# Importar vistas
-from views.dashboard import render_dashboard
-from views.clientes import render_gestion_clientes
-from views.descarga import render_descarga_individual
-from views.tablas import render_ver_tablas
-from views.admin import render_admin_clientes
-from views.recibos import render_generador_recibos
-from views.generador_recibo_cfe import render_generador_recibo_cfe
+# Vistas por página: (módulo, función). Se importan solo al visitarlas, así el
+# arranque no carga los módulos (ni sus dependencias) de páginas no usadas
+PAGINAS = {
+    'dashboard': ('views.dashboard', 'render_dashboard'),
+    'clientes': ('views.clientes', 'render_gestion_clientes'),
+    'descarga': ('views.descarga', 'render_descarga_individual'),
+    'ingestas': ('views.ingestas', 'render_historial_ingestas'),
+    'tablas': ('views.tablas', 'render_ver_tablas'),
+    'graficas': ('views.graficas', 'render_graficas'),
+    'admin': ('views.admin', 'render_admin_clientes'),
+    'calculadora': ('views.recibos', 'render_generador_recibos'),
+    'recibos': ('views.generador_recibo_cfe', 'render_generador_recibo_cfe'),
+    'rendimiento': ('views.rendimiento', 'render_rendimiento'),
+    'perfiles': ('views.perfiles', 'render_perfiles'),
+}
+
+def cargar_vista(page):
+    """Importa (una vez por proceso, vía sys.modules) y retorna la función de render de una página"""
+    modulo, funcion = PAGINAS.get(page, PAGINAS['dashboard'])
+    return getattr(importlib.import_module(modulo), funcion)
 
 def render_sidebar_navigation():
     """Renderiza la navegación en el sidebar para todas las páginas"""
@@ -32,6 +48,14 @@ def render_sidebar_navigation():
             st.session_state.current_page = "descarga"
             st.rerun()
         
+        if st.button("📒 Historial de Ingestas", use_container_width=True, key="nav_ingestas", type="primary" if st.session_state.current_page == 'ingestas' else "secondary"):
+            st.session_state.current_page = "ingestas"
+            st.rerun()
+        
+        if st.button("📈 Gráficas", use_container_width=True, key="nav_graficas", type="primary" if st.session_state.current_page == 'graficas' else "secondary"):
+            st.session_state.current_page = "graficas"
+            st.rerun()
+        
         if st.button("🗄️ Ver Tablas", use_container_width=True, key="nav_tablas", type="primary" if st.session_state.current_page == 'tablas' else "secondary"):
             st.session_state.current_page = "tablas"
             st.rerun()
@@ -48,6 +72,15 @@ def render_sidebar_navigation():
         if st.button("📄 Generador Recibos", use_container_width=True, key="nav_recibos", type="primary" if st.session_state.current_page == 'recibos' else "secondary"):
             st.session_state.current_page = "recibos"
             st.rerun()
+        
+        st.markdown("### 🛠️ Sistema")
+        if st.button("🐢 Rendimiento BD", use_container_width=True, key="nav_rendimiento", type="primary" if st.session_state.current_page == 'rendimiento' else "secondary"):
+            st.session_state.current_page = "rendimiento"
+            st.rerun()
+        
+        if st.button("🔬 Perfiles", use_container_width=True, key="nav_perfiles", type="primary" if st.session_state.current_page == 'perfiles' else "secondary"):
+            st.session_state.current_page = "perfiles"
+            st.rerun()
 
 # Configuración de la página
 st.set_page_config(
@@ -63,8 +96,14 @@ def main():
     # Validar credenciales de base de datos
     validate_db_credentials()
     
-    # Crear tabla de clientes si no existe
-    crear_tabla_clientes()
+    # Las consultas del arranque se etiquetan aparte de las de cada página
+    establecer_pagina('(arranque)')
+    
+    # Crear tablas internas (una vez por proceso y versión de esquema)
+    asegurar_esquema()
+    
+    # Endpoint /metrics local (una vez por proceso)
+    iniciar_servidor_metricas()
     
     # Inicializar página actual en session state
     if 'current_page' not in st.session_state:
@@ -83,24 +122,11 @@ def main():
     
     # Router de páginas
     page = st.session_state.current_page
+    establecer_pagina(page)
     
-    if page == 'dashboard':
-        render_dashboard()
-    elif page == 'clientes':
-        render_gestion_clientes()
-    elif page == 'descarga':
-        render_descarga_individual()
-    elif page == 'tablas':
-        render_ver_tablas()
-    elif page == 'admin':
-        render_admin_clientes()
-    elif page == 'calculadora':
-        render_generador_recibos()
-    elif page == 'recibos':
-        render_generador_recibo_cfe()
-    else:
-        # Página por defecto si hay error
-        render_dashboard()
+    # Página por defecto si hay error: dashboard (perfilada con EGAUGE_PERFILAR=1)
+    with perfilar('pagina', page):
+        cargar_vista(page)()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,38 @@
+"""
+Mueve los meses cerrados de cada tabla al archivo frío en Parquet
+
+Uso (desde la raíz del proyecto, p. ej. con cron una vez al mes):
+    python -m scripts.archivar_meses                    # todas las tablas
+    python -m scripts.archivar_meses --tabla dormi
+    python -m scripts.archivar_meses --meses-calientes 6
+"""
+import argparse
+from database.archivo import archivar_meses_cerrados, crear_tabla_archivo, MESES_CALIENTES
+from database.estadisticas import obtener_estadisticas_tablas
+
+def main():
+    parser = argparse.ArgumentParser(description="Archiva meses cerrados en Parquet")
+    parser.add_argument("--tabla", help="Archivar solo esta tabla")
+    parser.add_argument("--meses-calientes", type=int, default=MESES_CALIENTES,
+                        help="Meses recientes que permanecen en PostgreSQL")
+    args = parser.parse_args()
+
+    if not crear_tabla_archivo():
+        raise SystemExit("No se pudo crear el catálogo egauge_archivo")
+
+    tablas = [args.tabla] if args.tabla else [tabla for tabla, *_ in obtener_estadisticas_tablas()]
+
+    errores = 0
+    for tabla in tablas:
+        for (año, mes), filas in archivar_meses_cerrados(tabla, args.meses_calientes).items():
+            if filas < 0:
+                errores += 1
+                print(f"❌ {tabla} {mes:02d}/{año}: error")
+            else:
+                print(f"✅ {tabla} {mes:02d}/{año}: {filas:,} filas archivadas")
+
+    if errores:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
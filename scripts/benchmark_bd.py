@@ -0,0 +1,113 @@
+"""
+Mide las rutas de base de datos de la app con 10, 100 y 1,000 clientes sintéticos
+
+Por cada escala genera los clientes que falten (ver generar_datos_sinteticos)
+y cronometra, con la caché invalidada antes de cada repetición:
+    - estadísticas del dashboard (obtener_tablas_egauge)
+    - agregación de la calculadora (facturar_clientes de un mes, todos los clientes)
+    - exportación CSV de un año de un cliente
+    - refresco de estadísticas de todas las tablas sintéticas
+
+Uso (desde la raíz del proyecto; NO apuntar el .env a producción):
+    python -m scripts.benchmark_bd
+    python -m scripts.benchmark_bd --escalas 10 100 --repeticiones 5 --csv benchmark.csv
+"""
+import os
+import time
+import argparse
+import statistics
+from datetime import datetime, timedelta
+import pandas as pd
+from core.facturacion import facturar_clientes, PRECIOS_DEFAULT
+from database.bootstrap import asegurar_esquema
+from database.cache import invalidar
+from database.models import obtener_tablas_egauge
+from database.estadisticas import refrescar_estadisticas_tabla
+from database.exportacion import exportar_tabla
+from scripts.generar_datos_sinteticos import generar_clientes, REGISTROS_SINTETICOS, ANIOS_DEFAULT
+
+ESCALAS = (10, 100, 1000)
+
+def cronometrar(funcion, repeticiones):
+    """Ejecuta `funcion` varias veces; retorna (mediana en segundos, último resultado)"""
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos), resultado
+
+def medir_escala(tablas, repeticiones):
+    """Cronometra cada ruta para un conjunto de tablas; retorna lista de dicts"""
+    hoy = datetime.now().date()
+    fin_mes = hoy.replace(day=1) - timedelta(days=1)
+    inicio_mes = fin_mes.replace(day=1)
+    columnas_config = {tabla: REGISTROS_SINTETICOS[0] for tabla in tablas}
+
+    def dashboard():
+        invalidar('tablas')
+        return obtener_tablas_egauge()
+
+    def calculadora():
+        invalidar('consumos')
+        return facturar_clientes(columnas_config, inicio_mes, fin_mes, PRECIOS_DEFAULT)
+
+    def exportacion():
+        ruta, filas = exportar_tabla(
+            tablas[0], REGISTROS_SINTETICOS,
+            datetime.now() - timedelta(days=365), datetime.now(), 'CSV'
+        )
+        if ruta:
+            os.remove(ruta)
+        return filas
+
+    def refresco():
+        return sum(1 for tabla in tablas if refrescar_estadisticas_tabla(tabla))
+
+    mediciones = []
+    segundos, tablas_dashboard = cronometrar(dashboard, repeticiones)
+    mediciones.append({'operacion': 'Dashboard (estadísticas)', 'segundos': segundos, 'unidades': len(tablas_dashboard), 'unidad': 'tablas'})
+
+    segundos, recibos = cronometrar(calculadora, repeticiones)
+    mediciones.append({'operacion': 'Calculadora (1 mes)', 'segundos': segundos, 'unidades': len(recibos or {}), 'unidad': 'recibos'})
+
+    segundos, filas = cronometrar(exportacion, repeticiones)
+    mediciones.append({'operacion': 'Exportación CSV (1 año)', 'segundos': segundos, 'unidades': filas, 'unidad': 'filas'})
+
+    segundos, refrescadas = cronometrar(refresco, repeticiones)
+    mediciones.append({'operacion': 'Refresco de estadísticas', 'segundos': segundos, 'unidades': refrescadas, 'unidad': 'tablas'})
+
+    return mediciones
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las rutas de base de datos con clientes sintéticos")
+    parser.add_argument("--escalas", type=int, nargs="+", default=list(ESCALAS), help="Números de clientes a medir")
+    parser.add_argument("--anios", type=int, default=ANIOS_DEFAULT, help="Años de lecturas por cliente sintético")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Repeticiones por medición (se reporta la mediana)")
+    parser.add_argument("--csv", help="Guardar los resultados en este archivo CSV")
+    args = parser.parse_args()
+
+    if not asegurar_esquema():
+        raise SystemExit("No se pudo preparar el esquema")
+
+    resultados = []
+    for escala in sorted(args.escalas):
+        print(f"\n📦 {escala:,} clientes")
+        tablas = generar_clientes(escala, args.anios)
+        for medicion in medir_escala(tablas, args.repeticiones):
+            medicion['clientes'] = escala
+            medicion['por_segundo'] = medicion['unidades'] / medicion['segundos'] if medicion['segundos'] > 0 else 0.0
+            resultados.append(medicion)
+            print(f"⏱️ {medicion['operacion']:<28} {medicion['segundos']:>9.3f} s  "
+                  f"{medicion['unidades']:>10,} {medicion['unidad']}  ({medicion['por_segundo']:,.0f}/s)")
+
+    df = pd.DataFrame(resultados)[['clientes', 'operacion', 'segundos', 'unidades', 'unidad', 'por_segundo']]
+    print()
+    print(df.pivot(index='operacion', columns='clientes', values='segundos').round(3).to_string())
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+        print(f"\n💾 Resultados en {args.csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Genera clientes y lecturas sintéticas para pruebas de carga en un PostgreSQL local
+
+Crea N clientes en egauge_clientes y llena sus tablas con lecturas horarias
+realistas (carga diaria y semanal, estacionalidad, generación solar) con la
+misma forma que produce la ingesta: timestamp, registros *_kWh y tarifa.
+Respeta EGAUGE_ALMACENAMIENTO (tabla por cliente o particionada).
+
+Uso (desde la raíz del proyecto; NO apuntar el .env a producción):
+    python -m scripts.generar_datos_sinteticos --clientes 100
+    python -m scripts.generar_datos_sinteticos --clientes 1000 --anios 3
+    python -m scripts.generar_datos_sinteticos --limpiar
+"""
+import io
+import time
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from core.processor import classify_gdmth_period
+from core.downloader import crear_tabla
+from database.connection import get_connection
+from database.bootstrap import asegurar_esquema
+from database.models import guardar_clientes, eliminar_tabla_egauge
+from database.estadisticas import refrescar_estadisticas_tabla, obtener_marcas_ingesta
+from database.particionado import usa_particionado, asegurar_particiones, insertar_lecturas
+from database.rollups import reconstruir_rollups, eliminar_rollups_tabla
+
+PREFIJO_SINTETICO = "sintetico_"
+REGISTROS_SINTETICOS = ['Usage_kWh', 'Generation_kWh', 'Grid_kWh']
+ANIOS_DEFAULT = 2
+
+def tabla_sintetica(numero):
+    """Nombre de tabla del cliente sintético `numero` (desde 1)"""
+    return f"{PREFIJO_SINTETICO}{numero:04d}"
+
+def generar_lecturas(numero, anios=ANIOS_DEFAULT):
+    """
+    Lecturas horarias de un cliente sintético, deterministas por número de cliente
+
+    Returns:
+        DataFrame timestamp, Usage_kWh, Generation_kWh, Grid_kWh, tarifa
+    """
+    rng = np.random.default_rng(numero)
+    fin = datetime.now().replace(minute=0, second=0, microsecond=0)
+    timestamps = pd.date_range(end=fin, periods=anios * 365 * 24, freq='h')
+
+    hora = timestamps.hour.to_numpy()
+    dia_semana = timestamps.dayofweek.to_numpy()
+    dia_anio = timestamps.dayofyear.to_numpy()
+
+    # Tamaño del cliente: de comercio pequeño a industria mediana
+    escala = rng.lognormal(mean=3.5, sigma=0.8)
+    laboral = np.where(dia_semana < 5, 1.0, 0.55)
+    jornada = np.where((hora >= 8) & (hora < 19), 1.0, 0.35) + 0.25 * np.exp(-((hora - 20) ** 2) / 4)
+    # Verano más cargado por aire acondicionado (pico a mediados de julio)
+    estacion = 1 + 0.3 * np.cos(2 * np.pi * (dia_anio - 196) / 365)
+    consumo = escala * laboral * jornada * estacion * rng.normal(1, 0.08, len(timestamps))
+    consumo = np.clip(consumo, 0, None)
+
+    # Solo una parte de los clientes tiene paneles solares
+    capacidad_solar = escala * rng.uniform(0.2, 0.8) if rng.random() < 0.4 else 0.0
+    sol = np.clip(np.sin(np.pi * (hora - 6) / 13), 0, None) * (1 + 0.15 * np.cos(2 * np.pi * (dia_anio - 172) / 365))
+    generacion = capacidad_solar * sol * rng.uniform(0.6, 1.0, len(timestamps))
+
+    df = pd.DataFrame({
+        'timestamp': timestamps,
+        'Usage_kWh': consumo.round(3),
+        'Generation_kWh': generacion.round(3),
+        'Grid_kWh': (consumo - generacion).round(3),
+    })
+    df['tarifa'] = classify_gdmth_period(df['timestamp'])
+    return df
+
+def _copiar_tabla(tabla_nombre, df):
+    """Carga el DataFrame a la tabla por cliente con COPY (más rápido que el UPSERT de insertar_datos)"""
+    conn = get_connection()
+    if not conn:
+        return False
+
+    try:
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False, date_format='%Y-%m-%d %H:%M:%S')
+        buffer.seek(0)
+        cur = conn.cursor()
+        columnas = ", ".join(f'"{col}"' for col in df.columns)
+        cur.copy_expert(f'COPY "{tabla_nombre}" ({columnas}) FROM STDIN WITH (FORMAT csv)', buffer)
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        print(f"❌ {tabla_nombre}: {e}")
+        conn.close()
+        return False
+
+def _cargar_lecturas(tabla_nombre, df):
+    """Escribe las lecturas con el almacenamiento configurado"""
+    if not usa_particionado():
+        return crear_tabla(tabla_nombre, df) and _copiar_tabla(tabla_nombre, df)
+
+    if not asegurar_particiones(df['timestamp'].min(), df['timestamp'].max()):
+        return False
+    # Por mes para acotar la memoria del formato largo
+    for _, mes in df.groupby(df['timestamp'].dt.to_period('M')):
+        filas, _ = insertar_lecturas(tabla_nombre, mes)
+        if filas == 0:
+            return False
+    return True
+
+def generar_clientes(total, anios=ANIOS_DEFAULT, rollups=True):
+    """
+    Garantiza `total` clientes sintéticos con lecturas; los que ya existen no se regeneran
+
+    Returns:
+        Lista de tablas sintéticas (tabla_sintetica(1) ... tabla_sintetica(total))
+    """
+    tablas = [tabla_sintetica(numero) for numero in range(1, total + 1)]
+    guardar_clientes([
+        (f"Sintético {numero:04d}", f"sintetico-{numero:04d}.egauge.invalid",
+         f"https://sintetico-{numero:04d}.egauge.invalid", tabla)
+        for numero, tabla in enumerate(tablas, start=1)
+    ])
+
+    # Con entrada en el catálogo de estadísticas el cliente ya fue cargado
+    marcas = dict(obtener_marcas_ingesta(tablas) or ())
+    pendientes = [(numero, tabla) for numero, tabla in enumerate(tablas, start=1) if marcas.get(tabla) is None]
+
+    for i, (numero, tabla) in enumerate(pendientes, start=1):
+        inicio = time.perf_counter()
+        df = generar_lecturas(numero, anios)
+        if not _cargar_lecturas(tabla, df):
+            raise SystemExit(f"No se pudieron cargar las lecturas de {tabla}")
+        refrescar_estadisticas_tabla(tabla)
+        if rollups:
+            reconstruir_rollups(tabla)
+        print(f"✅ [{i}/{len(pendientes)}] {tabla}: {len(df):,} filas en {time.perf_counter() - inicio:.1f} s")
+
+    return tablas
+
+def limpiar_sinteticos():
+    """Elimina clientes, lecturas, rollups y estadísticas de los clientes sintéticos"""
+    conn = get_connection()
+    if not conn:
+        raise SystemExit("Sin conexión a PostgreSQL")
+    cur = conn.cursor()
+    cur.execute("SELECT tabla_nombre FROM egauge_clientes WHERE tabla_nombre LIKE %s", (PREFIJO_SINTETICO + '%',))
+    tablas = [tabla for (tabla,) in cur.fetchall()]
+    cur.close()
+    conn.close()
+
+    # Las lecturas particionadas se buscan por cliente: borrarlas antes que el cliente
+    for tabla in tablas:
+        eliminar_tabla_egauge(tabla)
+        eliminar_rollups_tabla(tabla)
+
+    conn = get_connection()
+    if not conn:
+        raise SystemExit("Sin conexión a PostgreSQL")
+    cur = conn.cursor()
+    cur.execute("DELETE FROM egauge_clientes WHERE tabla_nombre = ANY(%s)", (tablas,))
+    conn.commit()
+    cur.close()
+    conn.close()
+    print(f"🗑️ {len(tablas)} clientes sintéticos eliminados")
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera clientes y lecturas sintéticas para pruebas de carga")
+    parser.add_argument("--clientes", type=int, default=10, help="Número de clientes sintéticos")
+    parser.add_argument("--anios", type=int, default=ANIOS_DEFAULT, help="Años de lecturas horarias por cliente")
+    parser.add_argument("--sin-rollups", action="store_true",
+                        help="No construir rollups (la calculadora agrega desde las lecturas crudas)")
+    parser.add_argument("--limpiar", action="store_true", help="Eliminar los clientes sintéticos y salir")
+    args = parser.parse_args()
+
+    if not asegurar_esquema():
+        raise SystemExit("No se pudo preparar el esquema")
+
+    if args.limpiar:
+        limpiar_sinteticos()
+        return
+
+    inicio = time.perf_counter()
+    tablas = generar_clientes(args.clientes, args.anios, rollups=not args.sin_rollups)
+    print(f"🏁 {len(tablas)} clientes sintéticos listos en {time.perf_counter() - inicio:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Migra las tablas egauge por cliente a la tabla única particionada egauge_lecturas
+
+Uso (desde la raíz del proyecto):
+    python -m scripts.migrar_a_particionado                 # todas las tablas
+    python -m scripts.migrar_a_particionado --tabla dormi   # una sola tabla
+    python -m scripts.migrar_a_particionado --eliminar-originales
+
+Después de migrar, configura EGAUGE_ALMACENAMIENTO=particionado en el .env
+para que la ingesta y la calculadora usen la nueva tabla.
+"""
+import argparse
+from database.estadisticas import refrescar_estadisticas_tabla
+from database.particionado import (
+    crear_tabla_lecturas, migrar_tabla_a_particionado, migrar_todas_las_tablas
+)
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra tablas egauge_* a egauge_lecturas particionada")
+    parser.add_argument("--tabla", help="Migrar solo esta tabla")
+    parser.add_argument("--eliminar-originales", action="store_true",
+                        help="Borrar las tablas de origen después de copiarlas")
+    args = parser.parse_args()
+
+    if not crear_tabla_lecturas():
+        raise SystemExit("No se pudo crear la tabla egauge_lecturas")
+
+    if args.tabla:
+        resultados = {args.tabla: migrar_tabla_a_particionado(args.tabla, args.eliminar_originales)}
+    else:
+        resultados = migrar_todas_las_tablas(args.eliminar_originales)
+
+    errores = 0
+    for tabla, copiadas in resultados.items():
+        if copiadas < 0:
+            errores += 1
+            print(f"❌ {tabla}: error")
+        else:
+            # El catálogo debe contar ahora desde egauge_lecturas si la tabla ya no existe
+            refrescar_estadisticas_tabla(tabla)
+            print(f"✅ {tabla}: {copiadas:,} lecturas copiadas")
+
+    print(f"Migración terminada: {len(resultados) - errores} tablas migradas, {errores} con error")
+    if errores:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
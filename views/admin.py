@@ -1,26 +1,30 @@
+import math
 import streamlit as st
 from database.models import (
-    cargar_clientes, toggle_cliente_activo, eliminar_cliente, 
+    contar_clientes, buscar_clientes, toggle_cliente_activo, eliminar_cliente, 
     ejecutar_acciones_masivas_clientes
 )
 
+# Filas de administración por página
+TAMANO_PAGINA_ADMIN = 50
+
 def render_admin_clientes():
     """Renderiza la vista de administración de clientes"""
     st.header("📋 Administrar Clientes")
     st.markdown("**Gestiona tu lista completa de clientes eGauge**")
     
-    # Cargar todos los clientes (activos e inactivos)
-    todos_clientes = cargar_clientes(solo_activos=False)
+    # Solo los conteos; la lista se pide paginada a PostgreSQL
+    total_clientes, activos = contar_clientes()
     
-    if not todos_clientes:
+    if not total_clientes:
         st.info("ℹ️ No tienes clientes registrados aún")
         return
     
     # Mostrar estadísticas
-    _mostrar_estadisticas_clientes(todos_clientes)
+    _mostrar_estadisticas_clientes(total_clientes, activos)
     
     # Filtros
-    clientes_filtrados = _aplicar_filtros_clientes(todos_clientes)
+    clientes_filtrados = _aplicar_filtros_clientes()
     
     if not clientes_filtrados:
         st.info("ℹ️ No se encontraron clientes con los filtros aplicados")
@@ -32,12 +36,11 @@ def render_admin_clientes():
     # Acciones masivas
     _mostrar_acciones_masivas()
 
-def _mostrar_estadisticas_clientes(todos_clientes):
+def _mostrar_estadisticas_clientes(total_clientes, activos):
     """Muestra estadísticas generales de clientes"""
-    activos = sum(1 for cliente in todos_clientes if cliente[5])  # cliente[5] es 'activo'
-    inactivos = len(todos_clientes) - activos
+    inactivos = total_clientes - activos
     
-    st.success(f"📊 Total de clientes registrados: {len(todos_clientes)}")
+    st.success(f"📊 Total de clientes registrados: {total_clientes}")
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -45,38 +48,36 @@ def _mostrar_estadisticas_clientes(todos_clientes):
     with col2:
         st.metric("❌ Inactivos", inactivos)
     with col3:
-        porcentaje_activos = (activos / len(todos_clientes)) * 100 if todos_clientes else 0
+        porcentaje_activos = (activos / total_clientes) * 100 if total_clientes else 0
         st.metric("📈 % Activos", f"{porcentaje_activos:.1f}%")
 
-def _aplicar_filtros_clientes(todos_clientes):
-    """Aplica filtros a la lista de clientes"""
+def _aplicar_filtros_clientes():
+    """Busca en PostgreSQL la página de clientes que cumple los filtros"""
     st.subheader("🔍 Filtros")
     
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns([2, 2, 1])
     with col1:
         filtro_estado = st.selectbox("Filtrar por estado:", ["Todos", "Solo activos", "Solo inactivos"])
     with col2:
         buscar_texto = st.text_input("🔍 Buscar cliente:", placeholder="Escribe nombre o hostname...")
     
-    # Aplicar filtros
-    clientes_filtrados = []
-    for cliente in todos_clientes:
-        nombre, hostname, url, tabla, cliente_id, activo = cliente
-        
-        # Filtro por estado
-        if filtro_estado == "Solo activos" and not activo:
-            continue
-        elif filtro_estado == "Solo inactivos" and activo:
-            continue
-        
-        # Filtro por búsqueda
-        if buscar_texto and buscar_texto.lower() not in nombre.lower() and buscar_texto.lower() not in hostname.lower():
-            continue
-        
-        clientes_filtrados.append(cliente)
+    estado = {"Todos": "todos", "Solo activos": "activos", "Solo inactivos": "inactivos"}[filtro_estado]
+    
+    # El total se conoce con la primera página; el selector de página se acota a él
+    pagina = st.session_state.get('admin_pagina_clientes', 1)
+    clientes_filtrados, total = buscar_clientes(buscar_texto, estado, pagina - 1, TAMANO_PAGINA_ADMIN)
+    total_paginas = max(math.ceil(total / TAMANO_PAGINA_ADMIN), 1)
+    if pagina > total_paginas:
+        # Los filtros cambiaron y la página ya no existe: volver a la primera
+        pagina = st.session_state.admin_pagina_clientes = 1
+        clientes_filtrados, total = buscar_clientes(buscar_texto, estado, 0, TAMANO_PAGINA_ADMIN)
+    
+    with col3:
+        st.number_input("Página:", min_value=1, max_value=total_paginas, key="admin_pagina_clientes")
     
     if clientes_filtrados:
-        st.info(f"📋 Mostrando {len(clientes_filtrados)} clientes")
+        desde = (pagina - 1) * TAMANO_PAGINA_ADMIN + 1
+        st.info(f"📋 Mostrando {desde}–{desde + len(clientes_filtrados) - 1} de {total} clientes")
     
     return clientes_filtrados
 
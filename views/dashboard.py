@@ -1,9 +1,14 @@
+import math
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from database.models import cargar_clientes, obtener_tablas_egauge
+from database.models import contar_clientes, cargar_clientes_pagina, TAMANO_PAGINA_CLIENTES
+from database.estadisticas import obtener_resumen_estadisticas
+from database.rollups import obtener_resumen_mensual
 from database.connection import db
 
+OPCIONES_TAMANO_PAGINA = [12, 24, 48, 96]
+
 def render_dashboard():
     """Dashboard principal con vista de clientes"""
     
@@ -18,17 +23,21 @@ def render_dashboard():
     # Estadísticas generales
     _mostrar_estadisticas_generales()
     
+    # Consumo del mes desde rollups
+    _mostrar_consumo_mes()
+    
     st.divider()
     
     # Vista de clientes
     _mostrar_vista_clientes()
 
+@st.fragment
 def _mostrar_estadisticas_generales():
-    """Muestra estadísticas generales del sistema"""
+    """Muestra estadísticas generales del sistema (fragmento: no se rehace con los reruns de la paginación)"""
     
     # Obtener datos
-    clientes = cargar_clientes()
-    tablas = obtener_tablas_egauge()
+    total_clientes, activos = contar_clientes()
+    num_tablas, total_registros = obtener_resumen_estadisticas()
     
     # Estado de conexión
     conexion_ok = db.test_connection()
@@ -46,43 +55,48 @@ def _mostrar_estadisticas_generales():
     with col2:
         st.metric(
             label="👥 Clientes Activos",
-            value=len(clientes),
-            delta=f"{len([c for c in clientes if len(c) > 4])} registrados" if clientes else "0 registrados"
+            value=activos,
+            delta=f"{total_clientes} registrados"
         )
     
     with col3:
         st.metric(
             label="🗄️ Tablas de Datos",
-            value=len(tablas),
-            delta="Con datos" if tablas else "Sin datos"
+            value=num_tablas,
+            delta="Con datos" if num_tablas else "Sin datos"
         )
     
     with col4:
-        total_registros = 0
-        if tablas:
-            for tabla in tablas:
-                try:
-                    filas_str = tabla.get('Filas', '0')
-                    if filas_str != 'Error':
-                        filas = int(filas_str.replace(',', ''))
-                        total_registros += filas
-                except:
-                    continue
-        
         st.metric(
             label="📊 Total Registros",
             value=f"{total_registros:,}",
             delta="Datos procesados"
         )
 
+def _mostrar_consumo_mes():
+    """Muestra el consumo del mes actual leyendo solo los rollups mensuales"""
+    mes_actual = datetime.now().date().replace(day=1)
+    resumen = obtener_resumen_mensual(mes_actual)
+    
+    if resumen.empty:
+        return
+    
+    with st.expander(f"⚡ Consumo de {mes_actual.strftime('%m/%Y')} por cliente", expanded=False):
+        st.dataframe(
+            resumen.style.format({col: "{:,.1f}" for col in resumen.columns if col not in ('Cliente', 'Registro')}, na_rep="—"),
+            use_container_width=True,
+            hide_index=True
+        )
+
+@st.fragment
 def _mostrar_vista_clientes():
-    """Muestra la vista principal de clientes"""
+    """Muestra la vista principal de clientes (fragmento: buscar y paginar no reejecutan el resto del dashboard)"""
     
     st.subheader("👥 Vista de Clientes")
     
-    clientes = cargar_clientes()
+    _, activos = contar_clientes()
     
-    if not clientes:
+    if not activos:
         st.info("No hay clientes registrados")
         st.markdown("### 🚀 Primeros pasos:")
         st.markdown("1. **Gestión de Clientes**: Agrega tus medidores eGauge")
@@ -92,30 +106,64 @@ def _mostrar_vista_clientes():
         return
     
     # Filtros
-    col1, col2 = st.columns([2, 1])
+    col1, col2, col3 = st.columns([2, 1, 1])
     with col1:
         buscar = st.text_input("🔍 Buscar cliente", placeholder="Escribe nombre o hostname...")
     with col2:
+        tamano_pagina = st.selectbox("Clientes por página", OPCIONES_TAMANO_PAGINA, index=OPCIONES_TAMANO_PAGINA.index(TAMANO_PAGINA_CLIENTES))
+    with col3:
         mostrar_todos = st.checkbox("Mostrar todos los detalles", value=False)
     
-    # Filtrar clientes
-    clientes_filtrados = clientes
-    if buscar:
-        clientes_filtrados = [
-            c for c in clientes 
-            if buscar.lower() in c[0].lower() or buscar.lower() in c[1].lower()
-        ]
+    # Volver a la primera página cuando cambia la búsqueda o el tamaño de página
+    filtro_actual = (buscar, tamano_pagina)
+    if st.session_state.get('dashboard_filtro_clientes') != filtro_actual:
+        st.session_state.dashboard_filtro_clientes = filtro_actual
+        st.session_state.dashboard_pagina_clientes = 0
+    pagina = st.session_state.get('dashboard_pagina_clientes', 0)
+    
+    # Solo se consulta y se renderiza la página visible
+    clientes_pagina, total_filtrados = cargar_clientes_pagina(pagina, tamano_pagina, buscar=buscar)
+    total_paginas = max(math.ceil(total_filtrados / tamano_pagina), 1)
     
-    st.write(f"**Mostrando {len(clientes_filtrados)} de {len(clientes)} clientes**")
+    if not clientes_pagina and pagina > 0:
+        # La página dejó de existir (p. ej. se eliminaron clientes)
+        st.session_state.dashboard_pagina_clientes = 0
+        st.rerun(scope="fragment")
+    
+    if not clientes_pagina:
+        st.info("ℹ️ No se encontraron clientes con esa búsqueda")
+        return
+    
+    desde = pagina * tamano_pagina + 1
+    st.write(f"**Mostrando {desde}–{desde + len(clientes_pagina) - 1} de {total_filtrados} clientes** ({activos} activos)")
     
     # Mostrar clientes en cards
     if mostrar_todos:
-        _mostrar_clientes_detallado(clientes_filtrados)
+        _mostrar_clientes_detallado(clientes_pagina)
     else:
-        _mostrar_clientes_grid(clientes_filtrados)
+        _mostrar_clientes_grid(clientes_pagina)
+    
+    _mostrar_paginacion(pagina, total_paginas)
+
+def _mostrar_paginacion(pagina, total_paginas):
+    """Controles de anterior/siguiente para la vista de clientes"""
+    if total_paginas <= 1:
+        return
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("◀ Anterior", use_container_width=True, disabled=pagina == 0, key="clientes_pagina_anterior"):
+            st.session_state.dashboard_pagina_clientes = pagina - 1
+            st.rerun(scope="fragment")
+    with col2:
+        st.markdown(f"<div style='text-align: center; padding-top: 8px;'>Página {pagina + 1} de {total_paginas}</div>", unsafe_allow_html=True)
+    with col3:
+        if st.button("Siguiente ▶", use_container_width=True, disabled=pagina >= total_paginas - 1, key="clientes_pagina_siguiente"):
+            st.session_state.dashboard_pagina_clientes = pagina + 1
+            st.rerun(scope="fragment")
 
 def _mostrar_clientes_grid(clientes):
-    """Muestra clientes en formato grid compacto"""
+    """Muestra en formato grid compacto los clientes de la página actual"""
     
     # Organizar en filas de 3 columnas
     for i in range(0, len(clientes), 3):
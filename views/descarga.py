@@ -2,8 +2,7 @@ import streamlit as st
 import time as time_module
 from datetime import datetime
 from database.models import cargar_clientes
-from core.processor import generar_timestamps_rango
-from core.downloader import procesar_cliente_completo
+from core.downloader import procesar_cliente_completo, planificar_ventanas, RESOLUCIONES
 
 def render_descarga_individual():
     """Renderiza la vista de descarga individual"""
@@ -27,13 +26,30 @@ def render_descarga_individual():
     
     # Configuración temporal
     datetime_inicio, datetime_fin = _configurar_periodo_individual()
+    paso_segundos = _selector_resolucion()
     
     # Mostrar información del cliente y período
-    _mostrar_resumen_descarga(cliente_seleccionado, datetime_inicio, datetime_fin)
+    _mostrar_resumen_descarga(cliente_seleccionado, datetime_inicio, datetime_fin, paso_segundos)
     
-    # Botón de descarga
+    # Botón de descarga y área de progreso
+    _area_descarga(cliente_seleccionado, datetime_inicio, datetime_fin, paso_segundos)
+
+@st.fragment
+def _area_descarga(cliente_seleccionado, datetime_inicio, datetime_fin, paso_segundos):
+    """Botón y progreso de la descarga como fragmento: no recarga clientes ni el resto de la página"""
     if st.button("🚀 Iniciar Descarga", type="primary", use_container_width=True):
-        _ejecutar_descarga_individual(cliente_seleccionado, datetime_inicio, datetime_fin)
+        _ejecutar_descarga_individual(cliente_seleccionado, datetime_inicio, datetime_fin, paso_segundos)
+
+def _selector_resolucion():
+    """Resolución de las lecturas a descargar; retorna segundos entre lecturas"""
+    paso_segundos = st.radio(
+        "📏 Resolución",
+        list(RESOLUCIONES),
+        format_func=RESOLUCIONES.get,
+        horizontal=True,
+        help="15 minutos o 1 minuto capturan la demanda máxima de CFE; los reportes usan los rollups de 15 minutos y de hora"
+    )
+    return paso_segundos
 
 def _selector_cliente_individual(clientes_db):
     """Selector de cliente individual"""
@@ -128,13 +144,14 @@ def _configurar_periodo_individual():
     
     return datetime_inicio, datetime_fin
 
-def _mostrar_resumen_descarga(cliente_seleccionado, datetime_inicio, datetime_fin):
+def _mostrar_resumen_descarga(cliente_seleccionado, datetime_inicio, datetime_fin, paso_segundos):
     """Muestra resumen de lo que se va a descargar"""
     hostname, tabla, nombre = cliente_seleccionado
     
     # Calcular estimaciones
-    timestamps = generar_timestamps_rango(datetime_inicio, datetime_fin, 3600)
-    total_requests = len(timestamps)
+    ventanas = planificar_ventanas(datetime_inicio, datetime_fin, paso_segundos)
+    total_requests = len(ventanas)
+    total_puntos = sum(filas for _, filas in ventanas)
     tiempo_estimado = total_requests * 0.5  # ~0.5 segundos por request
     
     st.subheader("📋 Resumen de Descarga")
@@ -145,7 +162,7 @@ def _mostrar_resumen_descarga(cliente_seleccionado, datetime_inicio, datetime_fi
     with col1:
         st.metric("👤 Cliente", nombre)
     with col2:
-        st.metric("📊 Puntos de datos", f"{total_requests:,}")
+        st.metric("📊 Puntos de datos", f"{total_puntos:,}", f"{total_requests:,} peticiones", delta_color="off")
     with col3:
         st.metric("⏱️ Tiempo estimado", f"{tiempo_estimado/60:.1f} min")
     with col4:
@@ -154,16 +171,16 @@ def _mostrar_resumen_descarga(cliente_seleccionado, datetime_inicio, datetime_fi
     # Información adicional
     st.info(f"🔄 Se descargarán datos desde **{datetime_inicio.strftime('%d/%m/%Y %H:%M')}** hasta **{datetime_fin.strftime('%d/%m/%Y %H:%M')}**")
 
-def _ejecutar_descarga_individual(cliente_seleccionado, datetime_inicio, datetime_fin):
+def _ejecutar_descarga_individual(cliente_seleccionado, datetime_inicio, datetime_fin, paso_segundos):
     """Ejecuta la descarga individual con progreso"""
     hostname, tabla_nombre, nombre_cliente = cliente_seleccionado
     
-    # Generar timestamps
-    timestamps = generar_timestamps_rango(datetime_inicio, datetime_fin, 3600)
-    total_puntos = len(timestamps)
+    # Generar ventanas
+    ventanas = planificar_ventanas(datetime_inicio, datetime_fin, paso_segundos)
+    total_puntos = len(ventanas)
     
     st.success(f"🚀 **Iniciando descarga para {nombre_cliente}**")
-    st.info(f"📊 Descargando {total_puntos:,} puntos de datos...")
+    st.info(f"📊 Descargando {total_puntos:,} ventanas de datos...")
     
     # Crear contenedores para el progreso
     progress_container = st.container()
@@ -203,11 +220,11 @@ def _ejecutar_descarga_individual(cliente_seleccionado, datetime_inicio, datetim
         log_area.text("\n".join(logs_recientes))
     
     agregar_log(f"🚀 Iniciando descarga para {nombre_cliente}")
-    agregar_log(f"📊 Total de puntos: {total_puntos:,}")
+    agregar_log(f"📊 Total de ventanas: {total_puntos:,}")
     
     try:
         # Ejecutar descarga
-        resultado = procesar_cliente_completo(hostname, tabla_nombre, timestamps)
+        resultado = procesar_cliente_completo(hostname, tabla_nombre, ventanas, paso_segundos)
         
         # Simular progreso (ya que procesar_cliente_completo no da progreso incremental)
         # En una implementación futura, podrías modificar la función para dar progreso real
@@ -282,4 +299,4 @@ def _ejecutar_descarga_individual(cliente_seleccionado, datetime_inicio, datetim
     
     # Botón para nueva descarga
     if st.button("🔄 Realizar otra descarga", use_container_width=True):
-        st.rerun()
\ No newline at end of file
+        st.rerun(scope="fragment")
\ No newline at end of file
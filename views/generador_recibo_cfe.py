@@ -1,5 +1,11 @@
 import streamlit as st
 import base64
+from collections import Counter
+from datetime import datetime, timedelta
+from database.models import cargar_clientes
+from database.lecturas import obtener_registros
+from core.facturacion import facturar_clientes, PRECIOS_DEFAULT
+from core.recibos_pdf import generar_recibos_zip, generar_recibos_pdf_unico
 
 def render_generador_recibo_cfe():
     """Generador simple de recibos CFE"""
@@ -8,6 +14,7 @@ def render_generador_recibo_cfe():
     # Verificar datos
     if 'datos_calculados' not in st.session_state:
         st.warning("Primero calcula los datos en 'Calculadora CFE'")
+        _render_recibos_masivos()
         return
     
     datos = st.session_state.datos_calculados
@@ -33,6 +40,112 @@ def render_generador_recibo_cfe():
             st.markdown(html, unsafe_allow_html=True)
         else:
             st.error("Error generando el HTML del recibo")
+    
+    _render_recibos_masivos()
+
+def _render_recibos_masivos():
+    """Genera los recibos PDF de varios clientes para un periodo en un solo paso"""
+    st.divider()
+    st.subheader("📦 Recibos Masivos (PDF)")
+    st.caption("Factura a cada cliente seleccionado con sus propios consumos y genera todos los PDFs en paralelo")
+    
+    clientes_db = cargar_clientes()
+    if not clientes_db:
+        st.info("ℹ️ No hay clientes activos registrados")
+        return
+    
+    opciones = {f"{nombre} ({tabla})": (nombre, tabla) for nombre, _, _, tabla, _ in clientes_db}
+    todos = st.checkbox("Todos los clientes activos", value=True, key="masivo_todos")
+    elegidos = list(opciones.keys()) if todos else st.multiselect("Clientes:", list(opciones.keys()), key="masivo_clientes")
+    if not elegidos:
+        return
+    
+    # Registro a facturar: el preferido si el cliente lo tiene, si no el primero disponible
+    registros_por_tabla = {opciones[e][1]: obtener_registros(opciones[e][1]) for e in elegidos}
+    frecuencia = Counter(r for registros in registros_por_tabla.values() for r in registros)
+    if not frecuencia:
+        st.error("Los clientes seleccionados no tienen columnas numéricas")
+        return
+    registro_preferido = st.selectbox("Registro a facturar:", [r for r, _ in frecuencia.most_common()], key="masivo_registro")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        hoy = datetime.now().date()
+        fin_mes_anterior = hoy.replace(day=1) - timedelta(days=1)
+        fecha_inicio = st.date_input("Fecha inicio", fin_mes_anterior.replace(day=1), key="masivo_inicio")
+    with col2:
+        fecha_fin = st.date_input("Fecha fin", fin_mes_anterior, key="masivo_fin")
+    with col3:
+        tarifa = st.selectbox("Tarifa", ["GDMTH", "GDMTO", "PDBT", "GDBT"], key="masivo_tarifa")
+    with col4:
+        salida = st.radio("Salida:", ["ZIP (un PDF por cliente)", "PDF único"], key="masivo_salida")
+    
+    with st.expander("💰 Precios"):
+        precios = _capturar_precios("masivo")
+    
+    if fecha_fin < fecha_inicio:
+        st.warning("⚠️ La fecha final debe ser posterior a la inicial")
+        return
+    
+    if st.button(f"📦 Generar {len(elegidos)} recibos", type="primary", use_container_width=True):
+        columnas_config = {
+            tabla: registro_preferido if registro_preferido in registros else registros[0]
+            for tabla, registros in registros_por_tabla.items() if registros
+        }
+        nombres = {tabla: nombre for nombre, tabla in opciones.values()}
+        
+        with st.spinner("Calculando recibos..."):
+            facturas = facturar_clientes(columnas_config, fecha_inicio, fecha_fin, precios)
+        if facturas is None:
+            st.error("❌ Error obteniendo consumos")
+            return
+        
+        recibos = [
+            {**factura, 'nombre': nombres[tabla], 'tabla_nombre': tabla, 'tarifa': tarifa,
+             'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin}
+            for tabla, factura in facturas.items()
+        ]
+        
+        barra = st.progress(0.0, text="Generando PDFs...")
+        def progreso(hechos, total):
+            barra.progress(hechos / total, text=f"Generando PDFs... {hechos}/{total}")
+        
+        if salida.startswith("ZIP"):
+            contenido = generar_recibos_zip(recibos, progreso=progreso)
+            nombre_archivo, mime = f"recibos_{fecha_inicio:%Y%m%d}_{fecha_fin:%Y%m%d}.zip", "application/zip"
+        else:
+            contenido = generar_recibos_pdf_unico(recibos, progreso=progreso)
+            nombre_archivo, mime = f"recibos_{fecha_inicio:%Y%m%d}_{fecha_fin:%Y%m%d}.pdf", "application/pdf"
+        
+        total_facturado = sum(recibo['total'] for recibo in recibos)
+        st.success(f"✅ {len(recibos)} recibos generados · Total facturado: ${total_facturado:,.2f}")
+        st.download_button(f"⬇️ Descargar {nombre_archivo}", contenido, file_name=nombre_archivo, mime=mime, use_container_width=True)
+
+def _capturar_precios(prefijo):
+    """Inputs de precios con los valores por omisión de la calculadora"""
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        precio_base = st.number_input("Precio Base ($/kWh)", value=PRECIOS_DEFAULT['precio_base'], step=0.01, key=f"{prefijo}_base")
+        precio_intermedio = st.number_input("Precio Intermedio ($/kWh)", value=PRECIOS_DEFAULT['precio_intermedio'], step=0.01, key=f"{prefijo}_intermedio")
+    with col2:
+        precio_punta = st.number_input("Precio Punta ($/kWh)", value=PRECIOS_DEFAULT['precio_punta'], step=0.01, key=f"{prefijo}_punta")
+        precio_capacidad = st.number_input("Precio Capacidad ($/kW)", value=PRECIOS_DEFAULT['precio_capacidad'], step=0.01, key=f"{prefijo}_capacidad")
+    with col3:
+        precio_distribucion = st.number_input("Precio Distribución ($/kW)", value=PRECIOS_DEFAULT['precio_distribucion'], step=0.01, key=f"{prefijo}_distribucion")
+        cargo_fijo = st.number_input("Cargo Fijo ($)", value=PRECIOS_DEFAULT['cargo_fijo'], step=0.01, key=f"{prefijo}_cargo_fijo")
+    with col4:
+        incluir_dap = st.checkbox("Incluir Servicio Alumbrado Público", value=False, key=f"{prefijo}_incluir_dap")
+        porcentaje_dap = st.number_input("% Alumbrado Público", value=2.0, step=0.1, min_value=0.0, max_value=10.0, key=f"{prefijo}_dap") if incluir_dap else 0.0
+    
+    return {
+        'precio_base': precio_base,
+        'precio_intermedio': precio_intermedio,
+        'precio_punta': precio_punta,
+        'precio_capacidad': precio_capacidad,
+        'precio_distribucion': precio_distribucion,
+        'cargo_fijo': cargo_fijo,
+        'porcentaje_dap': porcentaje_dap,
+    }
 
 def _crear_html_simple(nombre, tarifa, fecha_inicio, fecha_fin, datos):
     """Crea HTML básico del recibo"""
@@ -0,0 +1,101 @@
+import time as time_module
+import streamlit as st
+from datetime import datetime, timedelta
+from database.models import cargar_clientes
+from database.lecturas import obtener_registros
+from database.series import obtener_serie_reducida, PUNTOS_OBJETIVO
+
+RANGOS_RAPIDOS = {
+    "7 días": timedelta(days=7),
+    "30 días": timedelta(days=30),
+    "1 año": timedelta(days=365),
+    "5 años": timedelta(days=5 * 365),
+}
+
+def render_graficas():
+    """Renderiza la vista de gráficas de consumo por cliente y registro"""
+    st.header("📈 Gráficas de Consumo")
+    st.markdown("**Series de tiempo reducidas en PostgreSQL: mínimo, máximo y promedio por intervalo**")
+
+    clientes_db = cargar_clientes()
+    if not clientes_db:
+        st.warning("⚠️ No tienes clientes activos registrados")
+        return
+
+    # Selección de cliente y registro
+    col1, col2 = st.columns(2)
+    with col1:
+        opciones = {f"{nombre} ({tabla})": tabla for nombre, _, _, tabla, _ in clientes_db}
+        cliente_elegido = st.selectbox("Cliente:", list(opciones.keys()))
+        tabla_nombre = opciones[cliente_elegido]
+    with col2:
+        registros = obtener_registros(tabla_nombre)
+        if not registros:
+            st.error(f"No hay columnas numéricas en {tabla_nombre}")
+            return
+        registro = st.selectbox("Registro:", registros)
+
+    fecha_inicio, fecha_fin, puntos = _configurar_rango()
+
+    _mostrar_grafica(tabla_nombre, registro, fecha_inicio, fecha_fin, puntos)
+
+def _configurar_rango():
+    """Selector de rango de fechas y resolución"""
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+    with col1:
+        rango_rapido = st.selectbox("Rango:", list(RANGOS_RAPIDOS.keys()) + ["Personalizado"], index=1)
+
+    hoy = datetime.now().date()
+    if rango_rapido == "Personalizado":
+        with col2:
+            inicio = st.date_input("Desde:", hoy - timedelta(days=30))
+        with col3:
+            fin = st.date_input("Hasta:", hoy)
+    else:
+        inicio, fin = hoy - RANGOS_RAPIDOS[rango_rapido], hoy
+
+    with col4:
+        puntos = st.select_slider("Puntos:", options=[500, 1000, 2000, 4000], value=PUNTOS_OBJETIVO)
+
+    return datetime.combine(inicio, datetime.min.time()), datetime.combine(fin, datetime.max.time()), puntos
+
+def _formatear_ancho(segundos):
+    """Ancho de bucket legible"""
+    if segundos < 120:
+        return f"{segundos} s"
+    if segundos < 2 * 3600:
+        return f"{segundos / 60:.0f} min"
+    if segundos < 2 * 86400:
+        return f"{segundos / 3600:.1f} h"
+    return f"{segundos / 86400:.1f} días"
+
+def _mostrar_grafica(tabla_nombre, registro, fecha_inicio, fecha_fin, puntos):
+    """Consulta la serie reducida y la grafica"""
+    if fecha_fin <= fecha_inicio:
+        st.warning("⚠️ La fecha final debe ser posterior a la inicial")
+        return
+
+    inicio_consulta = time_module.perf_counter()
+    serie, ancho = obtener_serie_reducida(tabla_nombre, registro, fecha_inicio, fecha_fin, puntos)
+    tiempo_ms = (time_module.perf_counter() - inicio_consulta) * 1000
+
+    if serie.empty:
+        st.info("ℹ️ No hay lecturas en el rango seleccionado")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Lecturas", f"{int(serie['muestras'].sum()):,}")
+    with col2:
+        st.metric("Puntos graficados", f"{len(serie):,}")
+    with col3:
+        st.metric("Intervalo", _formatear_ancho(ancho))
+    with col4:
+        st.metric("Consulta", f"{tiempo_ms:,.0f} ms")
+
+    # Mínimo y máximo por intervalo conservan picos y valles; el promedio da la tendencia
+    st.line_chart(
+        serie.set_index('timestamp')[['maximo', 'promedio', 'minimo']].rename(columns={
+            'maximo': 'Máximo', 'promedio': 'Promedio', 'minimo': 'Mínimo'
+        })
+    )
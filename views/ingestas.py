@@ -0,0 +1,82 @@
+import streamlit as st
+from datetime import datetime, timedelta
+from database.ingestas import obtener_corridas, obtener_tendencias_clientes
+
+# Caída del rendimiento reciente frente a la referencia a partir de la cual se marca un cliente
+UMBRAL_DEGRADACION_PCT = -30
+
+def render_historial_ingestas():
+    """Renderiza la bitácora de ingestas con tendencias de rendimiento por cliente y de la flota"""
+    st.header("📒 Historial de Ingestas")
+    st.markdown("**Cada corrida de descarga queda registrada: filas, errores, bytes, duración y filas por segundo**")
+
+    dias = st.select_slider("Periodo (días):", options=[7, 30, 90, 365], value=30)
+    corridas = obtener_corridas(datetime.now() - timedelta(days=dias))
+    if corridas.empty:
+        st.info("ℹ️ No hay ingestas registradas en el periodo")
+        return
+
+    _mostrar_flota(corridas)
+    _mostrar_degradacion()
+    _mostrar_cliente(corridas)
+
+def _mostrar_flota(corridas):
+    """Métricas y rendimiento diario de todas las ingestas"""
+    st.subheader("🌐 Flota")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Corridas", f"{len(corridas):,}")
+    with col2:
+        st.metric("Filas escritas", f"{int(corridas['filas'].sum()):,}")
+    with col3:
+        st.metric("Errores", f"{int(corridas['errores'].sum()):,}")
+    with col4:
+        st.metric("MB descargados", f"{corridas['bytes'].sum() / 1024 ** 2:,.1f}")
+
+    # Rendimiento diario ponderado: filas del día entre segundos de ingesta del día
+    diario = corridas.set_index('iniciado_en').resample('D').agg({'filas': 'sum', 'duracion_s': 'sum', 'errores': 'sum'})
+    diario = diario[diario['duracion_s'] > 0]
+    diario['Filas por segundo'] = diario['filas'] / diario['duracion_s']
+    st.line_chart(diario[['Filas por segundo']])
+
+def _mostrar_degradacion():
+    """Clientes cuyo rendimiento de la última semana cayó frente a su referencia"""
+    tendencias = obtener_tendencias_clientes()
+    if tendencias.empty:
+        return
+
+    degradados = tendencias[tendencias['cambio_pct'] <= UMBRAL_DEGRADACION_PCT]
+    if degradados.empty:
+        st.success("✅ Ningún cliente bajó su rendimiento en la última semana")
+        return
+
+    st.warning(f"⚠️ {len(degradados)} clientes con rendimiento {-UMBRAL_DEGRADACION_PCT}% o más por debajo de su referencia")
+    st.dataframe(
+        degradados.rename(columns={
+            'tabla_nombre': 'Tabla', 'corridas_recientes': 'Corridas (7 días)',
+            'filas_por_s_reciente': 'Filas/s (7 días)', 'filas_por_s_referencia': 'Filas/s (30 días previos)',
+            'cambio_pct': 'Cambio (%)'
+        }).round(1),
+        use_container_width=True, hide_index=True
+    )
+
+def _mostrar_cliente(corridas):
+    """Rendimiento por corrida de un cliente y sus últimas corridas"""
+    st.subheader("👤 Por cliente")
+    tabla_nombre = st.selectbox("Cliente:", sorted(corridas['tabla_nombre'].unique()))
+    del_cliente = corridas[corridas['tabla_nombre'] == tabla_nombre]
+
+    st.line_chart(del_cliente.set_index('iniciado_en')[['filas_por_s']].rename(columns={'filas_por_s': 'Filas por segundo'}))
+
+    st.dataframe(
+        del_cliente.sort_values('iniciado_en', ascending=False).head(50)[[
+            'iniciado_en', 'rango_inicio', 'rango_fin', 'ventanas_planeadas', 'peticiones',
+            'filas', 'filas_nuevas', 'errores', 'bytes', 'duracion_s', 'filas_por_s', 'exito'
+        ]].rename(columns={
+            'iniciado_en': 'Inicio', 'rango_inicio': 'Desde', 'rango_fin': 'Hasta',
+            'ventanas_planeadas': 'Ventanas', 'peticiones': 'Peticiones', 'filas': 'Filas',
+            'filas_nuevas': 'Nuevas', 'errores': 'Errores', 'bytes': 'Bytes',
+            'duracion_s': 'Duración (s)', 'filas_por_s': 'Filas/s', 'exito': 'Éxito'
+        }).round(2),
+        use_container_width=True, hide_index=True
+    )
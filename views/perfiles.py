@@ -0,0 +1,63 @@
+import os
+import streamlit as st
+from core.perfilado import (
+    listar_perfiles, top_funciones, PERFILAR, PERFILES_DIR, PERFIL_MIN_MS
+)
+
+def render_perfiles():
+    """Renderiza la lista de perfiles guardados y sus funciones más costosas"""
+    st.header("🔬 Perfiles de Ejecución")
+    st.markdown("**cProfile del render de cada página y de cada ingesta, guardado en disco**")
+
+    if PERFILAR:
+        st.caption(f"Perfilado activo: se guardan las ejecuciones de ≥ {PERFIL_MIN_MS:.0f} ms en `{PERFILES_DIR}/`")
+    else:
+        st.info("ℹ️ El perfilado está desactivado. Inicia la app con EGAUGE_PERFILAR=1 para registrar perfiles")
+
+    perfiles = listar_perfiles()
+    if perfiles.empty:
+        st.info("ℹ️ No hay perfiles guardados")
+        return
+
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        tipos = st.multiselect("Tipo:", sorted(perfiles['tipo'].unique()), default=sorted(perfiles['tipo'].unique()))
+    perfiles = perfiles[perfiles['tipo'].isin(tipos)]
+    if perfiles.empty:
+        return
+
+    st.dataframe(
+        perfiles.drop(columns='ruta').rename(columns={
+            'fecha': 'Fecha', 'tipo': 'Tipo', 'nombre': 'Página / tabla', 'duracion_ms': 'Duración (ms)'
+        }),
+        use_container_width=True, hide_index=True
+    )
+
+    with col2:
+        ruta = st.selectbox(
+            "Perfil:", list(perfiles['ruta']),
+            format_func=lambda ruta: os.path.basename(ruta)
+        )
+
+    _mostrar_perfil(ruta)
+
+def _mostrar_perfil(ruta):
+    """Muestra las funciones con mayor tiempo acumulado de un perfil"""
+    st.subheader("⏱️ Funciones por tiempo acumulado")
+    try:
+        df_top = top_funciones(ruta)
+    except Exception as e:
+        st.error(f"Error leyendo el perfil: {e}")
+        return
+
+    st.dataframe(
+        df_top.rename(columns={
+            'funcion': 'Función', 'llamadas': 'Llamadas',
+            'tiempo_propio_s': 'Propio (s)', 'tiempo_acumulado_s': 'Acumulado (s)'
+        }),
+        use_container_width=True, hide_index=True
+    )
+
+    # El archivo .prof se abre con snakeviz o pstats para el árbol completo
+    with open(ruta, 'rb') as archivo:
+        st.download_button("⬇️ Descargar .prof", archivo.read(), file_name=os.path.basename(ruta), mime="application/octet-stream")
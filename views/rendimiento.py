@@ -0,0 +1,123 @@
+import streamlit as st
+from database.instrumentacion import (
+    obtener_histograma, obtener_percentiles, obtener_top_sentencias,
+    obtener_tiempo_por_pagina, obtener_consultas_lentas, reiniciar_metricas,
+    INSTRUMENTAR_CONSULTAS, UMBRAL_LENTA_MS, VENTANA_HISTOGRAMA_S
+)
+from datetime import datetime, timedelta
+from database.metricas import url_metricas, exportar_metricas, iniciar_servidor_metricas, error_servidor_metricas
+from database.trazas import obtener_latencia_hosts, TRAZAR_DESCARGAS, RETENCION_TRAZAS_DIAS
+
+def render_rendimiento():
+    """Renderiza el panel de rendimiento de la base de datos"""
+    st.header("🐢 Rendimiento de Base de Datos")
+    st.markdown("**Tiempo de PostgreSQL por sentencia y por página, acumulado para todas las sesiones**")
+
+    _render_endpoint_metricas()
+    _render_latencia_hosts()
+
+    if not INSTRUMENTAR_CONSULTAS:
+        st.info("ℹ️ La instrumentación está desactivada (EGAUGE_INSTRUMENTAR_CONSULTAS=0)")
+        return
+
+    _render_resumen_consultas()
+    _render_top_sentencias()
+    _render_consultas_lentas()
+
+    st.divider()
+    if st.button("🔄 Reiniciar métricas", type="secondary"):
+        reiniciar_metricas()
+        st.rerun()
+
+def _render_endpoint_metricas():
+    """Muestra dónde se exponen las métricas de ingesta en formato Prometheus"""
+    url = url_metricas()
+    error = error_servidor_metricas()
+    if url:
+        st.caption(f"📡 Métricas de ingesta y PostgreSQL en formato Prometheus: `{url}`")
+    elif error:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.caption(f"📡 No se pudo abrir el endpoint de métricas (EGAUGE_METRICAS_PUERTO): {error}")
+        with col2:
+            if st.button("🔁 Reintentar", key="reintentar_metricas", use_container_width=True):
+                if iniciar_servidor_metricas(reintentar=True):
+                    st.rerun()
+                st.error(f"❌ El puerto sigue ocupado: {error_servidor_metricas()}")
+    else:
+        st.caption("📡 Endpoint de métricas desactivado (EGAUGE_METRICAS_PUERTO)")
+    with st.expander("Ver métricas Prometheus"):
+        st.code(exportar_metricas(), language="text")
+
+def _render_latencia_hosts():
+    """Resumen de las trazas de descarga por medidor: dónde se va el tiempo de cada ventana"""
+    st.subheader("📡 Latencia de descarga por medidor")
+    if not TRAZAR_DESCARGAS:
+        st.info("ℹ️ Las trazas de descarga están desactivadas (EGAUGE_TRAZAR_DESCARGAS=0)")
+        return
+
+    dias = st.select_slider("Periodo (días):", options=[1, 7, 30], value=7, key="trazas_dias")
+    st.caption(f"Trazas conservadas {RETENCION_TRAZAS_DIAS} días (EGAUGE_RETENCION_TRAZAS_DIAS)")
+    df_hosts = obtener_latencia_hosts(datetime.now() - timedelta(days=dias))
+    if df_hosts.empty:
+        st.info("ℹ️ No hay descargas registradas en el periodo")
+        return
+
+    st.dataframe(
+        df_hosts.rename(columns={
+            'host': 'Medidor', 'ventanas': 'Ventanas', 'errores': 'Errores',
+            'p50_ms': 'p50 (ms)', 'p95_ms': 'p95 (ms)',
+            'conexion_ms': 'Conexión', 'ttfb_ms': 'Primer byte', 'cuerpo_ms': 'Cuerpo',
+            'parseo_ms': 'Parseo', 'clasificacion_ms': 'Clasificación', 'escritura_ms': 'Escritura BD',
+            'cuello': 'Limitado por'
+        }).round(1),
+        use_container_width=True, hide_index=True
+    )
+    st.caption("Fases en ms promedio por ventana. Red = conexión + cuerpo; Medidor = primer byte; Procesamiento = parseo + clasificación")
+
+def _render_resumen_consultas():
+    """Muestra percentiles e histograma de la ventana móvil"""
+    st.subheader(f"⏱️ Últimos {VENTANA_HISTOGRAMA_S // 60} minutos")
+
+    percentiles = obtener_percentiles()
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.metric("Consultas", f"{percentiles['consultas']:,}")
+    with col2:
+        st.metric("Por segundo", f"{percentiles['por_segundo']:.1f}")
+    with col3:
+        st.metric("p50", f"{percentiles['p50']:.1f} ms")
+    with col4:
+        st.metric("p95", f"{percentiles['p95']:.1f} ms")
+    with col5:
+        st.metric("p99", f"{percentiles['p99']:.1f} ms")
+
+    if percentiles['consultas']:
+        st.bar_chart(obtener_histograma().set_index('Rango'))
+
+    df_paginas = obtener_tiempo_por_pagina()
+    if not df_paginas.empty:
+        st.markdown("**Tiempo de base de datos por página**")
+        st.dataframe(df_paginas, use_container_width=True, hide_index=True)
+
+def _render_top_sentencias():
+    """Muestra las sentencias con mayor tiempo total"""
+    st.subheader("🏆 Sentencias por tiempo total")
+
+    limite = st.selectbox("Mostrar:", [10, 20, 50, 100], index=1, key="rendimiento_limite_top")
+    df_top = obtener_top_sentencias(limite)
+    if df_top.empty:
+        st.info("ℹ️ Aún no se han registrado consultas")
+        return
+    st.dataframe(df_top, use_container_width=True, hide_index=True)
+
+def _render_consultas_lentas():
+    """Muestra el log de consultas que superaron el umbral"""
+    st.subheader(f"🐌 Consultas lentas (≥ {UMBRAL_LENTA_MS:.0f} ms)")
+    st.caption("Umbral configurable con EGAUGE_UMBRAL_CONSULTA_LENTA_MS")
+
+    df_lentas = obtener_consultas_lentas()
+    if df_lentas.empty:
+        st.success("✅ Ninguna consulta superó el umbral")
+        return
+    st.dataframe(df_lentas, use_container_width=True, hide_index=True)
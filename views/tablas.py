@@ -1,6 +1,17 @@
+import os
 import streamlit as st
 import pandas as pd
+from datetime import datetime, timedelta
 from database.models import obtener_tablas_egauge, eliminar_tabla_egauge
+from database.estadisticas import refrescar_estadisticas_tabla
+from database.rollups import reconstruir_rollups
+from database.indices import obtener_reporte_indices, aplicar_estrategia_todas, UMBRAL_CUBRIENTE, MAX_REGISTROS_CUBRIENTE
+from database.archivo import meses_cerrados_por_archivar, archivar_mes, MESES_CALIENTES
+from database.lecturas import obtener_registros
+from database.exportacion import exportar_tabla, FORMATOS_EXPORTACION
+
+# Tamaño máximo (MB) de una exportación ofrecida como descarga en el navegador
+LIMITE_DESCARGA_MB = int(os.getenv("EGAUGE_LIMITE_DESCARGA_MB", "200"))
 
 def render_ver_tablas():
     """Renderiza la vista de tablas eGauge"""
@@ -34,8 +45,22 @@ def render_ver_tablas():
     # Estadísticas generales
     _render_estadisticas_generales(df_tablas)
     
+    # Sección para refrescar estadísticas exactas
+    _render_seccion_refrescar_estadisticas(tabla_info)
+    
+    # Sección de índices
+    _render_seccion_indices()
+    
+    # Sección de archivo frío
+    _render_seccion_archivo(tabla_info)
+    
     # Sección para eliminar tablas
     _render_seccion_eliminar_tablas(tabla_info)
+    
+    st.divider()
+    
+    # Exportación de datos
+    render_exportar_tablas()
 
 def _render_filtros_tablas(df_tablas):
     """Renderiza filtros para las tablas"""
@@ -101,6 +126,87 @@ def _render_estadisticas_generales(df_tablas):
         tablas_con_errores = sum(1 for filas in df_tablas['Filas'] if filas == 'Error')
         st.metric("❌ Con errores", tablas_con_errores)
 
+def _render_seccion_refrescar_estadisticas(tabla_info):
+    """Renderiza la sección para recalcular estadísticas exactas de una tabla"""
+    with st.expander("🔄 Refrescar Estadísticas"):
+        st.caption("Las tablas marcadas como 'Estimado' usan pg_class.reltuples. Refrescar ejecuta un conteo exacto (escaneo completo).")
+        
+        nombres_tablas = [info['Tabla'] for info in tabla_info]
+        tabla_refrescar = st.selectbox(
+            "Seleccionar tabla:",
+            options=[""] + nombres_tablas,
+            key="tabla_refrescar_stats"
+        )
+        
+        if tabla_refrescar:
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button(f"🔄 Refrescar {tabla_refrescar}", use_container_width=True):
+                    with st.spinner(f"Contando filas de {tabla_refrescar}..."):
+                        if refrescar_estadisticas_tabla(tabla_refrescar):
+                            st.success(f"✅ Estadísticas de {tabla_refrescar} actualizadas")
+                            st.rerun()
+            with col2:
+                if st.button("📦 Reconstruir rollups", use_container_width=True, help="Recalcula los agregados hora/día/mes de la tabla"):
+                    with st.spinner(f"Reconstruyendo rollups de {tabla_refrescar}..."):
+                        if reconstruir_rollups(tabla_refrescar):
+                            st.success(f"✅ Rollups de {tabla_refrescar} reconstruidos")
+
+def _render_seccion_indices():
+    """Renderiza el reporte de índices y la estrategia de indexación"""
+    with st.expander("🗂️ Índices"):
+        st.caption(
+            f"Estrategia: un solo índice único B-tree en timestamp (requerido por el UPSERT); a partir de "
+            f"{UMBRAL_CUBRIENTE:,} filas y con hasta {MAX_REGISTROS_CUBRIENTE} registros incluye tarifa y "
+            f"registros (cubriente). Sin BRIN ni índice en tarifa."
+        )
+        
+        df_indices = obtener_reporte_indices()
+        if not df_indices.empty:
+            st.dataframe(df_indices, use_container_width=True, hide_index=True)
+            sin_uso = df_indices[df_indices['Escaneos'] == 0]
+            if not sin_uso.empty:
+                st.warning(f"⚠️ {len(sin_uso)} índices sin ningún escaneo desde el último reinicio de estadísticas")
+        
+        if st.button("⚙️ Aplicar estrategia a todas las tablas"):
+            with st.spinner("Ajustando índices..."):
+                resultados = aplicar_estrategia_todas()
+            if resultados:
+                for tabla, acciones in resultados.items():
+                    st.write(f"**{tabla}**: {', '.join(acciones)}")
+            else:
+                st.info("ℹ️ Todas las tablas ya siguen la estrategia")
+
+def _render_seccion_archivo(tabla_info):
+    """Renderiza la sección para mover meses cerrados al archivo Parquet"""
+    with st.expander("🧊 Archivo Frío (Parquet)"):
+        st.caption(
+            f"Los meses anteriores a los últimos {MESES_CALIENTES} se exportan a Parquet comprimido y se "
+            "borran de PostgreSQL. La calculadora y la exportación siguen consultándolos de forma transparente."
+        )
+        
+        nombres_tablas = [info['Tabla'] for info in tabla_info]
+        tabla_archivar = st.selectbox(
+            "Seleccionar tabla:",
+            options=[""] + nombres_tablas,
+            key="tabla_archivar"
+        )
+        
+        if tabla_archivar:
+            meses = meses_cerrados_por_archivar(tabla_archivar)
+            if not meses:
+                st.info("ℹ️ No hay meses cerrados por archivar")
+                return
+            
+            st.write(f"📦 Meses por archivar: {', '.join(f'{mes:02d}/{año}' for año, mes in meses)}")
+            if st.button(f"🧊 Archivar {len(meses)} meses", type="primary"):
+                progreso = st.progress(0)
+                for i, (año, mes) in enumerate(meses):
+                    filas = archivar_mes(tabla_archivar, año, mes)
+                    if filas >= 0:
+                        st.write(f"✅ {mes:02d}/{año}: {filas:,} filas archivadas")
+                    progreso.progress((i + 1) / len(meses))
+
 def _render_seccion_eliminar_tablas(tabla_info):
     """Renderiza la sección para eliminar tablas"""
     with st.expander("🗑️ Eliminar Tablas"):
@@ -173,12 +279,47 @@ def render_exportar_tablas():
         options=[""] + nombres_tablas
     )
     
-    if tabla_exportar:
-        st.info("🚧 **Funcionalidad en desarrollo**")
-        st.markdown("""
-        **Próximamente podrás:**
-        - Exportar datos a CSV
-        - Exportar a Excel
-        - Filtrar por rango de fechas
-        - Exportar solo ciertas columnas
-        """)
\ No newline at end of file
+    if not tabla_exportar:
+        return
+    
+    registros = obtener_registros(tabla_exportar)
+    if not registros:
+        st.error(f"No hay columnas numéricas en {tabla_exportar}")
+        return
+    
+    columnas = st.multiselect("Columnas a exportar:", registros, default=registros)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        fecha_inicio = st.date_input("Desde:", datetime.now().date() - timedelta(days=30), key="exportar_desde")
+    with col2:
+        fecha_fin = st.date_input("Hasta:", datetime.now().date(), key="exportar_hasta")
+    with col3:
+        formato = st.selectbox("Formato:", list(FORMATOS_EXPORTACION.keys()))
+    
+    if not columnas:
+        st.warning("Selecciona al menos una columna")
+        return
+    
+    if st.button("📤 Exportar", type="primary"):
+        with st.spinner("Exportando por lotes..."):
+            ruta, filas = exportar_tabla(
+                tabla_exportar, columnas,
+                datetime.combine(fecha_inicio, datetime.min.time()),
+                datetime.combine(fecha_fin, datetime.max.time()),
+                formato
+            )
+        st.session_state.ultima_exportacion = (ruta, filas) if ruta else None
+    
+    exportacion = st.session_state.get('ultima_exportacion')
+    if exportacion:
+        ruta, filas = exportacion
+        tamano_mb = os.path.getsize(ruta) / 1024 ** 2 if os.path.exists(ruta) else 0
+        st.success(f"✅ {filas:,} filas exportadas a `{ruta}` ({tamano_mb:,.1f} MB)")
+        
+        # La descarga por el navegador carga el archivo completo; los muy grandes se toman del disco
+        if 0 < tamano_mb <= LIMITE_DESCARGA_MB:
+            with open(ruta, 'rb') as archivo:
+                st.download_button("⬇️ Descargar", archivo, file_name=os.path.basename(ruta), use_container_width=True)
+        elif tamano_mb > LIMITE_DESCARGA_MB:
+            st.info(f"ℹ️ El archivo supera {LIMITE_DESCARGA_MB} MB: cópialo directamente desde el servidor")